@@ -0,0 +1,473 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, Tuple
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+import numpy as np
+from dotenv import load_dotenv
+from .db import get_driver
+from .metrics import fetch, fetch_one
+from .relationships import RELATIONSHIP_TYPES
+
+log = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+# Seconds between runs of the in-app analytics task; 0 leaves runs to
+# python -m backend.analytics, which is preferable with several workers
+ANALYTICS_INTERVAL = float(os.getenv("ANALYTICS_INTERVAL", "0"))
+# Networks estimated to need more memory than this are skipped and logged
+ANALYTICS_MEMORY_BUDGET_MB = float(os.getenv("ANALYTICS_MEMORY_BUDGET_MB", "1024"))
+ANALYTICS_WRITE_BATCH_SIZE = int(os.getenv("ANALYTICS_WRITE_BATCH_SIZE", "5000"))
+# Breadth-first searches per component for the betweenness estimate
+ANALYTICS_BETWEENNESS_SAMPLES = int(os.getenv("ANALYTICS_BETWEENNESS_SAMPLES", "64"))
+ANALYTICS_MAX_ITERATIONS = int(os.getenv("ANALYTICS_MAX_ITERATIONS", "50"))
+INSIGHTS_CACHE_SIZE = int(os.getenv("INSIGHTS_CACHE_SIZE", "10000"))
+INSIGHTS_CACHE_TTL = float(os.getenv("INSIGHTS_CACHE_TTL", "60"))
+PAGERANK_DAMPING = 0.85
+INSIGHTS_TOP_K = 10
+# Rows read per chunk while exporting a network
+EXPORT_CHUNK_SIZE = 100000
+# Rough peak bytes per person and per relationship while a network is analysed:
+# ids and per-node score arrays, and the symmetrized edge keys being sorted
+NODE_BYTES = 160
+EDGE_BYTES = 160
+
+EMPTY_INSIGHTS = {
+    "computed_at": None, "people": 0, "connections": 0, "components": 0, "isolated": 0,
+    "communities": 0, "top_communities": [], "connectors": [], "brokers": [],
+}
+
+# The graph algorithms below work on an undirected CSR adjacency (indptr,
+# indices) and run in a worker process. Every score is local to a connected
+# component, so components without changes keep their stored scores.
+
+def build_csr(n: int, src: np.ndarray, dst: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Undirected adjacency without self loops or parallel edges"""
+    keep = src != dst
+    src, dst = src[keep].astype(np.int64), dst[keep].astype(np.int64)
+    keys = np.unique(np.concatenate([src * n + dst, dst * n + src]))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // n, minlength=n), out=indptr[1:])
+    return indptr, (keys % n).astype(np.int32)
+
+def _sources(indptr: np.ndarray) -> np.ndarray:
+    # Row of every entry in indices
+    return np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+
+def _expand(indptr: np.ndarray, indices: np.ndarray, frontier: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(node, neighbour) for every edge of the frontier nodes"""
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(int(counts.sum()))
+    return np.repeat(frontier, counts), indices[offsets]
+
+def connected_components(indptr: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    """Component number of every node, by hooking roots onto smaller roots and pointer jumping"""
+    src = _sources(indptr)
+    labels = np.arange(len(indptr) - 1)
+    while True:
+        np.minimum.at(labels, labels[src], labels[indices])
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels[src], labels[indices]):
+            return np.unique(labels, return_inverse=True)[1]
+
+def pagerank(indptr: np.ndarray, indices: np.ndarray, damping: float = PAGERANK_DAMPING,
+             iterations: int = ANALYTICS_MAX_ITERATIONS, tolerance: float = 1e-6) -> np.ndarray:
+    """PageRank scaled to a mean of 1 within each component, so components are independent"""
+    n = len(indptr) - 1
+    degree = np.diff(indptr)
+    share = np.divide(1.0, degree, out=np.zeros(n), where=degree > 0)
+    src = _sources(indptr)
+    rank = np.ones(n)
+    for _ in range(iterations):
+        updated = (1 - damping) + damping * np.bincount(indices, weights=(rank * share)[src], minlength=n)
+        updated[degree == 0] = 1.0
+        converged = np.abs(updated - rank).sum() < tolerance * n
+        rank = updated
+        if converged:
+            break
+    return rank
+
+def _dependencies(indptr: np.ndarray, indices: np.ndarray, sources: np.ndarray) -> np.ndarray:
+    # Brandes' dependency accumulation from several sources at once; the
+    # sources lie in different components, so their searches never meet
+    n = len(indptr) - 1
+    dist = np.full(n, -1, dtype=np.int32)
+    sigma = np.zeros(n)
+    dist[sources] = 0
+    sigma[sources] = 1
+    levels = [sources]
+    depth = 0
+    while levels[-1].size:
+        parents, children = _expand(indptr, indices, levels[-1])
+        unseen = dist[children] < 0
+        dist[children[unseen]] = depth + 1
+        onward = dist[children] == depth + 1
+        sigma += np.bincount(children[onward], weights=sigma[parents[onward]], minlength=n)
+        levels.append(np.unique(children[unseen]))
+        depth += 1
+    delta = np.zeros(n)
+    for level in reversed(levels[1:-1]):
+        nodes, neighbours = _expand(indptr, indices, level)
+        up = dist[neighbours] == dist[nodes] - 1
+        nodes, neighbours = nodes[up], neighbours[up]
+        delta += np.bincount(neighbours, weights=sigma[neighbours] / sigma[nodes] * (1 + delta[nodes]), minlength=n)
+    delta[sources] = 0
+    return delta
+
+def betweenness(indptr: np.ndarray, indices: np.ndarray, component: np.ndarray,
+                samples: int = ANALYTICS_BETWEENNESS_SAMPLES, rng=None) -> np.ndarray:
+    """Normalized betweenness estimated from `samples` random pivots per component.
+
+    Round r searches from the r-th pivot of every component together, so the
+    cost is `samples` vectorized passes over the graph however many components
+    there are. Components of up to `samples` people are computed exactly.
+    """
+    rng = rng or np.random.default_rng()
+    n = len(indptr) - 1
+    sizes = np.bincount(component)
+    order = np.lexsort((rng.random(n), component))
+    position = np.empty(n, dtype=np.int64)
+    position[order] = np.arange(n) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    pivots = np.where(sizes > 2, np.minimum(sizes, samples), 0)
+    scores = np.zeros(n)
+    for r in range(int(pivots.max(initial=0))):
+        sources = np.flatnonzero((position == r) & (pivots[component] > r)).astype(np.int32)
+        scores += _dependencies(indptr, indices, sources)
+    size = sizes[component].astype(float)
+    # Undirected pairs are counted from both ends; normalize by pairs not involving the node
+    scale = size / np.maximum(pivots[component], 1) / 2 / np.maximum((size - 1) * (size - 2) / 2, 1)
+    return scores * scale
+
+def label_propagation(indptr: np.ndarray, indices: np.ndarray, iterations: int = ANALYTICS_MAX_ITERATIONS,
+                      rng=None) -> np.ndarray:
+    """Community label of every node: each adopts its neighbours' most common label.
+
+    Half the nodes, chosen at random, update per round, which stops the
+    two-colouring oscillation of fully synchronous updates. A node's own label
+    counts as one vote.
+    """
+    rng = rng or np.random.default_rng()
+    n = len(indptr) - 1
+    voters = np.concatenate([_sources(indptr), np.arange(n, dtype=np.int32)]).astype(np.int64)
+    labels = np.arange(n)
+    for _ in range(iterations):
+        keys, counts = np.unique(voters * n + np.concatenate([labels[indices], labels]), return_counts=True)
+        nodes = keys // n
+        # Every node votes for itself, so each has a run of keys; jitter below
+        # one vote breaks ties at random without reordering them
+        starts = np.flatnonzero(np.r_[True, nodes[1:] != nodes[:-1]])
+        score = counts + rng.random(len(keys)) * 0.5
+        top = np.flatnonzero(score == np.repeat(np.maximum.reduceat(score, starts), np.diff(np.r_[starts, len(keys)])))
+        best = (keys % n)[top[np.r_[True, nodes[top][1:] != nodes[top][:-1]]]]
+        if np.count_nonzero(best != labels) <= n // 1000:
+            return best
+        labels = np.where(rng.random(n) < 0.5, best, labels)
+    return labels
+
+def _leaders(labels: np.ndarray, rank: np.ndarray) -> np.ndarray:
+    # The highest ranked member of each node's community
+    order = np.lexsort((-rank, labels))
+    heads = order[np.r_[True, labels[order][1:] != labels[order][:-1]]]
+    leader = np.empty(len(labels), dtype=np.int64)
+    leader[labels[heads]] = heads
+    return leader[labels]
+
+def analyze_graph(n: int, src: np.ndarray, dst: np.ndarray, dirty: np.ndarray,
+                  samples: int = ANALYTICS_BETWEENNESS_SAMPLES, seed: int = 0) -> dict:
+    """Scores for the people in components that contain a dirty node.
+
+    Runs in a worker process. `src` and `dst` index people 0..n-1; returned
+    arrays are aligned with `nodes`, and `community` holds node indexes.
+    """
+    rng = np.random.default_rng(seed)
+    indptr, indices = build_csr(n, src, dst)
+    component = connected_components(indptr, indices)
+    changed = np.zeros(int(component.max(initial=-1)) + 1, dtype=bool)
+    changed[component[dirty]] = True
+    summary = {
+        "people": n,
+        "connections": len(indices) // 2,
+        "components": len(changed),
+        "isolated": int(np.count_nonzero(np.diff(indptr) == 0)),
+    }
+    if not dirty.any():
+        # Nothing to rescore, e.g. after deleting a person without relationships
+        empty = np.zeros(0, dtype=np.int64)
+        return {**summary, "nodes": empty, "degree": empty, "pagerank": np.zeros(0),
+                "betweenness": np.zeros(0), "community": empty}
+    nodes = np.flatnonzero(changed[component])
+    if len(nodes) < n:
+        # Analyse only the changed components; edges never cross components
+        local = np.full(n, -1, dtype=np.int64)
+        local[nodes] = np.arange(len(nodes))
+        src, dst = local[_sources(indptr)], local[indices]
+        keep = src >= 0
+        indptr, indices = build_csr(len(nodes), src[keep], dst[keep])
+        component = np.unique(component[nodes], return_inverse=True)[1]
+    rank = pagerank(indptr, indices)
+    return {
+        **summary,
+        "nodes": nodes,
+        "degree": np.diff(indptr),
+        "pagerank": rank,
+        "betweenness": betweenness(indptr, indices, component, samples, rng),
+        "community": nodes[_leaders(label_propagation(indptr, indices, rng=rng), rank)],
+    }
+
+async def _read_chunks(result, fields: Tuple[str, ...]) -> List[np.ndarray]:
+    # Stream a result into one NumPy array per field, chunk by chunk, to keep
+    # the export's memory close to the size of the final arrays
+    columns = [[] for _ in fields]
+    chunks = [[] for _ in fields]
+    async for record in result:
+        for column, field in zip(columns, fields):
+            column.append(record[field])
+        if len(columns[0]) >= EXPORT_CHUNK_SIZE:
+            for chunk, column in zip(chunks, columns):
+                chunk.append(np.array(column))
+                column.clear()
+    for chunk, column in zip(chunks, columns):
+        chunk.append(np.array(column))
+    return [np.concatenate(chunk) for chunk in chunks]
+
+EXPORT_PEOPLE_QUERY = """
+    MATCH (:User {open_id: $open_id})-[:OWNS]->(p:Person)
+    WHERE p.deleted = false
+    RETURN elementId(p) AS id,
+           $full OR p.analytics_at IS NULL OR coalesce(p.graph_seq, 0) > $since AS dirty
+    ORDER BY id
+    """
+
+EDGE_COUNT_QUERY = f"""
+    MATCH (:User {{open_id: $open_id}})-[:OWNS]->(a:Person)-[r:{RELATIONSHIP_TYPES}]->(:Person)
+    WHERE r.owner = $open_id
+    RETURN count(r) AS edges
+    """
+
+EXPORT_EDGES_QUERY = f"""
+    MATCH (:User {{open_id: $open_id}})-[:OWNS]->(a:Person)-[r:{RELATIONSHIP_TYPES}]->(b:Person)
+    WHERE r.owner = $open_id AND a.deleted = false AND b.deleted = false
+    RETURN elementId(a) AS a, elementId(b) AS b
+    """
+
+CONNECTORS_QUERY = """
+    MATCH (:User {open_id: $open_id})-[:OWNS]->(p:Person)
+    WHERE p.deleted = false AND p.pagerank IS NOT NULL
+    RETURN elementId(p) AS id, p.name AS name, p.degree AS degree, p.pagerank AS pagerank,
+           p.betweenness AS betweenness, p.community AS community
+    ORDER BY p.pagerank DESC LIMIT $k
+    """
+
+BROKERS_QUERY = """
+    MATCH (:User {open_id: $open_id})-[:OWNS]->(p:Person)
+    WHERE p.deleted = false AND p.betweenness > 0
+    RETURN elementId(p) AS id, p.name AS name, p.degree AS degree, p.pagerank AS pagerank,
+           p.betweenness AS betweenness, p.community AS community
+    ORDER BY p.betweenness DESC LIMIT $k
+    """
+
+COMMUNITIES_QUERY = """
+    MATCH (:User {open_id: $open_id})-[:OWNS]->(p:Person)
+    WHERE p.deleted = false AND p.community IS NOT NULL
+    WITH p ORDER BY p.pagerank DESC
+    WITH p.community AS id, count(*) AS size, collect(p.name)[..5] AS members
+    WHERE size > 1
+    WITH id, size, members ORDER BY size DESC
+    RETURN count(*) AS total, collect({id: id, size: size, members: members})[..$k] AS top
+    """
+
+DONE_QUERY = """
+    MATCH (u:User {open_id: $open_id})
+    SET u.analytics_seq = $graph_seq, u.analytics_at = $now, u.insights = $insights
+    """
+
+async def _export(session, open_id: str, since: int, full: bool):
+    """Sorted person ids, their dirty flags and edges as index arrays, or None over budget"""
+    result = await session.run(EXPORT_PEOPLE_QUERY,
+        open_id=open_id, since=since, full=full
+    )
+    ids, dirty = await _read_chunks(result, ("id", "dirty"))
+    ids = ids.astype(bytes)
+    record = await fetch_one(session, "analytics.edges.count", EDGE_COUNT_QUERY,
+        open_id=open_id
+    )
+    needed = (len(ids) * NODE_BYTES + record["edges"] * EDGE_BYTES) / 2 ** 20
+    if needed > ANALYTICS_MEMORY_BUDGET_MB:
+        log.error(f"Skipping analytics for {open_id}: {len(ids)} people and {record['edges']} relationships "
+                  f"need about {needed:.0f} MB, over ANALYTICS_MEMORY_BUDGET_MB")
+        return None
+    result = await session.run(EXPORT_EDGES_QUERY,
+        open_id=open_id
+    )
+    a, b = (column.astype(bytes) for column in await _read_chunks(result, ("a", "b")))
+    # ORDER BY id sorted the ids, so an id's index is its position; endpoints
+    # deleted between the two reads are not found and their edges dropped
+    src = np.minimum(np.searchsorted(ids, a), max(len(ids) - 1, 0))
+    dst = np.minimum(np.searchsorted(ids, b), max(len(ids) - 1, 0))
+    found = (ids[src] == a) & (ids[dst] == b) if len(ids) else np.zeros(0, dtype=bool)
+    return ids, dirty.astype(bool), src[found].astype(np.int32), dst[found].astype(np.int32)
+
+WRITE_SCORES_QUERY = """
+    UNWIND $rows AS row
+    MATCH (p:Person) WHERE elementId(p) = row.id AND p.deleted = false
+    SET p.degree = row.degree, p.pagerank = row.pagerank, p.betweenness = row.betweenness,
+        p.community = row.community, p.analytics_at = $now
+    """
+
+INSIGHTS_QUERY = "MATCH (u:User {open_id: $open_id}) RETURN u.insights AS insights"
+
+async def _write_scores(tx, rows, now):
+    await fetch(tx, "analytics.write", WRITE_SCORES_QUERY, rows=rows, now=now)
+
+async def _build_insights(session, open_id: str, result: dict, now: str) -> dict:
+    """Snapshot served by /network/insights, from the scores now stored"""
+    connectors = await fetch(session, "analytics.connectors", CONNECTORS_QUERY,
+        open_id=open_id, k=INSIGHTS_TOP_K
+    )
+    brokers = await fetch(session, "analytics.brokers", BROKERS_QUERY,
+        open_id=open_id, k=INSIGHTS_TOP_K
+    )
+    communities = await fetch_one(session, "analytics.communities", COMMUNITIES_QUERY,
+        open_id=open_id, k=INSIGHTS_TOP_K
+    )
+    return {
+        "computed_at": now,
+        "people": result["people"],
+        "connections": result["connections"],
+        "components": result["components"],
+        "isolated": result["isolated"],
+        "communities": communities["total"] if communities else 0,
+        "top_communities": communities["top"] if communities else [],
+        "connectors": connectors,
+        "brokers": brokers,
+    }
+
+async def analyze_owner(executor, open_id: str, graph_seq: int, since: int, full: bool = False) -> int:
+    """Analyse one user's network and store scores and snapshot; returns people scored"""
+    loop = asyncio.get_running_loop()
+    async with get_driver().session() as session:
+        exported = await _export(session, open_id, since, full)
+        if exported is None:
+            return 0
+        ids, dirty, src, dst = exported
+        if len(ids):
+            result = await loop.run_in_executor(executor, analyze_graph, len(ids), src, dst, dirty)
+        else:
+            result = {**EMPTY_INSIGHTS, "nodes": np.zeros(0, dtype=np.int64)}
+        now = datetime.now(timezone.utc).isoformat()
+        nodes = result["nodes"]
+        for start in range(0, len(nodes), ANALYTICS_WRITE_BATCH_SIZE):
+            batch = slice(start, start + ANALYTICS_WRITE_BATCH_SIZE)
+            rows = [
+                {"id": ids[node].decode(), "degree": degree, "pagerank": round(rank, 6),
+                 "betweenness": round(between, 8), "community": ids[leader].decode()}
+                for node, degree, rank, between, leader in zip(
+                    nodes[batch].tolist(), result["degree"][batch].tolist(), result["pagerank"][batch].tolist(),
+                    result["betweenness"][batch].tolist(), result["community"][batch].tolist())
+            ]
+            await session.execute_write(_write_scores, rows, now)
+        insights = await _build_insights(session, open_id, result, now)
+        # graph_seq was read before the export, so later changes stay dirty for the next run
+        await fetch(session, "analytics.done", DONE_QUERY,
+            open_id=open_id, graph_seq=graph_seq, now=now,
+            insights=json.dumps(insights, ensure_ascii=False)
+        )
+    return len(nodes)
+
+async def run_analytics(full: bool = False) -> int:
+    """Analyse every network changed since its last run, or all of them; returns networks analysed"""
+    async with get_driver().session() as session:
+        owners = await fetch(session, "analytics.owners",
+            """
+            MATCH (u:User)
+            WHERE $full OR coalesce(u.graph_seq, 0) > coalesce(u.analytics_seq, -1)
+            RETURN u.open_id AS open_id, coalesce(u.graph_seq, 0) AS graph_seq,
+                   coalesce(u.analytics_seq, -1) AS since
+            """,
+            full=full
+        )
+    if not owners:
+        return 0
+    started = time.monotonic()
+    scored = 0
+    # A fresh worker per run returns its memory to the system afterwards
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        for owner in owners:
+            try:
+                scored += await analyze_owner(executor, owner["open_id"], owner["graph_seq"], owner["since"], full)
+            except Exception as e:
+                log.error(f"Error analysing network of {owner['open_id']}: {e}")
+    log.info(f"Analysed {len(owners)} networks, {scored} people scored in {time.monotonic() - started:.1f}s")
+    return len(owners)
+
+async def run_analytics_periodically(interval: float = ANALYTICS_INTERVAL):
+    """Background task for single-process deployments; disabled when interval is 0"""
+    if interval <= 0:
+        return
+    while True:
+        try:
+            await run_analytics()
+        except Exception as e:
+            log.error(f"Error running network analytics: {e}")
+        await asyncio.sleep(interval)
+
+class InsightsCache:
+    """Per-worker cache of the stored insight snapshots, as (JSON body, ETag)"""
+
+    def __init__(self, size: int = INSIGHTS_CACHE_SIZE, ttl: float = INSIGHTS_CACHE_TTL):
+        self._size = size
+        self._ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+
+    async def get(self, open_id: str) -> Tuple[str, str]:
+        entry = self._entries.get(open_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1], entry[2]
+        async with get_driver().session() as session:
+            record = await fetch_one(session, "network.insights", INSIGHTS_QUERY, open_id=open_id)
+        body = (record and record["insights"]) or json.dumps(EMPTY_INSIGHTS)
+        etag = '"{}"'.format(hashlib.sha1(body.encode()).hexdigest())
+        self._entries[open_id] = (time.monotonic() + self._ttl, body, etag)
+        self._entries.move_to_end(open_id)
+        while len(self._entries) > self._size:
+            self._entries.popitem(last=False)
+        return body, etag
+
+insights_cache = InsightsCache()
+
+async def _main(argv):
+    from .db import init_driver, close_driver
+    parser = argparse.ArgumentParser(prog="python -m backend.analytics")
+    parser.add_argument("--full", action="store_true", help="recompute every network, not only changed ones")
+    parser.add_argument("--interval", type=float, default=0, help="keep running, this many seconds apart")
+    args = parser.parse_args(argv)
+    await init_driver()
+    try:
+        await run_analytics(full=args.full)
+        while args.interval > 0:
+            await asyncio.sleep(args.interval)
+            try:
+                await run_analytics()
+            except Exception as e:
+                log.error(f"Error running network analytics: {e}")
+        return 0
+    finally:
+        await close_driver()
+
+if __name__ == "__main__":
+    # python -m backend.analytics [--full] [--interval SECONDS]
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
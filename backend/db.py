@@ -1,4 +1,5 @@
-from neo4j import GraphDatabase
+from neo4j import AsyncGraphDatabase, AsyncDriver
+from typing import Optional
 import os
 from dotenv import load_dotenv
 
@@ -7,6 +8,37 @@ load_dotenv()
 NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USERNAME = os.getenv("NEO4J_USERNAME")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+# Connection pool settings (per worker process)
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+NEO4J_ACQUISITION_TIMEOUT = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "30"))
+NEO4J_MAX_CONNECTION_LIFETIME = float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600"))
 
-# Initialize driver
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USERNAME, NEO4J_PASSWORD))
+# Driver is created on application startup and closed on shutdown (see main.lifespan)
+driver: Optional[AsyncDriver] = None
+
+async def init_driver() -> AsyncDriver:
+    """Create the shared async driver and check that the database is reachable"""
+    global driver
+    if driver is None:
+        driver = AsyncGraphDatabase.driver(
+            NEO4J_URI,
+            auth=(NEO4J_USERNAME, NEO4J_PASSWORD),
+            max_connection_pool_size=NEO4J_MAX_POOL_SIZE,
+            connection_acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT,
+            max_connection_lifetime=NEO4J_MAX_CONNECTION_LIFETIME,
+        )
+        await driver.verify_connectivity()
+    return driver
+
+async def close_driver():
+    """Close the shared driver and release all pooled connections"""
+    global driver
+    if driver is not None:
+        await driver.close()
+        driver = None
+
+def get_driver() -> AsyncDriver:
+    """Return the shared driver, failing loudly if the app has not started yet"""
+    if driver is None:
+        raise RuntimeError("Neo4j driver is not initialized")
+    return driver
@@ -1,6 +1,9 @@
-import requests
+import asyncio
+import httpx
 import logging
-from urllib import parse
+import os
+import time
+from dotenv import load_dotenv
 
 # const
 # open api capability
@@ -10,98 +13,168 @@ USER_INFO_URI = "/open-apis/authen/v1/user_info"
 TENANT_ACCESS_TOKEN_URI = "/open-apis/auth/v3/tenant_access_token/internal"
 JSAPI_TICKET_URI = "/open-apis/jssdk/ticket/get"
 
+# 飞书返回的 token 失效错误码, 遇到时丢弃缓存重新获取
+# error codes meaning a cached app/tenant token is no longer valid
+TOKEN_INVALID_CODES = {99991661, 99991663, 99991664, 99991668}
+# user_info 字段, access_token 接口的响应体中已包含这些字段
+USER_INFO_FIELDS = ("avatar_url", "en_name", "name", "open_id", "tenant_key", "union_id")
+
+load_dotenv()
+FEISHU_TIMEOUT = float(os.getenv("FEISHU_TIMEOUT", "5"))
+FEISHU_RETRIES = int(os.getenv("FEISHU_RETRIES", "2"))
+FEISHU_MAX_CONNECTIONS = int(os.getenv("FEISHU_MAX_CONNECTIONS", "20"))
+# refresh cached tokens this many seconds before they expire
+FEISHU_TOKEN_REFRESH_MARGIN = int(os.getenv("FEISHU_TOKEN_REFRESH_MARGIN", "300"))
+
+log = logging.getLogger(__name__)
+
 class Feishu(object):
-    def __init__(self, feishu_host, app_id, app_secret):
+    def __init__(self, feishu_host, app_id, app_secret, timeout=FEISHU_TIMEOUT, retries=FEISHU_RETRIES):
         self.feishu_host = feishu_host
         self.app_id = app_id
         self.app_secret = app_secret
-        self._app_access_token = ""
-        self._user_access_token = ""
+        self.timeout = timeout
+        self.retries = retries
+        self._client = None
+        # name -> (value, expires_at), 以 time.monotonic() 计时
+        self._tokens = {}
+        self._locks = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # 共享的连接池, 首次使用时创建
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.feishu_host or "",
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=FEISHU_MAX_CONNECTIONS,
+                    max_keepalive_connections=FEISHU_MAX_CONNECTIONS,
+                ),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
-    def get_ticket(self):
+    async def get_ticket(self):
         # 获取jsapi_ticket，具体参考文档：https://open.feishu.cn/document/ukTMukTMukTM/uYTM5UjL2ETO14iNxkTN/h5_js_sdk/authorization
-        self.authorize_tenant_access_token()
-        url = "{}{}".format(self.feishu_host, JSAPI_TICKET_URI)
-        headers = {
-            "Authorization": "Bearer " + self.tenant_access_token,
-            "Content-Type": "application/json",
-        }
-        resp = requests.post(url=url, headers=headers)
-        Feishu._check_error_response(resp)
-        return resp.json().get("data").get("ticket", "")
-
-    def authorize_tenant_access_token(self):
-        # 获取tenant_access_token，基于开放平台能力实现，具体参考文档：https://open.feishu.cn/document/ukTMukTMukTM/ukDNz4SO0MjL5QzM/auth-v3/auth/tenant_access_token_internal
-        url = "{}{}".format(self.feishu_host, TENANT_ACCESS_TOKEN_URI)
-        req_body = {"app_id": self.app_id, "app_secret": self.app_secret}
-        response = requests.post(url, req_body)
-        Feishu._check_error_response(response)
-        self.tenant_access_token = response.json().get("tenant_access_token")
+        async def fetch():
+            data = await self._with_token(self.get_tenant_access_token, "tenant_access_token", self._post_ticket)
+            ticket = data.get("data", {})
+            return ticket.get("ticket", ""), ticket.get("expire_in", 0)
+        return await self._cached("jsapi_ticket", fetch)
 
-    @property
-    def user_access_token(self):
-        return self._user_access_token
+    async def _post_ticket(self, tenant_access_token):
+        headers = {"Authorization": "Bearer " + tenant_access_token}
+        return await self._request("POST", JSAPI_TICKET_URI, headers=headers)
 
-    @property
-    def app_access_token(self):
-        return self._app_access_token
+    async def get_tenant_access_token(self):
+        # 获取tenant_access_token，基于开放平台能力实现，具体参考文档：https://open.feishu.cn/document/ukTMukTMukTM/ukDNz4SO0MjL5QzM/auth-v3/auth/tenant_access_token_internal
+        async def fetch():
+            req_body = {"app_id": self.app_id, "app_secret": self.app_secret}
+            data = await self._request("POST", TENANT_ACCESS_TOKEN_URI, json=req_body)
+            return data.get("tenant_access_token"), data.get("expire", 0)
+        return await self._cached("tenant_access_token", fetch)
+
+    async def get_app_access_token(self):
+        # 获取 app_access_token, 依托于飞书开放能力实现.
+        # 文档链接: https://open.feishu.cn/document/ukTMukTMukTM/ukDNz4SO0MjL5QzM/auth-v3/auth/app_access_token_internal
+        async def fetch():
+            # "app_id" 和 "app_secret" 位于HTTP请求的请求体
+            req_body = {"app_id": self.app_id, "app_secret": self.app_secret}
+            data = await self._request("POST", APP_ACCESS_TOKEN_URI, json=req_body)
+            return data.get("app_access_token"), data.get("expire", 0)
+        return await self._cached("app_access_token", fetch)
 
-    def authorize_user_access_token(self, code):
-        # 获取 user_access_token, 依托于飞书开放能力实现. 
+    async def authorize_user_access_token(self, code):
+        # 获取 user_access_token, 依托于飞书开放能力实现.
         # 文档链接: https://open.feishu.cn/document/uAjLw4CM/ukTMukTMukTM/reference/authen-v1/authen/access_token
-        self.authorize_app_access_token()
-        url = self._gen_url(USER_ACCESS_TOKEN_URI)
-        # “app_access_token” 位于HTTP请求的请求头
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": "Bearer " + self.app_access_token,
-        }
-        # 临时授权码 code 位于HTTP请求的请求体
-        req_body = {"grant_type": "authorization_code", "code": code}
-        response = requests.post(url=url, headers=headers, json=req_body)
-        Feishu._check_error_response(response)
-        self._user_access_token = response.json().get("data").get("access_token")
-
-    def get_user_info(self):
-        # 获取 user info, 依托于飞书开放能力实现.  
+        # 返回完整的 data, 其中包含 access_token 以及用户基本信息
+        async def post(app_access_token):
+            # “app_access_token” 位于HTTP请求的请求头
+            headers = {"Authorization": "Bearer " + app_access_token}
+            # 临时授权码 code 位于HTTP请求的请求体
+            req_body = {"grant_type": "authorization_code", "code": code}
+            return await self._request("POST", USER_ACCESS_TOKEN_URI, headers=headers, json=req_body)
+        data = await self._with_token(self.get_app_access_token, "app_access_token", post)
+        return data.get("data")
+
+    async def get_user_info(self, user_access_token):
+        # 获取 user info, 依托于飞书开放能力实现.
         # 文档链接: https://open.feishu.cn/document/uAjLw4CM/ukTMukTMukTM/reference/authen-v1/authen/user_info
-        url = self._gen_url(USER_INFO_URI)
         # “user_access_token” 位于HTTP请求的请求头
-        headers = {
-            "Authorization": "Bearer " + self.user_access_token,
-            "Content-Type": "application/json",
-        }
-        response = requests.get(url=url, headers=headers)
-        Feishu._check_error_response(response)
-        # 如需了解响应体字段说明与示例，请查询开放平台文档： 
+        headers = {"Authorization": "Bearer " + user_access_token}
+        data = await self._request("GET", USER_INFO_URI, headers=headers)
+        # 如需了解响应体字段说明与示例，请查询开放平台文档：
         # https://open.feishu.cn/document/uAjLw4CM/ukTMukTMukTM/reference/authen-v1/authen/access_token
-        return response.json().get("data")
+        return data.get("data")
 
-    def authorize_app_access_token(self):
-        # 获取 app_access_token, 依托于飞书开放能力实现. 
-        # 文档链接: https://open.feishu.cn/document/ukTMukTMukTM/ukDNz4SO0MjL5QzM/auth-v3/auth/app_access_token_internal
-        url = self._gen_url(APP_ACCESS_TOKEN_URI)
-        # "app_id" 和 "app_secret" 位于HTTP请求的请求体
-        req_body = {"app_id": self.app_id, "app_secret": self.app_secret}
-        response = requests.post(url, req_body)
-        Feishu._check_error_response(response)
-        self._app_access_token = response.json().get("app_access_token")
+    async def login(self, code):
+        # 用临时授权码换取用户信息. access_token 接口已返回用户信息, 且 app_access_token 有缓存,
+        # 通常只需要一次请求; 信息不全时才额外调用 user_info 接口
+        token_data = await self.authorize_user_access_token(code)
+        user_info = {field: token_data[field] for field in USER_INFO_FIELDS if field in token_data}
+        if not user_info.get("open_id") or not user_info.get("name"):
+            user_info = await self.get_user_info(token_data.get("access_token"))
+        return user_info
+
+    async def _cached(self, name, fetch):
+        # 缓存 token 直到过期前 FEISHU_TOKEN_REFRESH_MARGIN 秒, 同一时刻只有一个协程去刷新 (single-flight)
+        cached = self._tokens.get(name)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            cached = self._tokens.get(name)
+            if cached and cached[1] > time.monotonic():
+                return cached[0]
+            value, expire = await fetch()
+            ttl = max(int(expire or 0) - FEISHU_TOKEN_REFRESH_MARGIN, 0)
+            self._tokens[name] = (value, time.monotonic() + ttl)
+            return value
+
+    async def _with_token(self, get_token, name, call):
+        # 使用缓存的 token 调用接口, token 被飞书判定失效时丢弃缓存并重试一次
+        try:
+            return await call(await get_token())
+        except FeishuException as e:
+            if e.code not in TOKEN_INVALID_CODES:
+                raise
+            log.warning(f"Cached {name} rejected by Feishu, refreshing")
+            self._tokens.pop(name, None)
+            return await call(await get_token())
 
-    def _gen_url(self, uri):
-        # 拼接飞书开放平台域名feishu_host和uri
-        return "{}{}".format(self.feishu_host, uri)
+    async def _request(self, method, uri, **kwargs):
+        # 对网络错误、5xx 和 429 做指数退避重试
+        delay = 0.2
+        for attempt in range(self.retries + 1):
+            try:
+                resp = await self.client.request(method, uri, **kwargs)
+                if resp.status_code < 500 and resp.status_code != 429:
+                    return Feishu._check_error_response(resp)
+                if attempt == self.retries:
+                    resp.raise_for_status()
+            except httpx.TransportError:
+                if attempt == self.retries:
+                    raise
+            log.warning(f"Retrying Feishu request {uri} (attempt {attempt + 1})")
+            await asyncio.sleep(delay)
+            delay *= 2
 
     @staticmethod
     def _check_error_response(resp):
         # 检查响应体是否包含错误信息
         # check if the response contains error information
-        if resp.status_code != 200:
-            raise resp.raise_for_status()
+        resp.raise_for_status()
         response_dict = resp.json()
         code = response_dict.get("code", -1)
         if code != 0:
             logging.error(response_dict)
             raise FeishuException(code=code, msg=response_dict.get("msg"))
+        return response_dict
 
 class FeishuException(Exception):
     # 处理并展示飞书侧返回的错误码和错误信息
@@ -0,0 +1,129 @@
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import itertools
+import json
+import logging
+import os
+import uuid
+from dotenv import load_dotenv
+from .metrics import registry
+
+log = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+# Events buffered per connection before a slow client is dropped
+INBOX_STREAM_QUEUE_SIZE = int(os.getenv("INBOX_STREAM_QUEUE_SIZE", "64"))
+# Events kept per user for Last-Event-ID replay, and users kept
+INBOX_REPLAY_SIZE = int(os.getenv("INBOX_REPLAY_SIZE", "32"))
+INBOX_REPLAY_USERS = int(os.getenv("INBOX_REPLAY_USERS", "10000"))
+INBOX_HEARTBEAT_INTERVAL = float(os.getenv("INBOX_HEARTBEAT_INTERVAL", "20"))
+
+Event = Tuple[str, str, str]  # (id, event name, json data)
+
+def format_event(event: Event) -> bytes:
+    event_id, name, data = event
+    return f"id: {event_id}\nevent: {name}\ndata: {data}\n\n".encode()
+
+class Subscriber:
+    """One connected event stream"""
+
+    __slots__ = ("queue", "overflowed")
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=INBOX_STREAM_QUEUE_SIZE)
+        self.overflowed = False
+
+class InboxHub:
+    """In-process pub/sub of inbox events, per user
+
+    Event ids carry a per-process prefix, so a Last-Event-ID issued by another
+    worker or before a restart is recognised as unknown and the client is told
+    to refetch rather than silently missing events.
+    """
+
+    def __init__(self):
+        self._prefix = uuid.uuid4().hex[:8]
+        self._counter = itertools.count(1)
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        self._recent: OrderedDict = OrderedDict()  # open_id -> deque of events
+
+    def publish(self, open_id: str, name: str, payload: dict):
+        event = (f"{self._prefix}-{next(self._counter)}", name, json.dumps(payload, ensure_ascii=False))
+        recent = self._recent.get(open_id)
+        if recent is None:
+            recent = self._recent[open_id] = deque(maxlen=INBOX_REPLAY_SIZE)
+            while len(self._recent) > INBOX_REPLAY_USERS:
+                self._recent.popitem(last=False)
+        self._recent.move_to_end(open_id)
+        recent.append(event)
+        for subscriber in self._subscribers.get(open_id, ()):
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Backpressure: drop the slow client, it resumes with Last-Event-ID
+                subscriber.overflowed = True
+
+    def publish_all(self, name: str, payload: dict):
+        """Publish to every user with a stream open on this process"""
+        for open_id in list(self._subscribers):
+            self.publish(open_id, name, payload)
+
+    def subscribe(self, open_id: str, last_event_id: Optional[str]) -> Tuple[Subscriber, Optional[List[Event]]]:
+        """Register a stream; returns the events to replay, or None if the client must refetch"""
+        subscriber = Subscriber()
+        self._subscribers.setdefault(open_id, set()).add(subscriber)
+        if not last_event_id:
+            return subscriber, []
+        recent = list(self._recent.get(open_id, ()))
+        ids = [event[0] for event in recent]
+        if last_event_id in ids:
+            return subscriber, recent[ids.index(last_event_id) + 1:]
+        return subscriber, None
+
+    def unsubscribe(self, open_id: str, subscriber: Subscriber):
+        subscribers = self._subscribers.get(open_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[open_id]
+
+    def close(self):
+        """End every open stream, so a draining worker is not held open by them"""
+        for subscribers in self._subscribers.values():
+            for subscriber in subscribers:
+                subscriber.overflowed = True
+                try:
+                    subscriber.queue.put_nowait(None)
+                except asyncio.QueueFull:
+                    pass
+
+    @property
+    def connections(self) -> int:
+        return sum(len(s) for s in self._subscribers.values())
+
+    async def stream(self, open_id: str, last_event_id: Optional[str]):
+        """Server-sent event stream for one client"""
+        subscriber, replay = self.subscribe(open_id, last_event_id)
+        try:
+            yield b"retry: 3000\n\n"
+            if replay is None:
+                yield format_event((f"{self._prefix}-0", "reset", "{}"))
+            else:
+                for event in replay:
+                    yield format_event(event)
+            while not subscriber.overflowed:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), INBOX_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                if event is None:
+                    break
+                yield format_event(event)
+        finally:
+            self.unsubscribe(open_id, subscriber)
+
+inbox_hub = InboxHub()
+registry.gauge("inbox_stream_connections", "Open inbox event streams", lambda: inbox_hub.connections)
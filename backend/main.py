@@ -1,14 +1,27 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from contextlib import asynccontextmanager
+import asyncio
 import os
+from typing import Optional
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 
-from .db import driver
-from .session_auth import verifier, create_protected_router, setup_auth_routes
+from .db import init_driver, close_driver, get_driver
+from .session_auth import auth, backend as session_backend, verifier, create_protected_router, setup_auth_routes
 from .user import setup_user_routes
-from .people import setup_people_routes
-from .network import setup_network_routes
+from .people import setup_people_routes, compact_tombstones_periodically
+from .relationships import setup_relationship_routes
+from .network import setup_network_routes, reconcile_stats_periodically
+from .session_store import sweep_expired_sessions
+from .schema import apply_schema
+from .matching import matcher, rebuild_matches_periodically
+from .analytics import run_analytics_periodically
+from .write_behind import write_behind
+from .reminders import run_reminders_periodically
+from .person_cache import person_cache
+from .metrics import MetricsMiddleware, registry, fetch_one, METRICS_TOKEN
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,9 +30,42 @@ log = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 FEISHU_APP_ID = os.getenv("FEISHU_APP_ID")
+# Seconds the readiness probe waits for Neo4j before reporting unavailable
+READINESS_TIMEOUT = float(os.getenv("READINESS_TIMEOUT", "2"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: open the Neo4j connection pool
+    driver = await init_driver()
+    await apply_schema(driver)
+    tasks = [
+        asyncio.create_task(sweep_expired_sessions(session_backend)),
+        asyncio.create_task(reconcile_stats_periodically()),
+        asyncio.create_task(rebuild_matches_periodically()),
+        asyncio.create_task(person_cache.listen()),
+        asyncio.create_task(compact_tombstones_periodically()),
+        asyncio.create_task(run_analytics_periodically()),
+        asyncio.create_task(write_behind.run_periodically()),
+        asyncio.create_task(run_reminders_periodically()),
+    ]
+    try:
+        yield
+    finally:
+        # Shutdown: stop background tasks and release pooled connections
+        for task in tasks:
+            task.cancel()
+        # Let cancelled tasks roll back their open transactions before the driver closes
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Queued updates are written while the driver is still open
+        await write_behind.close()
+        matcher.close()
+        await person_cache.close()
+        await session_backend.close()
+        await auth.aclose()
+        await close_driver()
 
 # Create FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # CORS Middleware
 app.add_middleware(
@@ -29,13 +75,36 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/api/public/hello")
-def read_root():
-    with driver.session() as session:
-        result = session.run("MATCH (n) RETURN 'Hello from Neo4j!' as message")
-        message = result.single()["message"]
-    return {"message": message}
+async def read_root():
+    async with get_driver().session() as session:
+        record = await fetch_one(session, "hello", "RETURN 'Hello from Neo4j!' as message")
+    return {"message": record["message"]}
+
+@app.get("/api/public/health")
+async def liveness():
+    """Liveness probe: the worker's event loop is serving requests"""
+    return {"status": "ok"}
+
+@app.get("/api/public/ready")
+async def readiness():
+    """Readiness probe: Neo4j answers a query that touches no data"""
+    try:
+        async with get_driver().session() as session:
+            await asyncio.wait_for(fetch_one(session, "ready", "RETURN 1 as ok"), READINESS_TIMEOUT)
+    except Exception as e:
+        log.warning(f"Readiness check failed: {str(e)}")
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"status": "ready"}
+
+@app.get("/api/internal/metrics")
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus text exposition of this worker's metrics"""
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/api/public/settings")
 def get_settings():
@@ -46,6 +115,7 @@ setup_auth_routes(app)
 # Below are protected routes    
 router = create_protected_router("/api/private")
 setup_user_routes(router,verifier)
-setup_people_routes(router)
-setup_network_routes(router)
+setup_people_routes(router, verifier)
+setup_relationship_routes(router, verifier)
+setup_network_routes(router, verifier)
 app.include_router(router)
\ No newline at end of file
@@ -0,0 +1,262 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import heapq
+import json
+import logging
+import math
+import os
+import numpy as np
+from dotenv import load_dotenv
+from .db import get_driver
+from .person_cache import CACHE_INVALIDATION_REDIS_URL, person_cache
+from .search import CJK, TOKEN
+
+log = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+# With a shared bus, changes reach every worker as they are made and the periodic
+# rebuild only bounds how long a lost change can linger; without one, other
+# workers catch up at the next rebuild
+MATCH_REBUILD_INTERVAL = float(os.getenv("MATCH_REBUILD_INTERVAL",
+                                         "86400" if CACHE_INVALIDATION_REDIS_URL else "3600"))
+# Query-time bounds: terms in more documents than this carry little signal and
+# are skipped, and scoring stops after visiting this many postings in total
+MATCH_MAX_TERM_DF = int(os.getenv("MATCH_MAX_TERM_DF", "5000"))
+MATCH_MAX_POSTINGS = int(os.getenv("MATCH_MAX_POSTINGS", "100000"))
+
+FIELDS = ("resources", "needs")
+# A person's needs are matched against other people's resources and vice versa
+DIRECTIONS = {"helpers": ("needs", "resources"), "helped": ("resources", "needs")}
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lower-cased words for latin text, overlapping bigrams for CJK runs"""
+    terms = []
+    for token in TOKEN.findall(text or ""):
+        if CJK.match(token):
+            if len(token) == 1:
+                terms.append(token)
+            else:
+                terms.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            terms.append(token.lower())
+    return terms
+
+def _vectorize(terms: List[str]) -> Dict[str, float]:
+    # sublinear tf, L2 normalised; idf is applied at query time so that
+    # incremental updates never need to reweight stored vectors
+    if not terms:
+        return {}
+    vocab, counts = np.unique(np.array(terms, dtype=object), return_counts=True)
+    weights = 1.0 + np.log(counts)
+    weights /= np.linalg.norm(weights)
+    return dict(zip(vocab.tolist(), weights.tolist()))
+
+def build_index(rows: List[Tuple[str, Optional[str], Optional[str]]]):
+    """Build the index for (id, resources, needs) rows in one vectorized pass.
+
+    Runs in a worker process during a full rebuild; weights are identical to
+    the ones MatchIndex.upsert computes one document at a time.
+    """
+    index = MatchIndex()
+    vocab: Dict[str, int] = {}
+    tokenized = {
+        field: [[vocab.setdefault(t, len(vocab)) for t in tokenize(row[position])] for row in rows]
+        for position, field in enumerate(FIELDS, start=1)
+    }
+    terms = np.array(list(vocab), dtype=object)
+    size = max(len(vocab), 1)
+    doc_terms = []
+    for field in FIELDS:
+        lengths = np.fromiter((len(ids) for ids in tokenized[field]), dtype=np.int64, count=len(rows))
+        if not lengths.sum():
+            continue
+        doc_ids = np.repeat(np.arange(len(rows), dtype=np.int64), lengths)
+        term_ids = np.fromiter((t for ids in tokenized[field] for t in ids), dtype=np.int64, count=int(lengths.sum()))
+        keys, counts = np.unique(doc_ids * size + term_ids, return_counts=True)
+        docs, term_ids = keys // size, keys % size
+        weights = 1.0 + np.log(counts)
+        weights /= np.sqrt(np.bincount(docs, weights * weights))[docs]
+        doc_terms.append(keys)
+        for doc, term, weight in zip(docs.tolist(), terms[term_ids].tolist(), weights.tolist()):
+            person_id = rows[doc][0]
+            entry = index.docs.setdefault(person_id, {f: {} for f in FIELDS})
+            entry[field][term] = weight
+            index.postings[field][term][person_id] = weight
+    if doc_terms:
+        # document frequency counts a term once per person across both fields
+        unique_pairs = np.unique(np.concatenate(doc_terms))
+        df = np.bincount(unique_pairs % size, minlength=size)
+        index.df.update((term, int(n)) for term, n in zip(terms.tolist(), df.tolist()) if n)
+    return index
+
+class MatchIndex:
+    """Inverted index over tokenized resources and needs"""
+
+    def __init__(self):
+        self.docs: Dict[str, Dict[str, Dict[str, float]]] = {}
+        # field -> term -> {person_id: weight}
+        self.postings = {field: defaultdict(dict) for field in FIELDS}
+        # term -> number of documents containing it in any field
+        self.df = defaultdict(int)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["postings"] = {field: dict(terms) for field, terms in self.postings.items()}
+        state["df"] = dict(self.df)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.postings = {field: defaultdict(dict, terms) for field, terms in state["postings"].items()}
+        self.df = defaultdict(int, state["df"])
+
+    def remove(self, person_id: str):
+        doc = self.docs.pop(person_id, None)
+        if not doc:
+            return
+        for field in FIELDS:
+            for term in doc[field]:
+                postings = self.postings[field][term]
+                postings.pop(person_id, None)
+                if not postings:
+                    del self.postings[field][term]
+        for term in set(doc["resources"]) | set(doc["needs"]):
+            self.df[term] -= 1
+            if self.df[term] <= 0:
+                del self.df[term]
+
+    def upsert(self, person_id: str, resources: Optional[str], needs: Optional[str]):
+        self.remove(person_id)
+        doc = {"resources": _vectorize(tokenize(resources)), "needs": _vectorize(tokenize(needs))}
+        if not doc["resources"] and not doc["needs"]:
+            return
+        self.docs[person_id] = doc
+        for field in FIELDS:
+            for term, weight in doc[field].items():
+                self.postings[field][term][person_id] = weight
+        for term in set(doc["resources"]) | set(doc["needs"]):
+            self.df[term] += 1
+
+    def _idf(self, term: str) -> float:
+        return math.log((1 + len(self.docs)) / (1 + self.df.get(term, 0))) + 1.0
+
+    def top_k(self, person_id: str, k: int = 10, direction: str = "helpers") -> List[Tuple[str, float]]:
+        """Rank other people by how well they match this person's needs (or resources)"""
+        source, target = DIRECTIONS[direction]
+        doc = self.docs.get(person_id)
+        if not doc or not doc[source]:
+            return []
+        query = [(t, w) for t, w in doc[source].items() if self.df.get(t, 0) <= MATCH_MAX_TERM_DF]
+        # most discriminative terms first, so the postings budget is spent where it matters
+        query.sort(key=lambda tw: tw[1] * self._idf(tw[0]), reverse=True)
+        scores = defaultdict(float)
+        budget = MATCH_MAX_POSTINGS
+        for term, weight in query:
+            postings = self.postings[target].get(term, {})
+            if len(postings) > budget:
+                break
+            budget -= len(postings)
+            idf = self._idf(term)
+            boost = weight * idf * idf
+            for candidate, candidate_weight in postings.items():
+                scores[candidate] += boost * candidate_weight
+        scores.pop(person_id, None)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+def build_indexes(rows: List[Tuple[str, str, Optional[str], Optional[str]]]) -> Dict[str, "MatchIndex"]:
+    """Build one index per owner from (owner, id, resources, needs) rows"""
+    by_owner = defaultdict(list)
+    for owner, *row in rows:
+        by_owner[owner].append(tuple(row))
+    return {owner: build_index(owner_rows) for owner, owner_rows in by_owner.items()}
+
+class Matcher:
+    """Holds a live index per owning user, applies incremental updates and swaps in full rebuilds.
+
+    Updates are published on `bus` so that every worker applies them, this one
+    included.
+    """
+
+    def __init__(self, bus):
+        self.indexes: Dict[str, MatchIndex] = {}
+        self._pending: Optional[List[Tuple]] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.bus = bus
+        self.bus.subscribe("match", self._receive)
+
+    def top_k(self, owner: str, person_id: str, k: int = 10, direction: str = "helpers"):
+        index = self.indexes.get(owner)
+        return index.top_k(person_id, k=k, direction=direction) if index else []
+
+    async def people_changed(self, owner: str, people: List[dict]):
+        await self._publish([("upsert", owner, p["id"], p.get("resources"), p.get("needs")) for p in people])
+
+    async def person_removed(self, owner: str, person_id: str):
+        await self._publish([("remove", owner, person_id)])
+
+    async def _publish(self, changes: List[Tuple]):
+        if not changes:
+            return
+        try:
+            # Both buses deliver to local subscribers before any I/O
+            await self.bus.publish("match", json.dumps(changes))
+        except Exception as e:
+            log.error(f"Error publishing match index changes: {e}")
+
+    def _receive(self, message: str):
+        for change in json.loads(message):
+            change = tuple(change)
+            self._apply(self.indexes, change)
+            if self._pending is not None:
+                self._pending.append(change)
+
+    @staticmethod
+    def _apply(indexes: Dict[str, MatchIndex], change: Tuple):
+        if change[0] == "upsert":
+            indexes.setdefault(change[1], MatchIndex()).upsert(*change[2:])
+        elif change[1] in indexes:
+            indexes[change[1]].remove(change[2])
+
+    async def _load_rows(self) -> List[Tuple]:
+        async with get_driver().session(fetch_size=5000) as session:
+            result = await session.run("""
+                MATCH (u:User)-[:OWNS]->(p:Person)
+                WHERE p.deleted = false AND (p.resources IS NOT NULL OR p.needs IS NOT NULL)
+                RETURN u.open_id as owner, elementId(p) as id, p.resources as resources, p.needs as needs
+            """)
+            return [(r["owner"], r["id"], r["resources"], r["needs"]) async for r in result]
+
+    async def rebuild(self):
+        """Rebuild the indexes in a worker process, then replay changes made meanwhile"""
+        self._pending = []
+        try:
+            rows = await self._load_rows()
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=1)
+            loop = asyncio.get_running_loop()
+            indexes = await loop.run_in_executor(self._executor, build_indexes, rows)
+            for change in self._pending:
+                self._apply(indexes, change)
+            self.indexes = indexes
+            log.info(f"Match indexes rebuilt with {len(rows)} people across {len(indexes)} users")
+        finally:
+            self._pending = None
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+matcher = Matcher(person_cache.bus)
+
+async def rebuild_matches_periodically(interval: float = MATCH_REBUILD_INTERVAL):
+    """Background task rebuilding the match index from the database"""
+    while True:
+        try:
+            await matcher.rebuild()
+        except Exception as e:
+            log.error(f"Error rebuilding match index: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,212 @@
+from neo4j import Query
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+import bisect
+import logging
+import os
+import random
+import time
+from dotenv import load_dotenv
+
+log = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+# Queries slower than this (seconds, client side) are logged with their name and timings
+SLOW_QUERY_THRESHOLD = float(os.getenv("SLOW_QUERY_THRESHOLD", "0.5"))
+# Fraction of wrapped queries run under PROFILE to sample db hits; 0 disables
+QUERY_PROFILE_SAMPLE_RATE = float(os.getenv("QUERY_PROFILE_SAMPLE_RATE", "0.01"))
+# When set, /api/internal/metrics requires "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _format_labels(labels: Labels) -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.items())
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(k)} {v}" for k, v in self._values.items()]
+        return lines
+
+class Gauge:
+    """Value read from a callback at scrape time"""
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self._read = read
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self._read()}"]
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and two list updates"""
+
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series: Dict[Labels, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.items())
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.register(Counter(name, help))
+
+    def histogram(self, name: str, help: str, buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, buckets))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, help, read))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "Time until response headers are sent, by route template")
+query_duration = registry.histogram(
+    "neo4j_query_duration_seconds", "Client-side time to run and fully consume a named query")
+query_server_time = registry.histogram(
+    "neo4j_query_server_seconds", "Server-reported result_available_after and result_consumed_after")
+query_rows = registry.counter("neo4j_query_rows_total", "Rows returned by named queries")
+query_db_hits = registry.counter("neo4j_query_db_hits_total", "Database hits of sampled PROFILE runs")
+query_profiled = registry.counter("neo4j_query_profiled_total", "Named query runs sampled with PROFILE")
+slow_queries = registry.counter("neo4j_slow_queries_total", "Named queries slower than SLOW_QUERY_THRESHOLD")
+
+def _db_hits(profile) -> int:
+    if not profile:
+        return 0
+    return profile.get("dbHits", 0) + sum(_db_hits(child) for child in profile.get("children", []))
+
+def _profiled(query):
+    if isinstance(query, Query):
+        return Query("PROFILE " + query.text, metadata=query.metadata, timeout=query.timeout)
+    return "PROFILE " + query
+
+def _profile_sampled() -> bool:
+    return QUERY_PROFILE_SAMPLE_RATE > 0 and random.random() < QUERY_PROFILE_SAMPLE_RATE
+
+def _observe(name: str, elapsed: float, rows: int, summary, profiled: bool):
+    query_duration.observe(elapsed, query=name)
+    query_rows.inc(rows, query=name)
+    available, consumed = summary.result_available_after, summary.result_consumed_after
+    if available is not None:
+        query_server_time.observe(available / 1000, query=name, phase="available")
+    if consumed is not None:
+        query_server_time.observe(consumed / 1000, query=name, phase="consumed")
+    if profiled:
+        query_profiled.inc(query=name)
+        query_db_hits.inc(_db_hits(summary.profile), query=name)
+    if elapsed > SLOW_QUERY_THRESHOLD:
+        slow_queries.inc(query=name)
+        log.warning(
+            f"Slow query {name}: {elapsed * 1000:.0f} ms, {rows} rows, "
+            f"server available after {available} ms, consumed after {consumed} ms"
+        )
+
+async def fetch(session, name: str, query, params: Optional[dict] = None, /, **kwargs) -> List[dict]:
+    """Run a query on a session or transaction, returning all rows as dicts.
+
+    `name` is a stable label such as "people.list"; timings, row counts and
+    sampled db hits are recorded under it. The leading arguments are
+    positional-only so query parameters such as `name=` pass through kwargs.
+    """
+    profile = _profile_sampled()
+    started = time.perf_counter()
+    result = await session.run(_profiled(query) if profile else query, params, **kwargs)
+    rows = [dict(record) async for record in result]
+    summary = await result.consume()
+    _observe(name, time.perf_counter() - started, len(rows), summary, profile)
+    return rows
+
+async def stream(session, name: str, query, params: Optional[dict] = None, /, **kwargs) -> AsyncIterator:
+    """Like fetch, but yields records as they arrive; wrap in contextlib.aclosing when
+    stopping early. Timings cover the whole stream, including the time spent sending rows on."""
+    profile = _profile_sampled()
+    started = time.perf_counter()
+    result = await session.run(_profiled(query) if profile else query, params, **kwargs)
+    rows = 0
+    try:
+        async for record in result:
+            rows += 1
+            yield record
+    finally:
+        summary = await result.consume()
+        _observe(name, time.perf_counter() - started, rows, summary, profile)
+
+async def fetch_one(session, name: str, query, params: Optional[dict] = None, /, **kwargs) -> Optional[dict]:
+    rows = await fetch(session, name, query, params, **kwargs)
+    return rows[0] if rows else None
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency by route template, method and status
+
+    Latency is measured until the response headers are sent, so long-lived
+    streams (exports, server-sent events) are counted by their time to first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                route = scope.get("route")
+                http_request_duration.observe(
+                    time.perf_counter() - started,
+                    route=getattr(route, "path", "unmatched"),
+                    method=scope["method"],
+                    status=str(message["status"]),
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,9 +1,19 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import ClassVar, List, Literal, Optional
 
 class SessionData(BaseModel):
     user_info: dict
 
+    REQUIRED_FIELDS: ClassVar[tuple] = ("open_id", "name")
+
+    @field_validator("user_info")
+    @classmethod
+    def require_identity(cls, user_info: dict) -> dict:
+        missing = [field for field in cls.REQUIRED_FIELDS if not user_info.get(field)]
+        if missing:
+            raise ValueError(f"Missing required field: {', '.join(missing)}")
+        return user_info
+
 class User(BaseModel):
     id: str = None  # Neo4j node ID
     name: str
@@ -24,12 +34,59 @@ class Person(BaseModel):
     city: Optional[str] = None
     resources: Optional[str] = None  # what this person can provide
     needs: Optional[str] = None  # what this person needs
+    follow_up_at: Optional[str] = None  # ISO date or timestamp of the next planned contact
     created_at: Optional[str] = None
     updated_at: Optional[str] = None # ISO format timestamp for last update  
 
+class PersonPatch(BaseModel):
+    """Fields to change on a person; omitted fields are left as they are, null clears a field"""
+    name: Optional[str] = None
+    nickname: Optional[str] = None
+    gender: Optional[str] = None
+    birthday: Optional[str] = None
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    city: Optional[str] = None
+    resources: Optional[str] = None
+    needs: Optional[str] = None
+    follow_up_at: Optional[str] = None
+
+    @field_validator("name")
+    @classmethod
+    def name_not_cleared(cls, name: Optional[str]) -> str:
+        if not name:
+            raise ValueError("name cannot be cleared")
+        return name
+
+class PersonPatchItem(BaseModel):
+    id: str
+    if_match: Optional[str] = None  # ETag from GET /people/{id}
+    changes: PersonPatch
+
 class InboxMessage(BaseModel):
     id: str = None  # Neo4j node ID
     date: str
     text: str
     read: bool = False
     message_type: str = 'System'
+    person_id: Optional[str] = None  # the person a Birthday or FollowUp reminder is about
+
+class InboxPage(BaseModel):
+    items: List[InboxMessage]
+    next_cursor: Optional[str] = None
+    read_cursor: Optional[str] = None  # position of the newest message, for POST /user/inbox/read
+    unread_count: int = 0
+
+class InboxReadRequest(BaseModel):
+    ids: Optional[List[str]] = None  # messages to mark as read
+    before: Optional[str] = None  # or everything at or older than this cursor
+
+class Announcement(BaseModel):
+    text: str = Field(..., min_length=1)
+    message_type: str = 'System'
+
+class Relationship(BaseModel):
+    to_id: str  # Neo4j node ID of the other person
+    type: Literal['KNOWS', 'INTRODUCED_BY'] = 'KNOWS'
+    strength: float = Field(0.5, ge=0, le=1)
+    note: Optional[str] = None
@@ -1,24 +1,239 @@
-from fastapi import APIRouter
-from .db import driver
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+import asyncio
+import bisect
+import hashlib
 import logging
+import orjson
+import os
+import time
+from dotenv import load_dotenv
+from .db import get_driver
+from .models import SessionData
+from .metrics import fetch
+from .analytics import insights_cache
+from .write_behind import write_behind
 
 log = logging.getLogger(__name__)
 
-def setup_network_routes(router: APIRouter):
+# Load environment variables
+load_dotenv()
+# Stats older than this are reconciled against the database before being served
+STATS_MAX_STALENESS = float(os.getenv("STATS_MAX_STALENESS", "600"))
+# How often the background task reconciles the incremental counters
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", "300"))
+# Number of users whose stats are kept in memory
+STATS_CACHE_SIZE = int(os.getenv("STATS_CACHE_SIZE", "10000"))
+RECENT_WINDOWS = (7, 30)
+
+# The unread counter is maintained on the User node by the inbox handlers, so
+# it comes with the per-city and per-gender counts at no extra cost
+NETWORK_STAT_QUERY = """
+    MATCH (u:User {open_id: $open_id})
+    OPTIONAL MATCH (u)-[:OWNS]->(p:Person)
+    WHERE p.deleted = false
+    RETURN coalesce(u.unread_count, 0) as unread, p.city as city, p.gender as gender, count(p) as n
+    """
+
+NETWORK_STAT_RECENT_QUERY = """
+    MATCH (:User {open_id: $open_id})-[:OWNS]->(p:Person)
+    WHERE p.created_at >= $cutoff AND p.deleted = false
+    RETURN p.created_at as created_at
+    ORDER BY p.created_at
+    """
+
+class NetworkStats:
+    """In-process statistics for one user's network
+
+    Reconciled from the database periodically and kept current in between by
+    the people and inbox handlers. A change that lands while a reconcile query
+    runs, or on another worker, may be counted twice or missed, which the next
+    reconcile corrects.
+    """
+
+    def __init__(self, open_id: str):
+        self.open_id = open_id
+        self.total = 0
+        self.by_city = Counter()
+        self.by_gender = Counter()
+        # sorted created_at of people added within the largest recent window
+        self.recent = []
+        self.unread = 0
+        self.reconciled_at = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _key(value):
+        return value or "unknown"
+
+    def _cutoff(self, days):
+        return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+    def _stale(self, max_age: float) -> bool:
+        return self.reconciled_at is None or time.monotonic() - self.reconciled_at > max_age
+
+    async def _reconcile(self):
+        async with get_driver().session() as session:
+            records = await fetch(session, "network.stat", NETWORK_STAT_QUERY, open_id=self.open_id)
+            by_city, by_gender, total, unread = Counter(), Counter(), 0, 0
+            for record in records:
+                unread = record["unread"]
+                if not record["n"]:
+                    continue
+                by_city[self._key(record["city"])] += record["n"]
+                by_gender[self._key(record["gender"])] += record["n"]
+                total += record["n"]
+            records = await fetch(session, "network.stat.recent", NETWORK_STAT_RECENT_QUERY,
+                open_id=self.open_id,
+                cutoff=self._cutoff(max(RECENT_WINDOWS))
+            )
+            recent = [record["created_at"] for record in records]
+        # Reads still queued on this worker are not in the counter yet, as in the inbox
+        unread = max(unread - len(write_behind.pending("inbox.read", self.open_id) or ()), 0)
+        self.total, self.by_city, self.by_gender, self.recent = total, by_city, by_gender, recent
+        self.unread = unread
+        self.reconciled_at = time.monotonic()
+
+    async def ensure_fresh(self, max_age: float = STATS_MAX_STALENESS):
+        if self._stale(max_age):
+            async with self._lock:
+                # Requests that waited here while another one reconciled get its result
+                if self._stale(max_age):
+                    await self._reconcile()
+
+    def person_created(self, person: dict):
+        self.total += 1
+        self.by_city[self._key(person.get("city"))] += 1
+        self.by_gender[self._key(person.get("gender"))] += 1
+        if person.get("created_at"):
+            bisect.insort(self.recent, person["created_at"])
+
+    def person_updated(self, before: dict, after: dict):
+        for counter, field in ((self.by_city, "city"), (self.by_gender, "gender")):
+            old, new = self._key(before.get(field)), self._key(after.get(field))
+            if old != new:
+                counter[old] -= 1
+                counter[new] += 1
+                if counter[old] <= 0:
+                    del counter[old]
+
+    def person_deleted(self, person: dict):
+        self.total = max(self.total - 1, 0)
+        for counter, field in ((self.by_city, "city"), (self.by_gender, "gender")):
+            key = self._key(person.get(field))
+            counter[key] -= 1
+            if counter[key] <= 0:
+                del counter[key]
+        created_at = person.get("created_at")
+        index = bisect.bisect_left(self.recent, created_at) if created_at else len(self.recent)
+        if index < len(self.recent) and self.recent[index] == created_at:
+            del self.recent[index]
+
+    def unread_changed(self, delta: int):
+        self.unread = max(self.unread + delta, 0)
+
+    def snapshot(self) -> dict:
+        stats = {
+            "total_people": self.total,
+            "by_city": dict(self.by_city),
+            "by_gender": dict(self.by_gender),
+            "unread_messages": self.unread,
+        }
+        for days in RECENT_WINDOWS:
+            cutoff = self._cutoff(days)
+            stats[f"added_last_{days}_days"] = len(self.recent) - bisect.bisect_left(self.recent, cutoff)
+        return stats
+
+class NetworkStatsCache:
+    """Per-user NetworkStats for recently active users, least recently used evicted first
+
+    Change notifications for users without cached stats are ignored: their
+    stats are reconciled from the database on next access anyway.
+    """
+
+    def __init__(self, size: int = STATS_CACHE_SIZE):
+        self._size = size
+        self._users: OrderedDict = OrderedDict()
+
+    def get(self, open_id: str) -> NetworkStats:
+        stats = self._users.get(open_id)
+        if stats is None:
+            stats = self._users[open_id] = NetworkStats(open_id)
+            while len(self._users) > self._size:
+                self._users.popitem(last=False)
+        self._users.move_to_end(open_id)
+        return stats
+
+    def person_created(self, open_id: str, person: dict):
+        if open_id in self._users:
+            self._users[open_id].person_created(person)
+
+    def person_updated(self, open_id: str, before: dict, after: dict):
+        if open_id in self._users:
+            self._users[open_id].person_updated(before, after)
+
+    def person_deleted(self, open_id: str, person: dict):
+        if open_id in self._users:
+            self._users[open_id].person_deleted(person)
+
+    def unread_changed(self, open_id: str, delta: int):
+        if open_id in self._users:
+            self._users[open_id].unread_changed(delta)
+
+    def unread_counted(self, open_id: str, unread: int):
+        if open_id in self._users:
+            self._users[open_id].unread = unread
+
+    def announcement_delivered(self):
+        # Announcements go to every user
+        for stats in self._users.values():
+            stats.unread_changed(1)
+
+    async def reconcile_stale(self, max_age: float):
+        for stats in list(self._users.values()):
+            if stats.reconciled_at is not None:
+                await stats.ensure_fresh(max_age)
+
+network_stats = NetworkStatsCache()
+
+async def reconcile_stats_periodically(interval: float = STATS_RECONCILE_INTERVAL):
+    """Background task keeping the incremental counters honest"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await network_stats.reconcile_stale(interval)
+        except Exception as e:
+            log.error(f"Error reconciling network stats: {e}")
+
+def setup_network_routes(router: APIRouter, verifier):
 
     @router.get("/network/stat")
-    async def get_network_stats():
+    async def get_network_stats(request: Request, session_data: SessionData = Depends(verifier)):
         try:
-            with driver.session() as session:
-                # 查询所有人的数量
-                result = session.run("""
-                    MATCH (p:Person)
-                    RETURN count(p) as total_people
-                """)
-                stats = result.single()
-                return {
-                    "total_people": stats["total_people"]
-                }
+            user_stats = network_stats.get(session_data.user_info["open_id"])
+            await user_stats.ensure_fresh()
+            stats = user_stats.snapshot()
         except Exception as e:
             log.error(f"Error getting network stats: {e}")
             return {"error": "Failed to get network stats"}
+        body = orjson.dumps(stats, option=orjson.OPT_SORT_KEYS)
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    @router.get("/network/insights")
+    async def get_network_insights(request: Request, session_data: SessionData = Depends(verifier)):
+        """Key connectors, brokers and communities from the last analytics run"""
+        try:
+            body, etag = await insights_cache.get(session_data.user_info["open_id"])
+        except Exception as e:
+            log.error(f"Error getting network insights: {e}")
+            raise HTTPException(status_code=500, detail="Failed to get network insights")
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        # Stored as JSON by the analytics run, so served as is
+        return Response(content=body, media_type="application/json", headers=headers)
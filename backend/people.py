@@ -1,81 +1,569 @@
-from fastapi import APIRouter, HTTPException
-from datetime import datetime, timezone
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+import asyncio
+import base64
+import contextlib
+import json
 import logging
-from .db import driver
-from .models import Person
+import os
+from dotenv import load_dotenv
+from .db import get_driver
+from .models import Person, PersonPatch, PersonPatchItem, SessionData
+from .metrics import fetch, fetch_one, stream
+from .network import network_stats
+from .search import build_search_query
+from .matching import matcher, DIRECTIONS
+from .person_cache import person_cache, etag_matches, person_etag, person_version, parse_if_match
+from .serialization import RecordResponse, stream_object
+from .write_behind import write_behind
+from .reminders import birthday_md
+from .people_io import BulkImport, iter_csv_rows, iter_ndjson_rows, iter_people, export_csv, export_ndjson
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
-def setup_people_routes(router: APIRouter):
+# Load environment variables
+load_dotenv()
+# Tombstones of deleted people are kept this long for clients syncing via /people/changes
+PEOPLE_TOMBSTONE_TTL_DAYS = float(os.getenv("PEOPLE_TOMBSTONE_TTL_DAYS", "30"))
+PEOPLE_COMPACT_INTERVAL = float(os.getenv("PEOPLE_COMPACT_INTERVAL", "3600"))
+PEOPLE_COMPACT_BATCH_SIZE = int(os.getenv("PEOPLE_COMPACT_BATCH_SIZE", "1000"))
+
+MAX_PAGE_SIZE = 100
+MAX_CHANGES_PAGE = 1000
+MAX_SEARCH_OFFSET = 1000
+MAX_PATCH_BATCH = 500
+TYPEAHEAD_FIELDS = ["id", "name", "nickname", "city"]
+PERSON_FIELDS = [
+    "id", "name", "nickname", "gender", "birthday", "phone", "email",
+    "city", "resources", "needs", "follow_up_at", "created_at", "updated_at",
+]
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Validate a comma separated `fields=` projection, defaulting to all fields"""
+    if not fields:
+        return PERSON_FIELDS
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in PERSON_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+def person_projection(fields: List[str], var: str = "p") -> str:
+    """RETURN clause for the given fields; id and created_at are always included for the cursor"""
+    columns = [f"elementId({var}) as id", f"{var}.created_at as created_at"]
+    columns += [f"{var}.{f} as {f}" for f in fields if f not in ("id", "created_at")]
+    return ", ".join(columns)
+
+def list_query(conditions: List[str], fields: List[str]) -> str:
+    return (
+        "MATCH (:User {open_id: $open_id})-[:OWNS]->(p:Person) "
+        f"WHERE {' AND '.join(conditions)} "
+        f"RETURN {person_projection(fields)} "
+        "ORDER BY p.created_at DESC, elementId(p) DESC LIMIT $limit"
+    )
+
+def changes_query(conditions: List[str], fields: List[str]) -> str:
+    return (
+        f"MATCH (p:Person) WHERE {' AND '.join(conditions)} "
+        f"RETURN {person_projection(fields)}, p.change_seq as change_seq, p.deleted as deleted "
+        "ORDER BY p.change_seq LIMIT $limit"
+    )
+
+GET_PERSON_QUERY = """
+    MATCH (:User {open_id: $open_id})-[:OWNS]->(p:Person)
+    WHERE elementId(p) = $person_id AND p.deleted = false
+    RETURN elementId(p) as id, p.name as name, p.nickname as nickname,
+           p.gender as gender, p.birthday as birthday, p.phone as phone,
+           p.email as email, p.city as city, p.resources as resources, p.needs as needs,
+           p.follow_up_at as follow_up_at, p.created_at as created_at, p.updated_at as updated_at
+    """
+
+COMPACT_QUERY = """
+    MATCH (p:Person) WHERE p.deleted_at < $cutoff AND p.deleted = true
+    WITH p LIMIT $batch
+    WITH p.owner AS owner, collect(p) AS tombstones, max(p.change_seq) AS seq
+    OPTIONAL MATCH (u:User {open_id: owner})
+    SET u.compacted_seq = CASE WHEN coalesce(u.compacted_seq, 0) > seq
+                               THEN u.compacted_seq ELSE seq END
+    WITH tombstones
+    UNWIND tombstones AS p
+    DETACH DELETE p
+    RETURN count(*) as removed
+    """
+
+def search_query(fields: List[str]) -> str:
+    return (
+        "CALL db.index.fulltext.queryNodes('person_owner_search', $query, {skip: $offset, limit: $limit}) "
+        "YIELD node AS p, score "
+        "WHERE p.owner = $open_id AND p.deleted = false "
+        f"RETURN {person_projection(fields)}, score"
+    )
+
+CHANGES_SEQ_QUERY = """
+    MATCH (u:User {open_id: $open_id})
+    RETURN coalesce(u.change_seq, 0) as change_seq, coalesce(u.compacted_seq, 0) as compacted_seq
+    """
+
+MATCHES_QUERY = """
+    MATCH (:User {open_id: $open_id})-[:OWNS]->(p:Person)
+    WHERE elementId(p) IN $ids AND p.deleted = false
+    RETURN elementId(p) as id, p.name as name, p.nickname as nickname,
+           p.city as city, p.resources as resources, p.needs as needs
+    """
+
+CREATE_PERSON_QUERY = f"""
+    MATCH (u:User {{open_id: $open_id}})
+    SET u.change_seq = coalesce(u.change_seq, 0) + 1,
+        u.graph_seq = coalesce(u.graph_seq, 0) + 1
+    CREATE (u)-[:OWNS]->(n:Person {{
+        owner: $open_id,
+        deleted: false,
+        change_seq: u.change_seq,
+        name: $name,
+        nickname: $nickname,
+        gender: $gender,
+        birthday: $birthday,
+        birthday_md: {birthday_md("$birthday")},
+        phone: $phone,
+        email: $email,
+        city: $city,
+        resources: $resources,
+        needs: $needs,
+        follow_up_at: $follow_up_at,
+        created_at: $now,
+        updated_at: $now
+    }})
+    RETURN elementId(n) as id, n.name as name, n.nickname as nickname,
+            n.gender as gender, n.birthday as birthday, n.phone as phone,
+            n.email as email, n.city as city, n.resources as resources, n.needs as needs,
+            n.follow_up_at as follow_up_at, n.created_at as created_at, n.updated_at as updated_at
+    """
+
+UPDATE_PERSON_QUERY = f"""
+    MATCH (u:User {{open_id: $open_id}})-[:OWNS]->(n:Person)
+    WHERE elementId(n) = $person_id AND n.deleted = false
+    WITH u, n, n.city as old_city, n.gender as old_gender
+    SET u.change_seq = coalesce(u.change_seq, 0) + 1
+    SET n.change_seq = u.change_seq,
+        n.name = $name,
+        n.nickname = $nickname,
+        n.gender = $gender,
+        n.birthday = $birthday,
+        n.birthday_md = {birthday_md("$birthday")},
+        n.phone = $phone,
+        n.email = $email,
+        n.city = $city,
+        n.resources = $resources,
+        n.needs = $needs,
+        n.follow_up_at = $follow_up_at,
+        n.updated_at = $now
+    RETURN elementId(n) as id, n.name as name, n.nickname as nickname,
+            n.gender as gender, n.birthday as birthday, n.phone as phone,
+            n.email as email, n.city as city, n.resources as resources, n.needs as needs,
+            n.follow_up_at as follow_up_at, n.created_at as created_at, n.updated_at as updated_at,
+            old_city, old_gender
+    """
+
+DELETE_PERSON_QUERY = """
+    MATCH (u:User {open_id: $open_id})-[:OWNS]->(n:Person)
+    WHERE elementId(n) = $person_id AND n.deleted = false
+    SET u.change_seq = coalesce(u.change_seq, 0) + 1,
+        u.graph_seq = coalesce(u.graph_seq, 0) + 1
+    WITH u, n, n.city as city, n.gender as gender, n.created_at as created_at
+    // Former neighbours are marked for the next analytics run
+    OPTIONAL MATCH (n)-[r]-(m:Person)
+    SET m.graph_seq = u.graph_seq
+    DELETE r
+    WITH DISTINCT u, n, city, gender, created_at
+    // The tombstone keeps only what sync and compaction need
+    SET n = {owner: $open_id, deleted: true, deleted_at: $now, updated_at: $now,
+             created_at: created_at, change_seq: u.change_seq}
+    RETURN city, gender, created_at
+    """
+
+PATCH_LOCK_QUERY = """
+    MATCH (:User {open_id: $open_id})-[:OWNS]->(n:Person)
+    WHERE elementId(n) IN $ids AND n.deleted = false
+    SET n._lock = true
+    REMOVE n._lock
+    RETURN elementId(n) as id, n.updated_at as updated_at, n.created_at as created_at
+    """
+
+PATCH_QUERY = f"""
+    MATCH (u:User {{open_id: $open_id}})
+    SET u.change_seq = coalesce(u.change_seq, 0) + size($updates)
+    WITH u, u.change_seq - size($updates) AS base
+    UNWIND range(0, size($updates) - 1) AS i
+    WITH u, $updates[i] AS update, base + i + 1 AS seq
+    MATCH (u)-[:OWNS]->(n:Person)
+    WHERE elementId(n) = update.id
+    WITH update, seq, n, n.city as old_city, n.gender as old_gender
+    SET n += update.changes, n.updated_at = $now, n.change_seq = seq
+    SET n.birthday_md = {birthday_md("n.birthday")}
+    RETURN elementId(n) as id, n.name as name, n.nickname as nickname,
+           n.gender as gender, n.birthday as birthday, n.phone as phone,
+           n.email as email, n.city as city, n.resources as resources, n.needs as needs,
+           n.follow_up_at as follow_up_at, n.created_at as created_at, n.updated_at as updated_at,
+           old_city, old_gender
+    """
+
+def encode_cursor(created_at: str, person_id: str) -> str:
+    raw = json.dumps([created_at, person_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, person_id = json.loads(raw)
+        return str(created_at), str(person_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def people_created(owner: str, people: List[dict]):
+    """Keep derived in-process state in step with newly created people"""
+    for person in people:
+        network_stats.person_created(owner, person)
+    await matcher.people_changed(owner, people)
+
+class PatchConflict(Exception):
+    """Raised inside a patch transaction to roll it back"""
+
+    def __init__(self, missing: List[str], conflicts: List[dict]):
+        super().__init__(f"{len(missing)} missing, {len(conflicts)} conflicting")
+        self.missing = missing
+        self.conflicts = conflicts
+
+async def _patch_people(tx, owner, updates, now):
+    # Lock every target first, then compare versions: a version read after the
+    # write lock cannot change before commit, so concurrent patches serialize
+    # instead of overwriting each other
+    ids = [update["id"] for update in updates]
+    records = await fetch(tx, "people.patch.lock", PATCH_LOCK_QUERY,
+        ids=ids,
+        open_id=owner
+    )
+    current = {record["id"]: record for record in records}
+    missing = [person_id for person_id in ids if person_id not in current]
+    conflicts = [
+        {"id": update["id"], "etag": person_etag(current[update["id"]])}
+        for update in updates
+        if update["id"] in current and update["expected"] is not None
+        and person_version(current[update["id"]]) != update["expected"]
+    ]
+    if missing or conflicts:
+        raise PatchConflict(missing, conflicts)
+    return await fetch(tx, "people.patch", PATCH_QUERY,
+        updates=[{"id": update["id"], "changes": update["changes"]} for update in updates],
+        now=now,
+        open_id=owner
+    )
+
+async def patch_people(owner: str, updates: List[dict]) -> List[dict]:
+    """Apply partial updates in one transaction and bring derived state in step.
+
+    Each update is {"id", "expected" (version or None), "changes"}; raises
+    PatchConflict, with nothing written, if any target is missing or stale.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    async with get_driver().session() as session:
+        records = await session.execute_write(_patch_people, owner, updates, now)
+    people = []
+    for record in records:
+        before = {"city": record.pop("old_city"), "gender": record.pop("old_gender")}
+        await person_cache.invalidate(owner, record["id"])
+        network_stats.person_updated(owner, before, record)
+        people.append(record)
+    await matcher.people_changed(owner, people)
+    return people
+
+async def compact_tombstones() -> int:
+    """Remove expired tombstones, raising each owner's compacted_seq past them"""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=PEOPLE_TOMBSTONE_TTL_DAYS)).isoformat()
+    removed = 0
+    async with get_driver().session() as session:
+        while True:
+            record = await fetch_one(session, "people.compact", COMPACT_QUERY,
+                cutoff=cutoff,
+                batch=PEOPLE_COMPACT_BATCH_SIZE
+            )
+            batch = record["removed"] if record else 0
+            removed += batch
+            if batch < PEOPLE_COMPACT_BATCH_SIZE:
+                return removed
+
+async def compact_tombstones_periodically(interval: float = PEOPLE_COMPACT_INTERVAL):
+    """Background task pruning tombstones older than PEOPLE_TOMBSTONE_TTL_DAYS"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await compact_tombstones()
+            if removed:
+                log.info(f"Compacted {removed} deleted people")
+        except Exception as e:
+            log.error(f"Error compacting deleted people: {e}")
+
+def setup_people_routes(router: APIRouter, verifier):
     @router.get("/people/")
-    def get_people(limit: int = 10):
+    async def get_people(
+        limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        fields: Optional[str] = None,
+        city: Optional[str] = None,
+        gender: Optional[str] = None,
+        created_from: Optional[str] = None,
+        created_to: Optional[str] = None,
+        updated_from: Optional[str] = None,
+        updated_to: Optional[str] = None,
+        session_data: SessionData = Depends(verifier),
+    ):
+        """List the current user's people newest first, one keyset page at a time"""
+        selected = parse_fields(fields)
+        params = {"limit": limit + 1, "open_id": session_data.user_info["open_id"]}
+        if cursor:
+            params["after_created_at"], params["after_id"] = decode_cursor(cursor)
+            # Resume after the last row of the previous page, ties broken by element id
+            conditions = [
+                "p.created_at <= $after_created_at",
+                "(p.created_at < $after_created_at OR elementId(p) < $after_id)",
+            ]
+        else:
+            conditions = ["p.created_at IS NOT NULL"]
+        conditions.append("p.deleted = false")
+        for name, value, condition in (
+            ("city", city, "p.city = $city"),
+            ("gender", gender, "p.gender = $gender"),
+            ("created_from", created_from, "p.created_at >= $created_from"),
+            ("created_to", created_to, "p.created_at < $created_to"),
+            ("updated_from", updated_from, "p.updated_at >= $updated_from"),
+            ("updated_to", updated_to, "p.updated_at < $updated_to"),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                params[name] = value
         try:
-            with driver.session() as session:
-                result = session.run(
-                    "MATCH (p:Person) "
-                    "RETURN elementId(p) as id, p.name as name, p.nickname as nickname, "
-                    "p.gender as gender, p.birthday as birthday, p.phone as phone, "
-                    "p.email as email, p.city as city, p.resources as resources, p.needs as needs, "
-                    "p.created_at as created_at, p.updated_at as updated_at "
-                    "ORDER BY p.created_at DESC LIMIT $limit",
-                    limit=limit
-                )
-                return [dict(record) for record in result]
+            async with get_driver().session() as session:
+                rows = await fetch(session, "people.list", list_query(conditions, selected), params)
         except Exception as e:
             log.error(f"Error fetching people: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+        return RecordResponse({
+            "items": [{k: row[k] for k in selected} for row in rows],
+            "next_cursor": next_cursor,
+        })
 
-    @router.get("/people/{person_id}")
-    def get_person(person_id: str):
-        """Get a single person's details"""
+    @router.post("/people/bulk")
+    async def bulk_import_people(request: Request, session_data: SessionData = Depends(verifier)):
+        """Import people into the current user's network from a streamed NDJSON or CSV (with header) body"""
+        owner = session_data.user_info["open_id"]
+        content_type = request.headers.get("content-type", "")
+        if "csv" in content_type:
+            rows = iter_csv_rows(request.stream())
+        else:
+            rows = iter_ndjson_rows(request.stream())
+        bulk = BulkImport(owner, on_created=lambda people: people_created(owner, people))
         try:
-            with driver.session() as session:
-                result = session.run(
-                    """
-                    MATCH (p:Person)
-                    WHERE elementId(p) = $person_id
-                    RETURN elementId(p) as id, p.name as name, p.nickname as nickname,
-                           p.gender as gender, p.birthday as birthday, p.phone as phone,
-                           p.email as email, p.city as city, p.resources as resources, p.needs as needs,
-                           p.created_at as created_at, p.updated_at as updated_at
-                    """,
-                    person_id=person_id
+            async for line, row in rows:
+                await bulk.add(line, row)
+            await bulk.flush()
+        except Exception as e:
+            log.error(f"Error importing people: {str(e)}")
+            # Batches written before the failure stay committed
+            raise HTTPException(status_code=500, detail={"error": str(e), **bulk.report()})
+        return bulk.report()
+
+    @router.get("/people/export")
+    async def export_people(
+        format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+        session_data: SessionData = Depends(verifier),
+    ):
+        """Stream every person in the current user's network as NDJSON or CSV"""
+        people = iter_people(session_data.user_info["open_id"])
+        if format == "csv":
+            return StreamingResponse(
+                export_csv(people),
+                media_type="text/csv; charset=utf-8",
+                headers={"Content-Disposition": 'attachment; filename="people.csv"'},
+            )
+        return StreamingResponse(export_ndjson(people), media_type="application/x-ndjson")
+
+    @router.get("/people/search")
+    async def search_people(
+        q: str,
+        prefix: bool = False,
+        limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+        offset: int = Query(0, ge=0, le=MAX_SEARCH_OFFSET),
+        fields: Optional[str] = None,
+        session_data: SessionData = Depends(verifier),
+    ):
+        """Full-text search over name, nickname, city, resources and needs, best match first.
+
+        prefix=true is the typeahead mode: the last word is matched as a prefix
+        and only the fields needed for a suggestion list are returned by default.
+        """
+        selected = parse_fields(fields) if fields else (TYPEAHEAD_FIELDS if prefix else PERSON_FIELDS)
+        query = build_search_query(q, prefix=prefix, owner=session_data.user_info["open_id"])
+        if not query:
+            return {"items": [], "next_offset": None}
+        try:
+            async with get_driver().session() as session:
+                rows = await fetch(session, "people.search", search_query(selected),
+                    query=query,
+                    offset=offset,
+                    limit=limit + 1,
+                    open_id=session_data.user_info["open_id"]
                 )
-                record = result.single()
-                if not record:
-                    raise HTTPException(status_code=404, detail="Person not found")
-                return dict(record)
         except Exception as e:
-            log.error(f"Error fetching person details: {str(e)}")
+            log.error(f"Error searching people: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
+        next_offset = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_offset = offset + limit
+        return RecordResponse({
+            "items": [{**{k: row[k] for k in selected}, "score": row["score"]} for row in rows],
+            "next_offset": next_offset,
+        })
+
+    @router.get("/people/changes")
+    async def get_people_changes(
+        since: int = Query(0, ge=0),
+        limit: int = Query(100, ge=1, le=MAX_CHANGES_PAGE),
+        fields: Optional[str] = None,
+        session_data: SessionData = Depends(verifier),
+    ):
+        """People created, updated or deleted after change sequence `since`, oldest first.
+
+        Start from since=0 and pass back `since` from each response until
+        has_more is false. Deleted people appear as {id, change_seq, deleted: true}.
+        410 means tombstones the client never saw were compacted: resync from 0.
+        """
+        selected = parse_fields(fields)
+        owner = session_data.user_info["open_id"]
+        conditions = ["p.owner = $open_id", "p.change_seq > $since"]
+        if since == 0:
+            # A client starting from scratch has nothing to delete
+            conditions.append("p.deleted = false")
+        try:
+            async with get_driver().session() as session:
+                user = await fetch_one(session, "people.changes.seq", CHANGES_SEQ_QUERY,
+                    open_id=owner
+                )
+        except Exception as e:
+            log.error(f"Error fetching people changes: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+        if user and 0 < since < user["compacted_seq"]:
+            raise HTTPException(status_code=410, detail="Changes since this point were compacted, resync from since=0")
+        page = {"since": since, "has_more": False}
+
+        async def changes():
+            # Rows are encoded as they arrive rather than collected into a page first
+            try:
+                async with get_driver().session() as session:
+                    rows = stream(session, "people.changes", changes_query(conditions, selected),
+                        open_id=owner,
+                        since=since,
+                        limit=limit + 1
+                    )
+                    async with contextlib.aclosing(rows):
+                        emitted = 0
+                        async for row in rows:
+                            if emitted == limit:
+                                page["has_more"] = True
+                                break
+                            emitted += 1
+                            page["since"] = row["change_seq"]
+                            if row["deleted"]:
+                                yield {"id": row["id"], "change_seq": row["change_seq"], "deleted": True}
+                            else:
+                                yield {**{k: row[k] for k in selected}, "change_seq": row["change_seq"], "deleted": False}
+            except Exception as e:
+                # Headers are already sent; the response ends without its closing fields
+                log.error(f"Error streaming people changes: {str(e)}")
+                raise
+
+        def tail():
+            # Every change up to the sequence read first is committed and included
+            next_since = page["since"]
+            if not page["has_more"] and user:
+                next_since = max(next_since, user["change_seq"])
+            return {"since": next_since, "has_more": page["has_more"]}
+
+        return StreamingResponse(stream_object("changes", changes(), tail), media_type="application/json")
+
+    @router.get("/people/{person_id}")
+    async def get_person(person_id: str, request: Request, session_data: SessionData = Depends(verifier)):
+        """Get a single person's details, from the person cache when possible"""
+        owner = session_data.user_info["open_id"]
+        entry = person_cache.get(owner, person_id)
+        if entry is None:
+            generation = person_cache.generation()
+            try:
+                async with get_driver().session() as session:
+                    record = await fetch_one(session, "people.get", GET_PERSON_QUERY,
+                        person_id=person_id,
+                        open_id=owner
+                    )
+            except Exception as e:
+                log.error(f"Error fetching person details: {str(e)}")
+                raise HTTPException(status_code=500, detail=str(e))
+            if not record:
+                raise HTTPException(status_code=404, detail="Person not found")
+            entry = person_cache.put(owner, record, generation)
+        try:
+            # Counted for cached and conditional reads too, one write per batch
+            await write_behind.put("person.view", (owner, person_id), (1, datetime.now(timezone.utc).isoformat()))
+        except Exception as e:
+            log.warning(f"Dropping person view: {str(e)}")
+        headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(entry.body, media_type="application/json", headers=headers)
+
+    @router.get("/people/{person_id}/matches")
+    async def get_person_matches(
+        person_id: str,
+        k: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+        direction: str = Query("helpers", pattern=f"^({'|'.join(DIRECTIONS)})$"),
+        session_data: SessionData = Depends(verifier),
+    ):
+        """People whose resources fit this person's needs (helpers) or whose needs fit their resources (helped)"""
+        owner = session_data.user_info["open_id"]
+        ranked = matcher.top_k(owner, person_id, k=k, direction=direction)
+        if not ranked:
+            return []
+        fields = ("id", "name", "nickname", "city", "resources", "needs")
+        cached = person_cache.get_many(owner, (candidate for candidate, _ in ranked))
+        people = {cid: {f: record[f] for f in fields} for cid, record in cached.items()}
+        missing = [candidate for candidate, _ in ranked if candidate not in people]
+        if missing:
+            try:
+                async with get_driver().session() as session:
+                    records = await fetch(session, "people.matches", MATCHES_QUERY,
+                        ids=missing,
+                        open_id=owner
+                    )
+                    people.update((record["id"], record) for record in records)
+            except Exception as e:
+                log.error(f"Error fetching matches: {str(e)}")
+                raise HTTPException(status_code=500, detail=str(e))
+        return RecordResponse([{**people[candidate], "score": score} for candidate, score in ranked if candidate in people])
 
     @router.post("/people/")
-    def create_person(person: Person):
+    async def create_person(person: Person, session_data: SessionData = Depends(verifier)):
+        owner = session_data.user_info["open_id"]
         try:
-            with driver.session() as session:
+            async with get_driver().session() as session:
                 now = datetime.now(timezone.utc).isoformat()
-                result = session.run(
-                    """
-                    CREATE (n:Person {
-                        name: $name,
-                        nickname: $nickname,
-                        gender: $gender,
-                        birthday: $birthday,
-                        phone: $phone,
-                        email: $email,
-                        city: $city,
-                        resources: $resources,
-                        needs: $needs,
-                        created_at: $now,
-                        updated_at: $now
-                    })
-                    RETURN elementId(n) as id, n.name as name, n.nickname as nickname,
-                            n.gender as gender, n.birthday as birthday, n.phone as phone,
-                            n.email as email, n.city as city, n.resources as resources, n.needs as needs,
-                            n.created_at as created_at, n.updated_at as updated_at
-                    """,
+                record = await fetch_one(session, "people.create", CREATE_PERSON_QUERY,
                     name=person.name,
                     nickname=person.nickname,
                     gender=person.gender,
@@ -85,37 +573,28 @@ def setup_people_routes(router: APIRouter):
                     city=person.city,
                     resources=person.resources,
                     needs=person.needs,
-                    now=now
+                    follow_up_at=person.follow_up_at,
+                    now=now,
+                    open_id=owner
                 )
-                return dict(result.single())
+                if not record:
+                    raise HTTPException(status_code=404, detail="User not found")
+                record = dict(record)
+                await people_created(owner, [record])
+                return record
+        except HTTPException:
+            raise
         except Exception as e:
             log.error(f"Error creating person: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))    
 
     @router.put("/people/{person_id}")
-    def update_person(person_id: str, person: Person):
+    async def update_person(person_id: str, person: Person, session_data: SessionData = Depends(verifier)):
+        owner = session_data.user_info["open_id"]
         try:
-            with driver.session() as session:
+            async with get_driver().session() as session:
                 now = datetime.now(timezone.utc).isoformat()
-                result = session.run(
-                    """
-                    MATCH (n)
-                    WHERE elementId(n) = $person_id
-                    SET n.name = $name,
-                        n.nickname = $nickname,
-                        n.gender = $gender,
-                        n.birthday = $birthday,
-                        n.phone = $phone,
-                        n.email = $email,
-                        n.city = $city,
-                        n.resources = $resources,
-                        n.needs = $needs,
-                        n.updated_at = $now
-                    RETURN elementId(n) as id, n.name as name, n.nickname as nickname,
-                            n.gender as gender, n.birthday as birthday, n.phone as phone,
-                            n.email as email, n.city as city, n.resources as resources, n.needs as needs,
-                            n.created_at as created_at, n.updated_at as updated_at
-                    """,
+                record = await fetch_one(session, "people.update", UPDATE_PERSON_QUERY,
                     person_id=person_id,
                     name=person.name,
                     nickname=person.nickname,
@@ -126,28 +605,88 @@ def setup_people_routes(router: APIRouter):
                     city=person.city,
                     resources=person.resources,
                     needs=person.needs,
-                    now=now
+                    follow_up_at=person.follow_up_at,
+                    now=now,
+                    open_id=owner
                 )
-                record = result.single()
                 if not record:
                     raise HTTPException(status_code=404, detail="Person not found")
-                return dict(record)
+                updated = dict(record)
+                before = {"city": updated.pop("old_city"), "gender": updated.pop("old_gender")}
+                await person_cache.invalidate(owner, person_id)
+                network_stats.person_updated(owner, before, updated)
+                await matcher.people_changed(owner, [updated])
+                return updated
+        except HTTPException:
+            raise
         except Exception as e:
             log.error(f"Error updating person: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e)) 
 
+    @router.patch("/people/")
+    async def patch_people_batch(
+        updates: List[PersonPatchItem] = Body(..., max_length=MAX_PATCH_BATCH),
+        session_data: SessionData = Depends(verifier),
+    ):
+        """Partially update many people in one transaction; all or nothing"""
+        owner = session_data.user_info["open_id"]
+        ids = [update.id for update in updates]
+        if len(set(ids)) != len(ids):
+            raise HTTPException(status_code=400, detail="Duplicate person ids")
+        try:
+            people = await patch_people(owner, [
+                {"id": update.id, "expected": parse_if_match(update.if_match),
+                 "changes": update.changes.model_dump(exclude_unset=True)}
+                for update in updates
+            ])
+        except PatchConflict as e:
+            if e.missing:
+                raise HTTPException(status_code=404, detail={"missing": e.missing})
+            raise HTTPException(status_code=412, detail={"conflicts": e.conflicts})
+        except Exception as e:
+            log.error(f"Error patching people: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+        return {"items": [{**person, "etag": person_etag(person)} for person in people]}
+
+    @router.patch("/people/{person_id}")
+    async def patch_person(
+        person_id: str,
+        changes: PersonPatch,
+        if_match: Optional[str] = Header(None),
+        session_data: SessionData = Depends(verifier),
+    ):
+        """Set only the provided fields; with If-Match, 412 if the person changed since that ETag"""
+        owner = session_data.user_info["open_id"]
+        try:
+            people = await patch_people(owner, [
+                {"id": person_id, "expected": parse_if_match(if_match),
+                 "changes": changes.model_dump(exclude_unset=True)}
+            ])
+        except PatchConflict as e:
+            if e.missing:
+                raise HTTPException(status_code=404, detail="Person not found")
+            raise HTTPException(status_code=412, detail="Person was modified", headers={"ETag": e.conflicts[0]["etag"]})
+        except Exception as e:
+            log.error(f"Error patching person: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+        person = people[0]
+        return JSONResponse(person, headers={"ETag": person_etag(person)})
+
     @router.delete("/people/{person_id}")
-    def delete_person(person_id: str):
+    async def delete_person(person_id: str, session_data: SessionData = Depends(verifier)):
+        """Soft delete: the person becomes a tombstone that /people/changes reports until compacted"""
+        owner = session_data.user_info["open_id"]
         try:
-            with driver.session() as session:
-                result = session.run(
-                    """
-                    MATCH (n)
-                    WHERE elementId(n) = $person_id
-                    DELETE n
-                    """,
-                    person_id=person_id
+            async with get_driver().session() as session:
+                record = await fetch_one(session, "people.delete", DELETE_PERSON_QUERY,
+                    person_id=person_id,
+                    open_id=owner,
+                    now=datetime.now(timezone.utc).isoformat()
                 )
+                if record:
+                    await person_cache.invalidate(owner, person_id)
+                    network_stats.person_deleted(owner, dict(record))
+                    await matcher.person_removed(owner, person_id)
                 return {"status": "success"}
         except Exception as e:
             log.error(f"Error deleting person: {str(e)}")
@@ -0,0 +1,214 @@
+from pydantic import ValidationError
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Tuple
+import codecs
+import csv
+import io
+import json
+import logging
+import os
+from dotenv import load_dotenv
+from .db import get_driver
+from .models import Person
+from .metrics import fetch
+from .serialization import ndjson
+from .reminders import birthday_md
+
+log = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+BULK_BATCH_SIZE = int(os.getenv("PEOPLE_BULK_BATCH_SIZE", "1000"))
+EXPORT_FETCH_SIZE = int(os.getenv("PEOPLE_EXPORT_FETCH_SIZE", "1000"))
+# Per-row errors beyond this are counted but not listed in the response
+MAX_REPORTED_ERRORS = 1000
+
+# Properties a client may supply when importing
+IMPORT_FIELDS = ["name", "nickname", "gender", "birthday", "phone", "email", "city", "resources", "needs", "follow_up_at"]
+EXPORT_FIELDS = ["id"] + IMPORT_FIELDS + ["created_at", "updated_at"]
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a streamed UTF-8 body into lines without buffering the whole body"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+async def iter_ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    """Yield (line number, parsed object or error message) for an NDJSON body"""
+    line_no = 0
+    async for line in _iter_lines(chunks):
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, ValueError(f"Invalid JSON: {e}")
+
+async def iter_csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    """Yield (line number, row dict) for a CSV body with a header line
+
+    Quoted fields may span lines; a record is complete once its quotes balance.
+    """
+    header = None
+    record, start = [], 0
+    line_no = 0
+    async for line in _iter_lines(chunks):
+        line_no += 1
+        if not record:
+            start = line_no
+        record.append(line.rstrip("\r"))
+        text = "\n".join(record)
+        if text.count('"') % 2:
+            continue
+        record = []
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [h.strip() for h in values]
+            continue
+        if len(values) != len(header):
+            yield start, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        yield start, {k: (v if v != "" else None) for k, v in zip(header, values)}
+    if record:
+        yield start, ValueError("Unterminated quoted field")
+
+def validate_row(row) -> Dict:
+    """Validate an imported row against the Person schema, returning its properties"""
+    if isinstance(row, Exception):
+        raise row
+    if not isinstance(row, dict):
+        raise ValueError("Row must be an object")
+    person = Person.model_validate(row)
+    return {field: getattr(person, field) for field in IMPORT_FIELDS}
+
+# Rows whose phone or email already exists in the owner's network are
+# skipped; null never matches. Each row reserves a change sequence number,
+# so skipped rows leave gaps.
+CREATE_BATCH_QUERY = f"""
+    MATCH (u:User {{open_id: $open_id}})
+    SET u.change_seq = coalesce(u.change_seq, 0) + size($rows),
+        u.graph_seq = coalesce(u.graph_seq, 0) + 1
+    WITH u, u.change_seq - size($rows) AS base
+    UNWIND range(0, size($rows) - 1) AS i
+    WITH u, $rows[i] AS row, base + i + 1 AS seq
+    OPTIONAL MATCH (u)-[:OWNS]->(e:Person {{phone: row.props.phone}})
+    WITH u, row, seq, count(e) AS by_phone
+    OPTIONAL MATCH (u)-[:OWNS]->(f:Person {{email: row.props.email}})
+    WITH u, row, seq, by_phone + count(f) AS dupes
+    CALL {{
+        WITH u, row, seq, dupes
+        WITH u, row, seq WHERE dupes = 0
+        CREATE (u)-[:OWNS]->(n:Person)
+        SET n += row.props, n.owner = $open_id, n.deleted = false, n.change_seq = seq,
+            n.birthday_md = {birthday_md("row.props.birthday")},
+            n.created_at = $now, n.updated_at = $now
+        RETURN elementId(n) AS id
+    }}
+    RETURN row.line AS line, id
+    """
+
+async def _create_batch(tx, owner, rows, now):
+    records = await fetch(tx, "people.bulk.create", CREATE_BATCH_QUERY,
+        open_id=owner,
+        rows=rows,
+        now=now
+    )
+    return {record["line"]: record["id"] for record in records}
+
+class BulkImport:
+    """Validate, dedup and write imported rows in batched UNWIND transactions"""
+
+    def __init__(self, owner: str, on_created=None):
+        self.owner = owner
+        self.on_created = on_created
+        self.created = 0
+        self.duplicates = 0
+        self.error_count = 0
+        self.errors: List[Dict] = []
+        self._batch: List[Dict] = []
+        self._seen = set()
+
+    def _error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    async def add(self, line: int, row):
+        try:
+            props = validate_row(row)
+        except (ValidationError, ValueError) as e:
+            self._error(line, str(e))
+            return
+        # Dedup within the upload; the database is checked at write time
+        keys = [("phone", props["phone"]), ("email", props["email"])]
+        keys = [key for key in keys if key[1]]
+        if any(key in self._seen for key in keys):
+            self.duplicates += 1
+            return
+        self._seen.update(keys)
+        self._batch.append({"line": line, "props": props})
+        if len(self._batch) >= BULK_BATCH_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        now = datetime.now(timezone.utc).isoformat()
+        async with get_driver().session() as session:
+            created = await session.execute_write(_create_batch, self.owner, batch, now)
+        people = []
+        for row in batch:
+            person_id = created.get(row["line"])
+            if person_id:
+                people.append({"id": person_id, **row["props"], "created_at": now, "updated_at": now})
+            else:
+                self.duplicates += 1
+        self.created += len(people)
+        if self.on_created and people:
+            await self.on_created(people)
+
+    def report(self) -> Dict:
+        return {
+            "created": self.created,
+            "duplicates": self.duplicates,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+def export_query(fields: List[str]) -> str:
+    columns = ", ".join("elementId(p) as id" if f == "id" else f"p.{f} as {f}" for f in fields)
+    return f"MATCH (:User {{open_id: $open_id}})-[:OWNS]->(p:Person) WHERE p.deleted = false RETURN {columns}"
+
+async def iter_people(owner: str, fields: List[str] = EXPORT_FIELDS) -> AsyncIterator[Dict]:
+    """Stream every person of a user from a single query, pulled from the server in fetch-size batches"""
+    async with get_driver().session(fetch_size=EXPORT_FETCH_SIZE) as session:
+        result = await session.run(export_query(fields), open_id=owner)
+        async for record in result:
+            yield dict(record)
+
+async def export_ndjson(people: AsyncIterator[Dict]) -> AsyncIterator[bytes]:
+    async for person in people:
+        yield ndjson(person)
+
+async def export_csv(people: AsyncIterator[Dict], fields: List[str] = EXPORT_FIELDS) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    async for person in people:
+        writer.writerow(person)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
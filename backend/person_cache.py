@@ -0,0 +1,199 @@
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from dotenv import load_dotenv
+from .metrics import registry
+from .serialization import dumps
+
+log = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+PERSON_CACHE_SIZE = int(os.getenv("PERSON_CACHE_SIZE", "10000"))
+# Upper bound on staleness should an invalidation from another worker be lost
+PERSON_CACHE_TTL = float(os.getenv("PERSON_CACHE_TTL", "300"))
+# Redis used to broadcast invalidations and match index changes between
+# workers; unset keeps them in-process
+CACHE_INVALIDATION_REDIS_URL = os.getenv("CACHE_INVALIDATION_REDIS_URL")
+CACHE_INVALIDATION_CHANNEL = "person-cache-invalidate"
+
+cache_hits = registry.counter("person_cache_hits_total", "GET /people/{id} answered from the person cache")
+cache_misses = registry.counter("person_cache_misses_total", "Person cache lookups that went to the database")
+cache_invalidations = registry.counter("person_cache_invalidations_total", "Person cache entries invalidated")
+
+Key = Tuple[str, str]  # (owner open_id, person id)
+
+def person_version(person: dict) -> str:
+    """Version used for ETags and If-Match; updated_at changes on every write"""
+    return person.get("updated_at") or person.get("created_at") or ""
+
+def person_etag(person: dict) -> str:
+    # Strong ETag carrying the version itself, so If-Match can be checked in Cypher
+    return f'"{person_version(person)}"'
+
+def parse_if_match(if_match: Optional[str]) -> Optional[str]:
+    """Version a conditional write expects, or None when unconditional"""
+    if not if_match or if_match.strip() == "*":
+        return None
+    return if_match.strip().strip('"')
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))
+
+class CachedPerson:
+    __slots__ = ("record", "body", "etag", "expires")
+
+    def __init__(self, record: dict, expires: float):
+        self.record = record
+        self.body = dumps(record)
+        self.etag = person_etag(record)
+        self.expires = expires
+
+class LocalBus:
+    """In-process stand-in for a pub/sub channel, for a single worker and tests"""
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Callable[[str], None]]] = defaultdict(list)
+
+    def subscribe(self, topic: str, handler: Callable[[str], None]):
+        self._handlers[topic].append(handler)
+
+    async def publish(self, topic: str, message: str):
+        for handler in self._handlers[topic]:
+            handler(message)
+
+    async def listen(self):
+        pass
+
+    async def close(self):
+        pass
+
+class RedisBus:
+    """Messages broadcast to every worker over Redis pub/sub, one channel for all topics"""
+
+    def __init__(self, url: str, channel: str = CACHE_INVALIDATION_CHANNEL):
+        import redis.asyncio as redis  # optional dependency, only needed with several workers
+
+        self._redis = redis.from_url(url, decode_responses=True)
+        self._channel = channel
+        self._origin = uuid.uuid4().hex
+        self._handlers: Dict[str, List[Callable[[str], None]]] = defaultdict(list)
+
+    def subscribe(self, topic: str, handler: Callable[[str], None]):
+        self._handlers[topic].append(handler)
+
+    async def publish(self, topic: str, message: str):
+        # Local handlers run synchronously; other workers get it from the channel
+        for handler in self._handlers[topic]:
+            handler(message)
+        await self._redis.publish(self._channel, f"{self._origin} {topic} {message}")
+
+    async def listen(self):
+        """Background task applying messages published by other workers"""
+        while True:
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.subscribe(self._channel)
+                async for item in pubsub.listen():
+                    if item["type"] != "message":
+                        continue
+                    origin, topic, message = item["data"].split(" ", 2)
+                    if origin != self._origin:
+                        for handler in self._handlers[topic]:
+                            handler(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error(f"Error listening on the cache bus: {e}")
+                await asyncio.sleep(1)
+
+    async def close(self):
+        await self._redis.aclose()
+
+class PersonCache:
+    """Bounded LRU of person records by (owner, id), entries expiring after `ttl` seconds"""
+
+    def __init__(self, size: int = PERSON_CACHE_SIZE, ttl: float = PERSON_CACHE_TTL, bus=None):
+        self._size = size
+        self._ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        # Bumped on every invalidation, so a read that raced a write is not cached
+        self._generation = 0
+        self.bus = bus if bus is not None else LocalBus()
+        self.bus.subscribe("invalidate", self._drop)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _encode(key: Key) -> str:
+        return json.dumps(key)
+
+    def _drop(self, message: str):
+        key = tuple(json.loads(message))
+        self._generation += 1
+        if self._entries.pop(key, None) is not None:
+            cache_invalidations.inc()
+
+    def get(self, owner: str, person_id: str) -> Optional[CachedPerson]:
+        key = (owner, person_id)
+        entry = self._entries.get(key)
+        if entry is None or entry.expires <= time.monotonic():
+            cache_misses.inc()
+            return None
+        self._entries.move_to_end(key)
+        cache_hits.inc()
+        return entry
+
+    def get_many(self, owner: str, person_ids: Iterable[str]) -> Dict[str, dict]:
+        """Cached records among person_ids, without touching the counters or LRU order"""
+        now = time.monotonic()
+        found = {}
+        for person_id in person_ids:
+            entry = self._entries.get((owner, person_id))
+            if entry is not None and entry.expires > now:
+                found[person_id] = entry.record
+        return found
+
+    def generation(self) -> int:
+        """Take before reading from the database and pass to put()"""
+        return self._generation
+
+    def put(self, owner: str, record: dict, generation: int) -> CachedPerson:
+        entry = CachedPerson(record, time.monotonic() + self._ttl)
+        if generation == self._generation:
+            key = (owner, record["id"])
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+        return entry
+
+    async def invalidate(self, owner: str, person_id: str):
+        """Drop the entry here at once, then tell the other workers"""
+        try:
+            # Both buses deliver to local subscribers before any I/O
+            await self.bus.publish("invalidate", self._encode((owner, person_id)))
+        except Exception as e:
+            log.error(f"Error publishing cache invalidation: {e}")
+
+    async def listen(self):
+        await self.bus.listen()
+
+    async def close(self):
+        self._entries.clear()
+        await self.bus.close()
+
+def create_person_cache() -> PersonCache:
+    bus = RedisBus(CACHE_INVALIDATION_REDIS_URL) if CACHE_INVALIDATION_REDIS_URL else LocalBus()
+    return PersonCache(bus=bus)
+
+person_cache = create_person_cache()
+registry.gauge("person_cache_entries", "Entries in the person cache", lambda: len(person_cache))
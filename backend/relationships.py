@@ -0,0 +1,229 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from neo4j import Query as CypherQuery
+from neo4j.exceptions import Neo4jError
+from datetime import datetime, timezone
+import logging
+import os
+from dotenv import load_dotenv
+from .db import get_driver
+from .models import Relationship, SessionData
+from .metrics import fetch, fetch_one
+from .serialization import ndjson
+
+log = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+# Server-side timeout (seconds) for a single traversal query
+TRAVERSAL_TIMEOUT = float(os.getenv("TRAVERSAL_TIMEOUT", "2"))
+MAX_PATH_HOPS = 6
+MAX_NEIGHBORHOOD_DEPTH = 3
+MAX_FANOUT = 200
+MAX_NEIGHBORHOOD_SIZE = 5000
+
+RELATIONSHIP_TYPES = "KNOWS|INTRODUCED_BY"
+
+# relationship_type is validated against a fixed set by the model or the route
+def create_query(relationship_type: str) -> str:
+    return f"""
+    MATCH (u:User {{open_id: $open_id}})-[:OWNS]->(a:Person)
+    WHERE elementId(a) = $person_id AND a.deleted = false
+    MATCH (u)-[:OWNS]->(b:Person) WHERE elementId(b) = $to_id AND b.deleted = false
+    MERGE (a)-[r:{relationship_type} {{owner: $open_id}}]->(b)
+    ON CREATE SET r.created_at = $now
+    SET r.strength = $strength, r.note = $note, r.updated_at = $now
+    SET u.graph_seq = coalesce(u.graph_seq, 0) + 1
+    SET a.graph_seq = u.graph_seq, b.graph_seq = u.graph_seq
+    RETURN elementId(a) as from_id, elementId(b) as to_id, type(r) as type,
+           r.strength as strength, r.note as note,
+           r.created_at as created_at, r.updated_at as updated_at
+    """
+
+def delete_query(relationship_type: str) -> str:
+    return f"""
+    MATCH (a:Person) WHERE elementId(a) = $person_id
+    MATCH (a)-[r:{relationship_type}]->(b:Person)
+    WHERE elementId(b) = $to_id AND r.owner = $open_id
+    DELETE r
+    WITH a, b
+    MATCH (u:User {{open_id: $open_id}})
+    SET u.graph_seq = coalesce(u.graph_seq, 0) + 1
+    SET a.graph_seq = u.graph_seq, b.graph_seq = u.graph_seq
+    """
+
+LIST_QUERY = f"""
+    MATCH (:User {{open_id: $open_id}})-[:OWNS]->(p:Person) WHERE elementId(p) = $person_id
+    MATCH (p)-[r:{RELATIONSHIP_TYPES}]-(q:Person)
+    WHERE r.owner = $open_id
+    RETURN elementId(q) as id, q.name as name, q.nickname as nickname,
+           type(r) as type, startNode(r) = p as outgoing,
+           r.strength as strength, r.note as note, r.updated_at as updated_at
+    ORDER BY r.strength DESC
+    LIMIT $limit
+    """
+
+# max_hops is a bounded int, safe to inline; variable length bounds can't be parameters
+def path_query(max_hops: int) -> str:
+    return f"""
+    MATCH (u:User {{open_id: $open_id}})-[:OWNS]->(a:Person) WHERE elementId(a) = $from_id
+    MATCH (u)-[:OWNS]->(b:Person) WHERE elementId(b) = $to_id
+    MATCH path = shortestPath((a)-[:{RELATIONSHIP_TYPES}*..{max_hops}]-(b))
+    WHERE all(r IN relationships(path) WHERE r.owner = $open_id)
+    RETURN [n IN nodes(path) | {{id: elementId(n), name: n.name, nickname: n.nickname}}] as people,
+           [r IN relationships(path) | {{type: type(r), strength: r.strength,
+               from_id: elementId(startNode(r)), to_id: elementId(endNode(r))}}] as relationships
+    """
+
+# One hop of the neighborhood traversal, at most $fanout strongest edges per person
+NEIGHBORHOOD_QUERY = f"""
+    UNWIND $frontier AS fid
+    MATCH (p:Person) WHERE elementId(p) = fid
+    CALL {{
+        WITH p
+        MATCH (p)-[r:{RELATIONSHIP_TYPES}]-(q:Person)
+        WHERE r.owner = $open_id
+        RETURN r, q ORDER BY r.strength DESC LIMIT $fanout
+    }}
+    RETURN fid as via, elementId(q) as id, q.name as name, q.nickname as nickname,
+           type(r) as type, r.strength as strength
+    """
+
+def _traversal_error(e: Exception, what: str) -> HTTPException:
+    if isinstance(e, Neo4jError) and "TransactionTimedOut" in (e.code or ""):
+        return HTTPException(status_code=504, detail=f"{what} timed out")
+    log.error(f"Error in {what}: {str(e)}")
+    return HTTPException(status_code=500, detail=str(e))
+
+def setup_relationship_routes(router: APIRouter, verifier):
+
+    @router.post("/people/{person_id}/relationships")
+    async def create_relationship(person_id: str, relationship: Relationship, session_data: SessionData = Depends(verifier)):
+        """Create or update an edge owned by the current user; INTRODUCED_BY points at the introducer"""
+        if relationship.to_id == person_id:
+            raise HTTPException(status_code=400, detail="A person cannot be related to themselves")
+        try:
+            async with get_driver().session() as session:
+                now = datetime.now(timezone.utc).isoformat()
+                record = await fetch_one(session, "relationships.create", create_query(relationship.type),
+                    person_id=person_id,
+                    to_id=relationship.to_id,
+                    open_id=session_data.user_info["open_id"],
+                    strength=relationship.strength,
+                    note=relationship.note,
+                    now=now
+                )
+        except Exception as e:
+            log.error(f"Error creating relationship: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+        if not record:
+            raise HTTPException(status_code=404, detail="Person not found")
+        return dict(record)
+
+    @router.get("/people/{person_id}/relationships")
+    async def get_relationships(
+        person_id: str,
+        limit: int = Query(100, ge=1, le=MAX_FANOUT),
+        session_data: SessionData = Depends(verifier),
+    ):
+        """Direct relationships of a person, strongest first"""
+        try:
+            async with get_driver().session() as session:
+                return await fetch(session, "relationships.list", LIST_QUERY,
+                    person_id=person_id,
+                    open_id=session_data.user_info["open_id"],
+                    limit=limit
+                )
+        except Exception as e:
+            log.error(f"Error fetching relationships: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.delete("/people/{person_id}/relationships/{to_id}")
+    async def delete_relationship(
+        person_id: str,
+        to_id: str,
+        type: str = Query("KNOWS", pattern=f"^({RELATIONSHIP_TYPES})$"),
+        session_data: SessionData = Depends(verifier),
+    ):
+        try:
+            async with get_driver().session() as session:
+                await fetch(session, "relationships.delete", delete_query(type),
+                    person_id=person_id,
+                    to_id=to_id,
+                    open_id=session_data.user_info["open_id"]
+                )
+                return {"status": "success"}
+        except Exception as e:
+            log.error(f"Error deleting relationship: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.get("/network/path")
+    async def get_introduction_path(
+        from_id: str = Query(..., alias="from"),
+        to_id: str = Query(..., alias="to"),
+        max_hops: int = Query(4, ge=1, le=MAX_PATH_HOPS),
+        session_data: SessionData = Depends(verifier),
+    ):
+        """Shortest chain of the current user's relationships between two people"""
+        try:
+            async with get_driver().session() as session:
+                record = await fetch_one(session, "network.path",
+                    CypherQuery(path_query(max_hops), timeout=TRAVERSAL_TIMEOUT),
+                    from_id=from_id,
+                    to_id=to_id,
+                    open_id=session_data.user_info["open_id"]
+                )
+        except Exception as e:
+            raise _traversal_error(e, "path search")
+        if not record:
+            raise HTTPException(status_code=404, detail="No path found")
+        return {"hops": len(record["relationships"]), **dict(record)}
+
+    @router.get("/people/{person_id}/neighborhood")
+    async def get_neighborhood(
+        person_id: str,
+        depth: int = Query(2, ge=1, le=MAX_NEIGHBORHOOD_DEPTH),
+        fanout: int = Query(50, ge=1, le=MAX_FANOUT),
+        limit: int = Query(1000, ge=1, le=MAX_NEIGHBORHOOD_SIZE),
+        session_data: SessionData = Depends(verifier),
+    ):
+        """Breadth-first neighborhood streamed as NDJSON, one line per person reached.
+
+        Each hop expands at most `fanout` strongest edges per person, so a dense
+        hub costs at most `fanout` rows rather than its full degree.
+        """
+        open_id = session_data.user_info["open_id"]
+
+        async def expand():
+            visited = {person_id}
+            frontier = [person_id]
+            emitted = 0
+            async with get_driver().session() as session:
+                for hop in range(1, depth + 1):
+                    if not frontier or emitted >= limit:
+                        break
+                    try:
+                        result = await session.run(
+                            CypherQuery(NEIGHBORHOOD_QUERY, timeout=TRAVERSAL_TIMEOUT),
+                            frontier=frontier,
+                            open_id=open_id,
+                            fanout=fanout
+                        )
+                        next_frontier = []
+                        async for record in result:
+                            if record["id"] in visited:
+                                continue
+                            visited.add(record["id"])
+                            next_frontier.append(record["id"])
+                            yield ndjson({"hop": hop, **dict(record)})
+                            emitted += 1
+                            if emitted >= limit:
+                                break
+                        frontier = next_frontier
+                    except Exception as e:
+                        # Headers are already sent; report the failure as a final line
+                        error = _traversal_error(e, "neighborhood traversal")
+                        yield ndjson({"error": error.detail})
+                        return
+
+        return StreamingResponse(expand(), media_type="application/x-ndjson")
@@ -0,0 +1,260 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+import argparse
+import asyncio
+import calendar
+import contextlib
+import logging
+import os
+import sys
+import uuid
+from dotenv import load_dotenv
+from .db import get_driver
+from .metrics import fetch, fetch_one, registry, stream
+from .inbox_hub import inbox_hub
+from .network import network_stats
+
+log = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+# Seconds between checks for a day without reminders yet; 0 disables the in-app task
+REMINDER_INTERVAL = float(os.getenv("REMINDER_INTERVAL", "600"))
+# Days start at midnight in this time zone
+REMINDER_TIMEZONE = ZoneInfo(os.getenv("REMINDER_TIMEZONE", "UTC"))
+# Birthdays are announced this many days ahead, besides on the day itself
+REMINDER_BIRTHDAY_LOOKAHEAD_DAYS = int(os.getenv("REMINDER_BIRTHDAY_LOOKAHEAD_DAYS", "1"))
+# Days missed while no worker was running are caught up, up to this many; follow-ups
+# set this many days in the past still get a reminder
+REMINDER_CATCH_UP_DAYS = int(os.getenv("REMINDER_CATCH_UP_DAYS", "7"))
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "1000"))
+# A worker that dies mid-run blocks the others for at most this long
+REMINDER_LEASE_SECONDS = float(os.getenv("REMINDER_LEASE_SECONDS", "600"))
+LEASE_NAME = "reminders"
+# Identifies this process as the lease holder
+LEASE_HOLDER = str(uuid.uuid4())
+
+reminders_created = registry.counter("reminders_created_total", "Reminder inbox messages created, by type")
+
+# "YYYY-MM-DD", optionally followed by a time, with a valid month and day
+ISO_DATE_PATTERN = r"\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])([T ].*)?"
+
+def birthday_md(value: str) -> str:
+    """Cypher for the "MM-DD" of an ISO birthday expression, null for anything else.
+
+    Stored as p.birthday_md on every write so the scheduler looks birthdays up
+    in an index instead of parsing every birthday string.
+    """
+    pattern = ISO_DATE_PATTERN.replace("\\", "\\\\")
+    return f"CASE WHEN {value} =~ '{pattern}' THEN substring({value}, 5, 5) END"
+
+def birthday_days(first: date, last: date) -> Dict[str, date]:
+    """Month-days celebrated on each date from first to last; 02-29 falls on 02-28 outside leap years"""
+    days = {}
+    day = first
+    while day <= last:
+        days[day.strftime("%m-%d")] = day
+        if (day.month, day.day) == (2, 28) and not calendar.isleap(day.year):
+            days["02-29"] = day
+        day += timedelta(days=1)
+    return days
+
+def _birthday_text(name: str, day: date, today: date) -> str:
+    if day == today:
+        return f"🎂 {name}'s birthday is today"
+    if day == today + timedelta(days=1):
+        return f"🎂 {name}'s birthday is tomorrow"
+    return f"🎂 {name}'s birthday {'is' if day > today else 'was'} on {day:%m-%d}"
+
+def _follow_up_text(name: str, due: str, today: date) -> str:
+    if due[:10] == today.isoformat():
+        return f"⏰ Follow up with {name} today"
+    return f"⏰ Follow up with {name}, due {due[:10]}"
+
+LEASE_QUERY = """
+    MERGE (l:SchedulerLease {name: $name})
+    SET l._lock = true
+    REMOVE l._lock
+    WITH l
+    WHERE l.holder IS NULL OR l.holder = $holder OR l.expires_at < $now
+    SET l.holder = $holder, l.expires_at = $expires
+    RETURN l.last_run_date as last_run_date
+    """
+
+RELEASE_QUERY = """
+    MATCH (l:SchedulerLease {name: $name}) WHERE l.holder = $holder
+    SET l.holder = null, l.expires_at = null,
+        l.last_run_date = coalesce($last_run_date, l.last_run_date)
+    """
+
+async def _acquire_lease(tx, now: str, expires: str):
+    # Lock the lease before reading it, so two workers cannot both see it free
+    return await fetch_one(tx, "reminders.lease", LEASE_QUERY,
+        name=LEASE_NAME,
+        holder=LEASE_HOLDER,
+        now=now,
+        expires=expires
+    )
+
+async def _release_lease(tx, last_run_date: Optional[str]):
+    await fetch(tx, "reminders.release", RELEASE_QUERY,
+        name=LEASE_NAME,
+        holder=LEASE_HOLDER,
+        last_run_date=last_run_date
+    )
+
+BIRTHDAYS_QUERY = """
+    MATCH (p:Person) WHERE p.birthday_md IN $days AND p.deleted = false
+    RETURN p.owner as owner, elementId(p) as id, p.name as name, p.birthday_md as birthday_md
+    """
+
+# follow_up_at is a date or a timestamp; both sort before the next day
+FOLLOW_UPS_QUERY = """
+    MATCH (p:Person) WHERE p.follow_up_at >= $since AND p.follow_up_at < $until AND p.deleted = false
+    RETURN p.owner as owner, elementId(p) as id, p.name as name, p.follow_up_at as follow_up_at
+    """
+
+# The unique dedup_key makes a rerun, or a second worker, a no-op for
+# reminders already delivered; only new messages count as unread
+DELIVER_QUERY = """
+    UNWIND $rows AS row
+    MATCH (u:User {open_id: row.owner}) WHERE coalesce(u.deleted, false) = false
+    MERGE (m:InboxMessage {dedup_key: row.dedup_key})
+    ON CREATE SET m.date = $now, m.text = row.text, m.read = false,
+                  m.message_type = row.message_type, m.person_id = row.person_id
+    WITH u, m, m.date = $now AS created
+    CALL {
+        WITH u, m, created
+        WITH u, m WHERE created
+        CREATE (u)-[:HAS_MESSAGE]->(m)
+    }
+    WITH u, collect(CASE WHEN created THEN {id: elementId(m), date: m.date, text: m.text, read: m.read,
+                                             message_type: m.message_type, person_id: m.person_id} END) AS messages
+    SET u.unread_count = coalesce(u.unread_count, 0) + size(messages)
+    RETURN u.open_id as open_id, messages
+    """
+
+async def _deliver(tx, rows: List[dict], now: str):
+    return await fetch(tx, "reminders.deliver", DELIVER_QUERY, rows=rows, now=now)
+
+class Delivery:
+    """Buffers reminders and writes them REMINDER_BATCH_SIZE per transaction"""
+
+    def __init__(self):
+        self.created = 0
+        self._batch: List[dict] = []
+
+    async def add(self, row: dict):
+        self._batch.append(row)
+        if len(self._batch) >= REMINDER_BATCH_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        async with get_driver().session() as session:
+            records = await session.execute_write(_deliver, batch, datetime.now(timezone.utc).isoformat())
+        for record in records:
+            network_stats.unread_changed(record["open_id"], len(record["messages"]))
+            for message in record["messages"]:
+                self.created += 1
+                reminders_created.inc(type=message["message_type"])
+                inbox_hub.publish(record["open_id"], "message", message)
+
+async def generate_reminders(first: date, today: date) -> int:
+    """Deliver birthday reminders for days first..today plus the lookahead, and follow-ups
+    due from REMINDER_CATCH_UP_DAYS ago through today; returns the messages created"""
+    days = birthday_days(first, today + timedelta(days=REMINDER_BIRTHDAY_LOOKAHEAD_DAYS))
+    delivery = Delivery()
+    async with get_driver().session() as session:
+        rows = stream(session, "reminders.birthdays", BIRTHDAYS_QUERY, days=list(days))
+        async with contextlib.aclosing(rows):
+            async for row in rows:
+                day = days[row["birthday_md"]]
+                # One advance notice and one on the day itself, each delivered once
+                notice = "ahead" if day > today else "day"
+                await delivery.add({
+                    "owner": row["owner"],
+                    "person_id": row["id"],
+                    "dedup_key": f"birthday:{row['id']}:{day.isoformat()}:{notice}",
+                    "message_type": "Birthday",
+                    "text": _birthday_text(row["name"], day, today),
+                })
+        rows = stream(session, "reminders.follow_ups", FOLLOW_UPS_QUERY,
+            since=(today - timedelta(days=REMINDER_CATCH_UP_DAYS)).isoformat(),
+            until=(today + timedelta(days=1)).isoformat()
+        )
+        async with contextlib.aclosing(rows):
+            async for row in rows:
+                await delivery.add({
+                    "owner": row["owner"],
+                    "person_id": row["id"],
+                    "dedup_key": f"follow_up:{row['id']}:{row['follow_up_at']}",
+                    "message_type": "FollowUp",
+                    "text": _follow_up_text(row["name"], row["follow_up_at"], today),
+                })
+    await delivery.flush()
+    return delivery.created
+
+async def run_reminders(today: Optional[date] = None, force: bool = False) -> Optional[int]:
+    """Generate the reminders due today, once per day across all workers.
+
+    Returns the number of messages created, or None when another worker holds
+    the lease or today's reminders were already generated.
+    """
+    today = today or datetime.now(REMINDER_TIMEZONE).date()
+    now = datetime.now(timezone.utc)
+    async with get_driver().session() as session:
+        lease = await session.execute_write(
+            _acquire_lease, now.isoformat(), (now + timedelta(seconds=REMINDER_LEASE_SECONDS)).isoformat())
+    if lease is None:
+        return None
+    last_run_date = None
+    try:
+        last_run = lease["last_run_date"]
+        if last_run and last_run >= today.isoformat() and not force:
+            return None
+        # The first run starts today; later ones catch up on days no worker ran
+        first = today
+        if last_run:
+            first = max(today - timedelta(days=REMINDER_CATCH_UP_DAYS), date.fromisoformat(last_run) + timedelta(days=1))
+        created = await generate_reminders(min(first, today), today)
+        last_run_date = max(today.isoformat(), last_run or "")
+        log.info(f"Created {created} reminders for {today.isoformat()}")
+        return created
+    finally:
+        async with get_driver().session() as session:
+            await session.execute_write(_release_lease, last_run_date)
+
+async def run_reminders_periodically(interval: float = REMINDER_INTERVAL):
+    """Background task; every worker may run it, the lease lets one of them generate each day"""
+    if interval <= 0:
+        return
+    while True:
+        try:
+            await run_reminders()
+        except Exception as e:
+            log.error(f"Error generating reminders: {e}")
+        await asyncio.sleep(interval)
+
+async def _main(argv):
+    from .db import init_driver, close_driver
+    parser = argparse.ArgumentParser(prog="python -m backend.reminders")
+    parser.add_argument("--date", type=date.fromisoformat, help="generate as if today were this date (YYYY-MM-DD)")
+    parser.add_argument("--force", action="store_true", help="run even if the day was already generated")
+    args = parser.parse_args(argv)
+    await init_driver()
+    try:
+        created = await run_reminders(args.date, force=args.force)
+        if created is None:
+            log.info("Skipped: reminders already generated, or another worker holds the lease")
+        return 0
+    finally:
+        await close_driver()
+
+if __name__ == "__main__":
+    # python -m backend.reminders [--date YYYY-MM-DD] [--force]
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
@@ -0,0 +1,251 @@
+from datetime import datetime, timezone
+import asyncio
+import logging
+import sys
+from . import analytics, network, people, people_io, relationships, reminders, user, write_behind
+
+log = logging.getLogger(__name__)
+
+# Versioned schema migrations, applied once and in order on application startup.
+# Each migration is a list of Cypher statements run in their own auto-commit
+# transaction; statements must be idempotent so concurrent workers can race safely.
+# Never edit a shipped migration, append a new version instead.
+MIGRATIONS = [
+    (1, "person range indexes for listing and filters", [
+        "CREATE RANGE INDEX person_created_at IF NOT EXISTS FOR (p:Person) ON (p.created_at)",
+        "CREATE RANGE INDEX person_updated_at IF NOT EXISTS FOR (p:Person) ON (p.updated_at)",
+        "CREATE RANGE INDEX person_city IF NOT EXISTS FOR (p:Person) ON (p.city)",
+        "CREATE RANGE INDEX person_gender IF NOT EXISTS FOR (p:Person) ON (p.gender)",
+    ]),
+    (2, "unique User.open_id and inbox date index", [
+        # Fold duplicate users left by racing first logins into the oldest one
+        """
+        MATCH (u:User) WHERE u.open_id IS NOT NULL
+        WITH u ORDER BY u.created_at
+        WITH u.open_id AS open_id, collect(u) AS users
+        WHERE size(users) > 1
+        WITH head(users) AS keep, tail(users) AS dups
+        UNWIND dups AS dup
+        OPTIONAL MATCH (dup)-[:HAS_MESSAGE]->(m:InboxMessage)
+        FOREACH (_ IN CASE WHEN m IS NULL THEN [] ELSE [1] END | MERGE (keep)-[:HAS_MESSAGE]->(m))
+        WITH DISTINCT dup
+        DETACH DELETE dup
+        """,
+        "CREATE CONSTRAINT user_open_id IF NOT EXISTS FOR (u:User) REQUIRE u.open_id IS UNIQUE",
+        "CREATE RANGE INDEX inbox_message_date IF NOT EXISTS FOR (m:InboxMessage) ON (m.date)",
+    ]),
+    (3, "person phone and email indexes for import dedup", [
+        "CREATE RANGE INDEX person_phone IF NOT EXISTS FOR (p:Person) ON (p.phone)",
+        "CREATE RANGE INDEX person_email IF NOT EXISTS FOR (p:Person) ON (p.email)",
+    ]),
+    (4, "full-text person search with CJK analyzer", [
+        """
+        CREATE FULLTEXT INDEX person_search IF NOT EXISTS
+        FOR (p:Person) ON EACH [p.name, p.nickname, p.city, p.resources, p.needs]
+        OPTIONS {indexConfig: {`fulltext.analyzer`: 'cjk', `fulltext.eventually_consistent`: true}}
+        """,
+    ]),
+    (5, "people owned by users", [
+        # People created before ownership existed go to the first user who signed up
+        """
+        MATCH (p:Person) WHERE NOT (:User)-[:OWNS]->(p)
+        CALL {
+            WITH p
+            MATCH (u:User) WHERE u.open_id IS NOT NULL
+            WITH p, u ORDER BY u.created_at LIMIT 1
+            MERGE (u)-[:OWNS]->(p)
+            SET p.owner = u.open_id
+        } IN TRANSACTIONS OF 10000 ROWS
+        """,
+        # Full-text index including the owner key so searches are filtered inside Lucene
+        "DROP INDEX person_search IF EXISTS",
+        """
+        CREATE FULLTEXT INDEX person_owner_search IF NOT EXISTS
+        FOR (p:Person) ON EACH [p.owner, p.name, p.nickname, p.city, p.resources, p.needs]
+        OPTIONS {indexConfig: {`fulltext.analyzer`: 'cjk', `fulltext.eventually_consistent`: true}}
+        """,
+    ]),
+    (6, "unread message counter on users", [
+        """
+        MATCH (u:User)
+        CALL {
+            WITH u
+            OPTIONAL MATCH (u)-[:HAS_MESSAGE]->(m:InboxMessage) WHERE m.read = false
+            WITH u, count(m) AS unread
+            SET u.unread_count = unread
+        } IN TRANSACTIONS OF 10000 ROWS
+        """,
+    ]),
+    (7, "soft-deleted people and per-user change sequence", [
+        # Number existing people per owner in creation order
+        """
+        MATCH (u:User)
+        CALL {
+            WITH u
+            MATCH (u)-[:OWNS]->(p:Person) WHERE p.change_seq IS NULL
+            WITH u, p ORDER BY p.created_at
+            WITH u, collect(p) AS people
+            WITH u, people, coalesce(u.change_seq, 0) AS base
+            FOREACH (i IN range(0, size(people) - 1) |
+                FOREACH (p IN [people[i]] |
+                    SET p.change_seq = base + i + 1, p.deleted = coalesce(p.deleted, false)))
+            SET u.change_seq = base + size(people), u.compacted_seq = coalesce(u.compacted_seq, 0)
+        } IN TRANSACTIONS OF 100 ROWS
+        """,
+        "CREATE RANGE INDEX person_owner_change_seq IF NOT EXISTS FOR (p:Person) ON (p.owner, p.change_seq)",
+        "CREATE RANGE INDEX person_deleted_at IF NOT EXISTS FOR (p:Person) ON (p.deleted_at)",
+    ]),
+    (8, "birthday and follow-up reminders", [
+        "CREATE RANGE INDEX person_birthday_md IF NOT EXISTS FOR (p:Person) ON (p.birthday_md)",
+        "CREATE RANGE INDEX person_follow_up_at IF NOT EXISTS FOR (p:Person) ON (p.follow_up_at)",
+        "CREATE CONSTRAINT inbox_message_dedup_key IF NOT EXISTS FOR (m:InboxMessage) REQUIRE m.dedup_key IS UNIQUE",
+        "CREATE CONSTRAINT scheduler_lease_name IF NOT EXISTS FOR (l:SchedulerLease) REQUIRE l.name IS UNIQUE",
+        # Month-day of existing ISO birthdays; later writes keep it in step
+        r"""
+        MATCH (p:Person) WHERE p.birthday IS NOT NULL AND p.deleted = false
+        CALL {
+            WITH p
+            SET p.birthday_md = CASE WHEN p.birthday =~ '\\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\\d|3[01])([T ].*)?'
+                                     THEN substring(p.birthday, 5, 5) END
+        } IN TRANSACTIONS OF 10000 ROWS
+        """,
+    ]),
+]
+
+PERSON_PARAMS = {"name": "", "nickname": "", "gender": "", "birthday": "", "phone": "", "email": "", "city": "",
+                 "resources": "", "needs": "", "follow_up_at": "", "now": "", "open_id": ""}
+
+# Shipped queries that must be answered from an index rather than a scan,
+# as (name, cypher, params). The text is the one the handlers run, taken from the
+# module constants or built with the handlers' own query functions; parameters
+# only need the right types for EXPLAIN. Whole-population passes scan by design
+# and are not listed: analytics.owners, the matcher's full load and the
+# announcement broadcast.
+PLAN_CHECKS = [
+    ("user.upsert", user.UPSERT_USER_QUERY, {"open_id": "", "name": "", "now": "", "welcome_text": ""}),
+    ("user.get", user.GET_USER_QUERY, {"open_id": ""}),
+    ("user.unread", user.UNREAD_COUNT_QUERY, {"open_id": ""}),
+    ("user.inbox", user.inbox_query(["m.date IS NOT NULL"]), {"open_id": "", "limit": 21}),
+    ("user.inbox.cursor",
+     user.inbox_query(["m.date <= $after_date", "(m.date < $after_date OR elementId(m) < $after_id)", "m.read = false"]),
+     {"open_id": "", "after_date": "", "after_id": "", "limit": 21}),
+    ("user.inbox.unread_one", user.UNREAD_MESSAGE_QUERY, {"open_id": "", "message_id": ""}),
+    ("user.inbox.read", user.mark_read_query(["m.read = false", "elementId(m) IN $ids"]), {"open_id": "", "ids": [""]}),
+    ("people.list", people.list_query(["p.created_at IS NOT NULL", "p.deleted = false"], people.PERSON_FIELDS),
+     {"open_id": "", "limit": 11}),
+    ("people.list.city",
+     people.list_query(["p.created_at IS NOT NULL", "p.deleted = false", "p.city = $city"], people.PERSON_FIELDS),
+     {"open_id": "", "city": "", "limit": 11}),
+    ("people.changes", people.changes_query(["p.owner = $open_id", "p.change_seq > $since"], people.PERSON_FIELDS),
+     {"open_id": "", "since": 0, "limit": 101}),
+    ("people.changes.seq", people.CHANGES_SEQ_QUERY, {"open_id": ""}),
+    ("people.get", people.GET_PERSON_QUERY, {"open_id": "", "person_id": ""}),
+    ("people.search", people.search_query(people.TYPEAHEAD_FIELDS),
+     {"query": "", "offset": 0, "limit": 21, "open_id": ""}),
+    ("people.matches", people.MATCHES_QUERY, {"open_id": "", "ids": [""]}),
+    ("people.create", people.CREATE_PERSON_QUERY, PERSON_PARAMS),
+    ("people.update", people.UPDATE_PERSON_QUERY, {**PERSON_PARAMS, "person_id": ""}),
+    ("people.patch.lock", people.PATCH_LOCK_QUERY, {"open_id": "", "ids": [""]}),
+    ("people.patch", people.PATCH_QUERY, {"open_id": "", "updates": [{"id": "", "changes": {"name": ""}}], "now": ""}),
+    ("people.delete", people.DELETE_PERSON_QUERY, {"open_id": "", "person_id": "", "now": ""}),
+    ("people.compact", people.COMPACT_QUERY, {"cutoff": "", "batch": 1000}),
+    ("people.bulk.create", people_io.CREATE_BATCH_QUERY,
+     {"open_id": "", "rows": [{"line": 1, "props": {"phone": "", "email": ""}}], "now": ""}),
+    ("people.export", people_io.export_query(people_io.EXPORT_FIELDS), {"open_id": ""}),
+    ("relationships.create", relationships.create_query("KNOWS"),
+     {"open_id": "", "person_id": "", "to_id": "", "strength": 1, "note": "", "now": ""}),
+    ("relationships.list", relationships.LIST_QUERY, {"open_id": "", "person_id": "", "limit": 100}),
+    ("relationships.delete", relationships.delete_query("KNOWS"), {"open_id": "", "person_id": "", "to_id": ""}),
+    ("network.path", relationships.path_query(relationships.MAX_PATH_HOPS), {"open_id": "", "from_id": "", "to_id": ""}),
+    ("network.neighborhood", relationships.NEIGHBORHOOD_QUERY, {"frontier": [""], "open_id": "", "fanout": 50}),
+    ("analytics.export", analytics.EXPORT_PEOPLE_QUERY, {"open_id": "", "since": 0, "full": False}),
+    ("analytics.edges.count", analytics.EDGE_COUNT_QUERY, {"open_id": ""}),
+    ("analytics.edges", analytics.EXPORT_EDGES_QUERY, {"open_id": ""}),
+    ("analytics.write", analytics.WRITE_SCORES_QUERY,
+     {"rows": [{"id": "", "degree": 0, "pagerank": 0.0, "betweenness": 0.0, "community": 0}], "now": ""}),
+    ("analytics.connectors", analytics.CONNECTORS_QUERY, {"open_id": "", "k": 10}),
+    ("analytics.brokers", analytics.BROKERS_QUERY, {"open_id": "", "k": 10}),
+    ("analytics.communities", analytics.COMMUNITIES_QUERY, {"open_id": "", "k": 10}),
+    ("analytics.done", analytics.DONE_QUERY, {"open_id": "", "graph_seq": 0, "now": "", "insights": ""}),
+    ("network.insights", analytics.INSIGHTS_QUERY, {"open_id": ""}),
+    ("network.stat", network.NETWORK_STAT_QUERY, {"open_id": ""}),
+    ("network.stat.recent", network.NETWORK_STAT_RECENT_QUERY, {"open_id": "", "cutoff": ""}),
+    ("reminders.birthdays", reminders.BIRTHDAYS_QUERY, {"days": ["01-01"]}),
+    ("reminders.follow_ups", reminders.FOLLOW_UPS_QUERY, {"since": "", "until": ""}),
+    ("reminders.lease", reminders.LEASE_QUERY, {"name": "", "holder": "", "now": "", "expires": ""}),
+    ("reminders.release", reminders.RELEASE_QUERY, {"name": "", "holder": "", "last_run_date": ""}),
+    ("reminders.deliver", reminders.DELIVER_QUERY,
+     {"rows": [{"owner": "", "dedup_key": "", "text": "", "message_type": "", "person_id": ""}], "now": ""}),
+    ("write_behind.user.last_login", write_behind.KINDS["user.last_login"].query,
+     {"rows": [{"open_id": "", "at": ""}]}),
+    ("write_behind.inbox.read", write_behind.KINDS["inbox.read"].query, {"rows": [{"open_id": "", "ids": [""]}]}),
+    ("write_behind.person.view", write_behind.KINDS["person.view"].query,
+     {"rows": [{"open_id": "", "id": "", "views": 1, "at": ""}]}),
+]
+SCAN_OPERATORS = {"AllNodesScan", "NodeByLabelScan"}
+
+async def apply_schema(driver):
+    """Apply pending migrations, called once on application startup"""
+    async with driver.session() as session:
+        result = await session.run(
+            "CREATE CONSTRAINT schema_migration_version IF NOT EXISTS "
+            "FOR (m:SchemaMigration) REQUIRE m.version IS UNIQUE"
+        )
+        await result.consume()
+        result = await session.run("MATCH (m:SchemaMigration) RETURN m.version as version")
+        applied = {record["version"] async for record in result}
+        for version, description, statements in MIGRATIONS:
+            if version in applied:
+                continue
+            log.info(f"Applying schema migration {version}: {description}")
+            for statement in statements:
+                result = await session.run(statement)
+                await result.consume()
+            result = await session.run(
+                """
+                MERGE (m:SchemaMigration {version: $version})
+                ON CREATE SET m.description = $description, m.applied_at = $now
+                """,
+                version=version,
+                description=description,
+                now=datetime.now(timezone.utc).isoformat()
+            )
+            await result.consume()
+    log.info(f"Schema at version {MIGRATIONS[-1][0]}")
+
+def _plan_operators(plan):
+    # operatorType looks like "NodeByLabelScan@neo4j"
+    yield plan["operatorType"].split("@")[0]
+    for child in plan.get("children", []):
+        yield from _plan_operators(child)
+
+async def check_query_plans(driver):
+    """EXPLAIN every entry in PLAN_CHECKS, returning (name, operator) for each scan found"""
+    problems = []
+    async with driver.session() as session:
+        for name, query, params in PLAN_CHECKS:
+            result = await session.run("EXPLAIN " + query, params)
+            summary = await result.consume()
+            for operator in _plan_operators(summary.plan):
+                if operator in SCAN_OPERATORS:
+                    problems.append((name, operator))
+    return problems
+
+async def _main(argv):
+    from .db import init_driver, close_driver
+    driver = await init_driver()
+    try:
+        await apply_schema(driver)
+        if "check" in argv:
+            problems = await check_query_plans(driver)
+            for name, operator in problems:
+                print(f"{name}: plan uses {operator}")
+            return 1 if problems else 0
+        return 0
+    finally:
+        await close_driver()
+
+if __name__ == "__main__":
+    # python -m backend.schema [check]
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
@@ -0,0 +1,48 @@
+from typing import Optional
+import re
+
+# Characters with a meaning in Lucene query syntax
+LUCENE_SPECIAL = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/])')
+# Hiragana/Katakana, CJK ideographs, Hangul and compatibility ideographs
+CJK_RANGES = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+CJK = re.compile(f"[{CJK_RANGES}]")
+TOKEN = re.compile(f"[{CJK_RANGES}]+|[^\\s{CJK_RANGES}]+")
+# Indexed fields a typed term may match; the owner key is only ever matched by its own clause
+CONTENT_FIELDS = ("name", "nickname", "city", "resources", "needs")
+
+def _escape(token: str) -> str:
+    return LUCENE_SPECIAL.sub(r"\\\1", token)
+
+def _prefix_clause(token: str) -> str:
+    # The cjk analyzer indexes CJK text as overlapping bigrams: a single typed
+    # character must match as a bigram prefix, while two or more characters
+    # already form complete bigrams. Other scripts get an exact term boosted
+    # over its prefix expansion.
+    escaped = _escape(token.lower())
+    if CJK.match(token):
+        return f"{escaped}*" if len(token) == 1 else escaped
+    return f"{escaped}^2 OR {escaped}*"
+
+def _content(clause: str) -> str:
+    return " OR ".join(f"{field}:({clause})" for field in CONTENT_FIELDS)
+
+def build_search_query(q: str, prefix: bool = False, owner: Optional[str] = None) -> str:
+    """Turn user input into a Lucene query for the person_owner_search full-text index
+
+    Every token is required. CJK and latin runs are split apart because users
+    type mixed text without spaces (e.g. "北京java"). In prefix mode the last
+    token is treated as still being typed. Terms only match the content
+    fields; with an owner the search is restricted inside Lucene to that
+    user's people.
+    """
+    tokens = TOKEN.findall(q)
+    if not tokens:
+        return ""
+    # lower-cased so that typed AND/OR/NOT are not read as operators
+    clauses = [_escape(token.lower()) for token in tokens]
+    if prefix:
+        clauses[-1] = _prefix_clause(tokens[-1])
+    clauses = [_content(clause) for clause in clauses]
+    if owner:
+        clauses.insert(0, 'owner:"{}"'.format(owner.replace("\\", "\\\\").replace('"', '\\"')))
+    return " AND ".join(f"({clause})" for clause in clauses)
@@ -0,0 +1,46 @@
+from fastapi.responses import Response
+from typing import Any, AsyncIterator, Callable
+import orjson
+
+# Bytes buffered before a streamed response is flushed to the client
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON, as JSONResponse renders it; unknown types fall back to str()"""
+    return orjson.dumps(content, default=str)
+
+def ndjson(content: Any) -> bytes:
+    """One NDJSON line"""
+    return orjson.dumps(content, default=str, option=orjson.OPT_APPEND_NEWLINE)
+
+class RecordResponse(Response):
+    """JSON response for rows read from the database and shaped by the handler
+
+    Returning a Response skips FastAPI's jsonable_encoder pass and any
+    response_model validation; the response_model still documents the route.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+async def stream_object(key: str, rows: AsyncIterator[Any], tail: Callable[[], dict]) -> AsyncIterator[bytes]:
+    """Stream {key: [row, ...], **tail()} as rows arrive; tail() is read after the last row.
+
+    If `rows` raises, the stream stops without the closing fields, so a client
+    never mistakes a truncated list for a complete one.
+    """
+    buffer = bytearray(b"{" + dumps(key) + b":[")
+    first = True
+    async for row in rows:
+        if not first:
+            buffer += b","
+        buffer += dumps(row)
+        first = False
+        if len(buffer) >= STREAM_CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    closing = dumps(tail())
+    buffer += b"]," + closing[1:] if len(closing) > 2 else b"]}"
+    yield bytes(buffer)
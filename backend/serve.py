@@ -0,0 +1,104 @@
+"""Production entry point: python -m backend.serve
+
+Runs backend.main:app under uvicorn with one worker process per available
+core (SERVER_WORKERS to override). Workers share the listening socket; state
+kept in process (person cache, network stats, inbox streams, match indexes)
+is per worker, so person cache invalidations and match index changes need
+CACHE_INVALIDATION_REDIS_URL and sessions a shared SESSION_BACKEND (sqlite or
+redis).
+"""
+from uvicorn import Config, Server
+from uvicorn.supervisors import Multiprocess
+import argparse
+import importlib.util
+import logging
+import os
+from dotenv import load_dotenv
+
+log = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_WORKERS = os.getenv("SERVER_WORKERS")
+# Seconds in-flight requests get to finish after SIGTERM before they are cancelled
+SERVER_GRACEFUL_TIMEOUT = float(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+SERVER_KEEPALIVE_TIMEOUT = int(os.getenv("SERVER_KEEPALIVE_TIMEOUT", "5"))
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "2048"))
+SERVER_ACCESS_LOG = os.getenv("SERVER_ACCESS_LOG", "false").lower() == "true"
+# Comma separated proxy addresses trusted for X-Forwarded-For / X-Forwarded-Proto
+SERVER_FORWARDED_ALLOW_IPS = os.getenv("SERVER_FORWARDED_ALLOW_IPS", "127.0.0.1")
+# Connections to Neo4j across all workers; split evenly into NEO4J_MAX_POOL_SIZE
+NEO4J_TOTAL_POOL_SIZE = os.getenv("NEO4J_TOTAL_POOL_SIZE")
+
+def available_cores() -> int:
+    # Respects CPU affinity (taskset, container cpusets) where the platform has it
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+class DrainingServer(Server):
+    """uvicorn Server that ends inbox event streams when shutdown starts
+
+    Open streams otherwise hold the worker until SERVER_GRACEFUL_TIMEOUT; other
+    in-flight requests, and the Cypher transactions they run, finish before the
+    lifespan shutdown closes the Neo4j driver.
+    """
+
+    async def shutdown(self, sockets=None):
+        from .inbox_hub import inbox_hub
+
+        inbox_hub.close()
+        await super().shutdown(sockets=sockets)
+
+def build_config(host: str, port: int, workers: int) -> Config:
+    # Same choice as uvicorn's "auto", made explicit so the log says which is used
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    log.info(f"Serving on {host}:{port} with {workers} worker(s), {loop} loop, {http} parser")
+    return Config(
+        "backend.main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        lifespan="on",
+        backlog=SERVER_BACKLOG,
+        timeout_keep_alive=SERVER_KEEPALIVE_TIMEOUT,
+        timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT,
+        access_log=SERVER_ACCESS_LOG,
+        proxy_headers=True,
+        forwarded_allow_ips=SERVER_FORWARDED_ALLOW_IPS,
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.serve")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=int(SERVER_WORKERS or available_cores()))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    workers = max(1, args.workers)
+    if NEO4J_TOTAL_POOL_SIZE:
+        # Workers are spawned with this environment, so db.py picks up its share
+        os.environ["NEO4J_MAX_POOL_SIZE"] = str(max(1, int(NEO4J_TOTAL_POOL_SIZE) // workers))
+    if workers > 1 and not os.getenv("CACHE_INVALIDATION_REDIS_URL"):
+        log.warning("CACHE_INVALIDATION_REDIS_URL is unset: person cache entries may be stale on other workers "
+                    "for up to PERSON_CACHE_TTL seconds after a write, and matches until MATCH_REBUILD_INTERVAL")
+    if workers > 1 and os.getenv("SESSION_BACKEND") == "memory":
+        log.warning("SESSION_BACKEND=memory is not shared between workers; use sqlite or redis")
+
+    config = build_config(args.host, args.port, workers)
+    server = DrainingServer(config)
+    if workers > 1:
+        # Bound once here and inherited by every worker, as uvicorn.run does
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+if __name__ == "__main__":
+    main()
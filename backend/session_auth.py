@@ -1,23 +1,30 @@
-from fastapi import FastAPI, HTTPException, APIRouter, Depends
+from fastapi import FastAPI, HTTPException, APIRouter, Depends, Request
 from fastapi.responses import JSONResponse
-from fastapi_sessions.backends.implementations import InMemoryBackend
+from fastapi_sessions.backends.session_backend import SessionBackend
 from fastapi_sessions.session_verifier import SessionVerifier
 from fastapi_sessions.frontends.implementations import SessionCookie, CookieParameters
+from fastapi_sessions.frontends.session_frontend import FrontendError
+from collections import OrderedDict
+from pydantic import ValidationError
 from uuid import UUID, uuid4
-import requests
+import httpx
 import logging
 import os
+import random
 from dotenv import load_dotenv
 from .feishu import Feishu
-from .db import driver
+from .db import get_driver
 from .user import get_or_create_user
 from .models import SessionData
+from .session_store import create_session_backend, SESSION_TTL, SESSION_CACHE_SIZE
 
 # Load environment variables
 load_dotenv()
 FEISHU_APP_ID = os.getenv("FEISHU_APP_ID")
 FEISHU_APP_SECRET = os.getenv("FEISHU_APP_SECRET")
 FEISHU_HOST = os.getenv("FEISHU_HOST")
+# Fraction of session verifications logged at DEBUG level
+SESSION_LOG_SAMPLE_RATE = float(os.getenv("SESSION_LOG_SAMPLE_RATE", "0.01"))
 
 # Initialize Feishu
 auth = Feishu(FEISHU_HOST, FEISHU_APP_ID, FEISHU_APP_SECRET)
@@ -27,10 +34,20 @@ logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
 # Configure cookie parameters
-cookie_params = CookieParameters()
+cookie_params = CookieParameters(max_age=SESSION_TTL)
+
+class AsyncSessionCookie(SessionCookie):
+    """SessionCookie resolved on the event loop
+
+    The signature check takes microseconds; as a sync dependency FastAPI would
+    hand it to the threadpool on every protected request.
+    """
+
+    async def __call__(self, request: Request):
+        return super().__call__(request)
 
 # Use UUID4 (random) as session ID
-cookie = SessionCookie(
+cookie = AsyncSessionCookie(
     cookie_name="session",
     identifier="session",
     auto_error=True,
@@ -38,7 +55,8 @@ cookie = SessionCookie(
     cookie_params=cookie_params
 )
 
-backend = InMemoryBackend[UUID, SessionData]()
+# Shared session store, selected by SESSION_BACKEND (see session_store.py)
+backend = create_session_backend()
 
 class BasicVerifier(SessionVerifier[UUID, SessionData]):
     def __init__(
@@ -46,13 +64,14 @@ class BasicVerifier(SessionVerifier[UUID, SessionData]):
         *,
         identifier: str,
         auto_error: bool,
-        backend: InMemoryBackend[UUID, SessionData],
+        backend: SessionBackend[UUID, SessionData],
         auth_http_exception: HTTPException,
     ):
         self._identifier = identifier
         self._auto_error = auto_error
         self._backend = backend
         self._auth_http_exception = auth_http_exception
+        self._verified: OrderedDict = OrderedDict()  # session id -> verified session object
 
     @property
     def identifier(self):
@@ -71,28 +90,38 @@ class BasicVerifier(SessionVerifier[UUID, SessionData]):
         return self._auth_http_exception
 
     def verify_session(self, model: SessionData) -> bool:
-        """Verify session integrity and validity"""
-        log.info(f"Verifying session: {model}")
-        
-        # Check if session data exists
-        if not model or not model.user_info:
-            log.warning("Empty or invalid session data")
-            return False
-        
-        # Check for required user info fields
-        required_fields = ['open_id', 'name']
-        for field in required_fields:
-            if field not in model.user_info:
-                log.warning(f"Missing required field: {field}")
-                return False
-        
-        # Optional: Add time-based session expiration
-        # current_time = datetime.now(timezone.utc)
-        # if (current_time - model.created_at) > timedelta(hours=24):
-        #     log.warning("Session expired")
-        #     return False
-        
-        return True
+        """Verify session integrity; the payload is validated when the session is created"""
+        user_info = model.user_info if model else None
+        return bool(user_info) and all(user_info.get(field) for field in SessionData.REQUIRED_FIELDS)
+
+    def _reject(self):
+        if self.auto_error:
+            raise self.auth_http_exception
+        return None
+
+    async def __call__(self, request: Request):
+        # Same contract as SessionVerifier.__call__, but a session object that
+        # already passed verify_session is not verified again. Backends return the
+        # same object while it is cached, so identity is enough to detect changes.
+        session_id = getattr(request.state, "session_ids", {}).get(self.identifier)
+        if session_id is None or isinstance(session_id, FrontendError):
+            return self._reject()
+        session_data = await self.backend.read(session_id)
+        if session_data is None:
+            return self._reject()
+        cached = self._verified.get(session_id) is session_data
+        if cached:
+            self._verified.move_to_end(session_id)
+        else:
+            if not self.verify_session(session_data):
+                log.warning(f"Rejected session {session_id}: missing required user info")
+                return self._reject()
+            self._verified[session_id] = session_data
+            while len(self._verified) > SESSION_CACHE_SIZE:
+                self._verified.popitem(last=False)
+        if log.isEnabledFor(logging.DEBUG) and random.random() < SESSION_LOG_SAMPLE_RATE:
+            log.debug("session verified", extra={"session_id": str(session_id), "cached": cached})
+        return session_data
 
 verifier = BasicVerifier(
     identifier="session",
@@ -118,13 +147,14 @@ def setup_auth_routes(app: FastAPI):
                     "union_id": "on_86ec337b91935163274083d388e753f9"
                 }
             else:
-                # Get user access token and info
-                auth.authorize_user_access_token(code)
-                user_info = auth.get_user_info()
+                # Exchange the code for user info (app token is cached)
+                user_info = await auth.login(code)
 
             # Create or update user in database
-            with driver.session() as session:
-                db_user = get_or_create_user(session, user_info)
+            async with get_driver().session() as session:
+                db_user, _ = await get_or_create_user(session, user_info)
+                if db_user is None:
+                    raise HTTPException(status_code=403, detail="User has been deleted")
                 # Add database user info to the user_info dict
                 user_info.update({
                     "level": db_user["level"],
@@ -132,10 +162,10 @@ def setup_auth_routes(app: FastAPI):
                     "last_login_at": db_user["last_login_at"]
                 })
 
-            # Create new session
+            # Create new session; the payload is validated here, once
             session_id = uuid4()
             data = SessionData(user_info=user_info)
-            
+
             await backend.create(session_id, data)
             response = JSONResponse(user_info)
             
@@ -144,7 +174,12 @@ def setup_auth_routes(app: FastAPI):
             
             return response
             
-        except requests.exceptions.RequestException as e:
+        except HTTPException:
+            raise
+        except ValidationError as e:
+            log.error(f"Invalid user info from Feishu: {str(e)}")
+            raise HTTPException(status_code=502, detail="Incomplete user info from Feishu")
+        except httpx.HTTPError as e:
             log.error(f"Request error: {str(e)}")
             raise HTTPException(status_code=500, detail="Failed to communicate with Feishu API")
         except Exception as e:
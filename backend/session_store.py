@@ -0,0 +1,220 @@
+from fastapi_sessions.backends.session_backend import SessionBackend, BackendError
+from fastapi_sessions.backends.implementations import InMemoryBackend
+from collections import OrderedDict
+from typing import Optional
+from uuid import UUID
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+from .models import SessionData
+
+# Load environment variables
+load_dotenv()
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")  # sqlite | redis | memory
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(7 * 24 * 3600)))
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "4096"))
+# How long a worker may serve a session from its local cache without asking storage
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "30"))
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "600"))
+
+log = logging.getLogger(__name__)
+
+def _load(raw) -> SessionData:
+    # Stored payloads were validated when the session was created
+    return SessionData.model_construct(**json.loads(raw))
+
+class SQLiteBackend(SessionBackend[UUID, SessionData]):
+    """Sessions stored in a SQLite file, shareable between worker processes"""
+
+    def __init__(self, path: str, ttl: int):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL lets several worker processes read while one writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _write(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    async def create(self, session_id: UUID, data: SessionData):
+        try:
+            await asyncio.to_thread(
+                self._write,
+                "INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+                (str(session_id), data.model_dump_json(), time.time() + self._ttl),
+            )
+        except sqlite3.IntegrityError:
+            raise BackendError("create can't overwrite an existing session")
+
+    async def read(self, session_id: UUID) -> Optional[SessionData]:
+        row = await asyncio.to_thread(
+            self._execute,
+            "SELECT data FROM sessions WHERE id = ? AND expires_at > ?",
+            (str(session_id), time.time()),
+        )
+        if not row:
+            return None
+        return _load(row[0])
+
+    async def update(self, session_id: UUID, data: SessionData):
+        updated = await asyncio.to_thread(
+            self._write,
+            "UPDATE sessions SET data = ?, expires_at = ? WHERE id = ? AND expires_at > ?",
+            (data.model_dump_json(), time.time() + self._ttl, str(session_id), time.time()),
+        )
+        if not updated:
+            raise BackendError("session does not exist, cannot update")
+
+    async def delete(self, session_id: UUID):
+        await asyncio.to_thread(self._write, "DELETE FROM sessions WHERE id = ?", (str(session_id),))
+
+    async def sweep(self) -> int:
+        """Remove expired sessions, returns the number removed"""
+        return await asyncio.to_thread(self._write, "DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+class RedisBackend(SessionBackend[UUID, SessionData]):
+    """Sessions stored in Redis (or anything speaking its protocol), expired by the server"""
+
+    def __init__(self, url: str, ttl: int, prefix: str = "session:"):
+        # Optional dependency, only needed when SESSION_BACKEND=redis
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url)
+        self._ttl = ttl
+        self._prefix = prefix
+
+    def _key(self, session_id: UUID) -> str:
+        return f"{self._prefix}{session_id}"
+
+    async def create(self, session_id: UUID, data: SessionData):
+        created = await self._redis.set(self._key(session_id), data.model_dump_json(), ex=self._ttl, nx=True)
+        if not created:
+            raise BackendError("create can't overwrite an existing session")
+
+    async def read(self, session_id: UUID) -> Optional[SessionData]:
+        raw = await self._redis.get(self._key(session_id))
+        if raw is None:
+            return None
+        return _load(raw)
+
+    async def update(self, session_id: UUID, data: SessionData):
+        updated = await self._redis.set(self._key(session_id), data.model_dump_json(), ex=self._ttl, xx=True)
+        if not updated:
+            raise BackendError("session does not exist, cannot update")
+
+    async def delete(self, session_id: UUID):
+        await self._redis.delete(self._key(session_id))
+
+    async def sweep(self) -> int:
+        # Redis expires keys itself
+        return 0
+
+    async def close(self):
+        await self._redis.aclose()
+
+class CachedBackend(SessionBackend[UUID, SessionData]):
+    """Small per-process LRU in front of a shared backend
+
+    Entries are served locally for at most `cache_ttl` seconds, which bounds how
+    long a session deleted by another worker can still be accepted here.
+    """
+
+    def __init__(self, backend: SessionBackend[UUID, SessionData], size: int, cache_ttl: float):
+        self._backend = backend
+        self._size = size
+        self._cache_ttl = cache_ttl
+        self._cache: OrderedDict = OrderedDict()
+
+    def _put(self, session_id: UUID, data: SessionData):
+        self._cache[session_id] = (data, time.monotonic() + self._cache_ttl)
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self._size:
+            self._cache.popitem(last=False)
+
+    async def create(self, session_id: UUID, data: SessionData):
+        await self._backend.create(session_id, data)
+        self._put(session_id, data)
+
+    async def read(self, session_id: UUID) -> Optional[SessionData]:
+        cached = self._cache.get(session_id)
+        if cached and cached[1] > time.monotonic():
+            self._cache.move_to_end(session_id)
+            return cached[0]
+        data = await self._backend.read(session_id)
+        if data is None:
+            self._cache.pop(session_id, None)
+        else:
+            self._put(session_id, data)
+        return data
+
+    async def update(self, session_id: UUID, data: SessionData):
+        await self._backend.update(session_id, data)
+        self._put(session_id, data)
+
+    async def delete(self, session_id: UUID):
+        self._cache.pop(session_id, None)
+        await self._backend.delete(session_id)
+
+    async def sweep(self) -> int:
+        now = time.monotonic()
+        for session_id in [k for k, (_, expires) in self._cache.items() if expires <= now]:
+            del self._cache[session_id]
+        return await self._backend.sweep()
+
+    async def close(self):
+        self._cache.clear()
+        await self._backend.close()
+
+class MemoryBackend(InMemoryBackend[UUID, SessionData]):
+    """Process-local sessions, for development only"""
+
+    async def sweep(self) -> int:
+        return 0
+
+    async def close(self):
+        pass
+
+def create_session_backend() -> SessionBackend[UUID, SessionData]:
+    """Build the session backend selected by SESSION_BACKEND"""
+    if SESSION_BACKEND == "memory":
+        return MemoryBackend()
+    if SESSION_BACKEND == "redis":
+        store = RedisBackend(SESSION_REDIS_URL, SESSION_TTL)
+    elif SESSION_BACKEND == "sqlite":
+        store = SQLiteBackend(SESSION_DB_PATH, SESSION_TTL)
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND: {SESSION_BACKEND}")
+    return CachedBackend(store, SESSION_CACHE_SIZE, SESSION_CACHE_TTL)
+
+async def sweep_expired_sessions(backend, interval: float = SESSION_SWEEP_INTERVAL):
+    """Background task that periodically removes expired sessions"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await backend.sweep()
+            if removed:
+                log.info(f"Removed {removed} expired sessions")
+        except Exception as e:
+            log.error(f"Error sweeping sessions: {e}")
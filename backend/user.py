@@ -1,138 +1,310 @@
-from fastapi import APIRouter, FastAPI, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Query
+from fastapi.responses import StreamingResponse
 from datetime import datetime, timezone
 import logging
-from .db import driver
-from .models import User, SessionData, InboxMessage
-from typing import List
+import os
+import uuid
+from dotenv import load_dotenv
+from .db import get_driver
+from .models import SessionData, InboxPage, InboxReadRequest, Announcement
+from .metrics import fetch, fetch_one
+from .serialization import RecordResponse
+from .write_behind import write_behind
+from .people import encode_cursor, decode_cursor, MAX_PAGE_SIZE
+from .inbox_hub import inbox_hub
+from .network import network_stats
+from typing import List, Optional
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
-def get_or_create_user(session, user_info):
-    """Get existing user or create a new one"""
-    result = session.run(
-        """
-        MATCH (u:User {open_id: $open_id}) 
-        WHERE u.deleted = false OR u.deleted IS NULL
-        RETURN elementId(u) as id, u.name as name, u.open_id as open_id, 
-               u.created_at as created_at, u.last_login_at as last_login_at,
-               u.level as level, u.deleted as deleted
-        """,
-        open_id=user_info["open_id"]
+# Load environment variables
+load_dotenv()
+# Comma separated open_ids allowed to send announcements to every user
+ADMIN_OPEN_IDS = {i.strip() for i in os.getenv("ADMIN_OPEN_IDS", "").split(",") if i.strip()}
+# Users receiving an announcement per write transaction
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "1000"))
+
+WELCOME_TEXT = "Welcome! 👋 We're glad to have you in HM."
+
+# MERGE is serialized by the unique constraint on User.open_id, so racing
+# first logins cannot create duplicates; the welcome message is only
+# created together with the user node. A deleted user matches but is
+# filtered out, so the account does not come back by logging in.
+UPSERT_USER_QUERY = """
+    MERGE (u:User {open_id: $open_id})
+    ON CREATE SET u.name = $name,
+                  u.created_at = $now,
+                  u.last_login_at = $now,
+                  u.level = 1,
+                  u.deleted = false,
+                  u.unread_count = 1
+    WITH u, u.created_at = $now AS created
+    WHERE u.deleted = false OR u.deleted IS NULL
+    CALL {
+        WITH u, created
+        WITH u WHERE created
+        CREATE (u)-[:HAS_MESSAGE]->(m:InboxMessage {
+            date: $now,
+            text: $welcome_text,
+            read: false,
+            message_type: 'System'
+        })
+        RETURN collect({id: elementId(m), date: m.date, text: m.text, read: m.read,
+                        message_type: m.message_type}) as messages
+    }
+    RETURN elementId(u) as id, u.name as name, u.open_id as open_id,
+           u.created_at as created_at, u.last_login_at as last_login_at,
+           u.level as level, u.deleted as deleted, created, messages
+    """
+
+GET_USER_QUERY = """
+    MATCH (u:User {open_id: $open_id})
+    WHERE u.deleted = false OR u.deleted IS NULL
+    RETURN elementId(u) as id, u.name as name, u.open_id as open_id,
+           u.created_at as created_at, u.last_login_at as last_login_at,
+           u.level as level, u.deleted as deleted
+    """
+
+UNREAD_COUNT_QUERY = "MATCH (u:User {open_id: $open_id}) RETURN coalesce(u.unread_count, 0) as unread_count"
+
+UNREAD_MESSAGE_QUERY = """
+    MATCH (u:User {open_id: $open_id})-[:HAS_MESSAGE]->(m:InboxMessage)
+    WHERE elementId(m) = $message_id AND m.read = false
+    RETURN elementId(m) as id, m.date as date, m.text as text,
+           coalesce(m.message_type, 'System') as message_type, m.person_id as person_id
+    """
+
+def inbox_query(conditions: List[str]) -> str:
+    return (
+        "MATCH (u:User {open_id: $open_id})-[:HAS_MESSAGE]->(m:InboxMessage) "
+        f"WHERE {' AND '.join(conditions)} "
+        # Defaults of InboxMessage are applied here; the page is not re-validated
+        "RETURN elementId(m) as id, m.date as date, m.text as text, "
+        "       coalesce(m.read, false) as read, coalesce(m.message_type, 'System') as message_type, "
+        "       m.person_id as person_id "
+        "ORDER BY m.date DESC, elementId(m) DESC LIMIT $limit"
     )
-    user = result.single()
-    
-    if not user:
-        # Create new user with welcome message
-        now = datetime.now(timezone.utc).isoformat()
-        result = session.run(
-            """
-            CREATE (u:User {
-                name: $name,
-                open_id: $open_id,
-                created_at: $now,
-                last_login_at: $now,
-                level: 1,
-                deleted: false
-            })
-            WITH u
-            CREATE (m:InboxMessage {
-                date: $now,
-                text: $welcome_text,
-                read: false,
-                message_type: 'System'
-            })
-            CREATE (u)-[:HAS_MESSAGE]->(m)
-            RETURN elementId(u) as id, u.name as name, u.open_id as open_id,
-                   u.created_at as created_at, u.last_login_at as last_login_at,
-                   u.level as level, u.deleted as deleted
-            """,
-            name=user_info["name"],
-            open_id=user_info["open_id"],
-            now=now,
-            welcome_text="Welcome! 👋 We're glad to have you in HM."
-        )
-        user = result.single()
-    else:
-        # Update last login time
-        now = datetime.now(timezone.utc).isoformat()
-        session.run(
-            """
-            MATCH (u:User {open_id: $open_id})
-            SET u.last_login_at = $now
-            """,
-            open_id=user_info["open_id"],
-            now=now
-        )
-    
-    return dict(user)
+
+def mark_read_query(conditions: List[str]) -> str:
+    # The counter is adjusted in the same transaction as the flags it counts
+    return (
+        "MATCH (u:User {open_id: $open_id}) "
+        f"OPTIONAL MATCH (u)-[:HAS_MESSAGE]->(m:InboxMessage) WHERE {' AND '.join(conditions)} "
+        "SET m.read = true "
+        "WITH u, collect(elementId(m)) AS ids "
+        "SET u.unread_count = CASE WHEN coalesce(u.unread_count, 0) > size(ids) "
+        "                          THEN u.unread_count - size(ids) ELSE 0 END "
+        "RETURN ids, u.unread_count AS unread_count"
+    )
+
+async def _upsert_user(tx, open_id, name, now):
+    return await fetch_one(tx, "user.upsert", UPSERT_USER_QUERY,
+        open_id=open_id,
+        name=name,
+        now=now,
+        welcome_text=WELCOME_TEXT
+    )
+
+async def get_or_create_user(session, user_info):
+    """Get existing user or create a new one in a single write transaction.
+
+    Returns the user dict and whether it was created by this call, or
+    (None, False) for a deleted user. The upsert leaves returning users
+    untouched; their login time is queued on the write-behind queue instead.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    record = await session.execute_write(_upsert_user, user_info["open_id"], user_info["name"], now)
+    if record is None:
+        return None, False
+    user = dict(record)
+    created = user.pop("created")
+    if not created:
+        await write_behind.put("user.last_login", user["open_id"], now)
+        user["last_login_at"] = now
+    for message in user.pop("messages"):
+        inbox_hub.publish(user["open_id"], "message", message)
+    return user, created
+
+async def _mark_read(tx, open_id, ids, before):
+    conditions = ["m.read = false"]
+    params = {"open_id": open_id}
+    if ids is not None:
+        conditions.append("elementId(m) IN $ids")
+        params["ids"] = ids
+    if before:
+        params["before_date"], params["before_id"] = decode_cursor(before)
+        conditions.append("m.date <= $before_date")
+        conditions.append("(m.date < $before_date OR elementId(m) <= $before_id)")
+    return await fetch_one(tx, "user.inbox.read", mark_read_query(conditions), params)
 
 def setup_user_routes(router: APIRouter, verifier):
     @router.get("/user/me")
     async def get_current_user(session_data: SessionData = Depends(verifier)):
         """Get the current user's information"""
         try:
-            with driver.session() as session:
-                result = session.run(
-                    """
-                    MATCH (u:User {open_id: $open_id})
-                    WHERE u.deleted = false OR u.deleted IS NULL
-                    RETURN elementId(u) as id, u.name as name, u.open_id as open_id,
-                           u.created_at as created_at, u.last_login_at as last_login_at,
-                           u.level as level, u.deleted as deleted
-                    """,
+            async with get_driver().session() as session:
+                user = await fetch_one(session, "user.get", GET_USER_QUERY,
                     open_id=session_data.user_info["open_id"]
                 )
-                user = result.single()
                 if not user:
                     raise HTTPException(status_code=404, detail="User not found")
-                return dict(user)
+                # A login still on the write-behind queue is newer than the stored one
+                last_login_at = write_behind.pending("user.last_login", user["open_id"])
+                if last_login_at and (user["last_login_at"] or "") < last_login_at:
+                    user["last_login_at"] = last_login_at
+                return RecordResponse(user)
+        except HTTPException:
+            raise
         except Exception as e:
             log.error(f"Error getting current user: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
 
-    @router.get("/user/inbox", response_model=List[InboxMessage])
-    async def get_inbox_messages(session_data: SessionData = Depends(verifier)):
-        """Get the 20 newest inbox messages for the current user"""
+    @router.get("/user/inbox", response_model=InboxPage)
+    async def get_inbox_messages(
+        limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        unread_only: bool = False,
+        session_data: SessionData = Depends(verifier),
+    ):
+        """Inbox messages newest first, one keyset page on (date, id) at a time"""
+        open_id = session_data.user_info["open_id"]
+        params = {"limit": limit + 1, "open_id": open_id}
+        conditions = ["m.date IS NOT NULL"]
+        if cursor:
+            params["after_date"], params["after_id"] = decode_cursor(cursor)
+            conditions = [
+                "m.date <= $after_date",
+                "(m.date < $after_date OR elementId(m) < $after_id)",
+            ]
+        if unread_only:
+            conditions.append("m.read = false")
         try:
-            with driver.session() as session:
-                result = session.run(
-                    """
-                    MATCH (u:User {open_id: $open_id})-[:HAS_MESSAGE]->(m:InboxMessage)
-                    RETURN elementId(m) as id, m.date as date, m.text as text, m.read as read,
-                           m.message_type as message_type
-                    ORDER BY m.date DESC
-                    LIMIT 20
+            async with get_driver().session() as session:
+                rows = await fetch(session, "user.inbox", inbox_query(conditions), params)
+                record = await fetch_one(session, "user.unread", UNREAD_COUNT_QUERY, open_id=open_id)
+        except Exception as e:
+            log.error(f"Error getting inbox messages: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["date"], rows[-1]["id"])
+        # Messages marked read by this worker but not yet written
+        queued_read = write_behind.pending("inbox.read", open_id) or set()
+        items = [{**row, "read": True} if row["id"] in queued_read else row for row in rows]
+        if unread_only:
+            items = [item for item in items if not item["read"]]
+        unread_count = record["unread_count"] if record else 0
+        return RecordResponse({
+            "items": items,
+            "next_cursor": next_cursor,
+            # only meaningful on the first page: "mark everything I have seen as read"
+            "read_cursor": encode_cursor(rows[0]["date"], rows[0]["id"]) if rows and not cursor else None,
+            "unread_count": max(unread_count - len(queued_read), 0),
+        })
+
+    @router.post("/user/inbox/read")
+    async def mark_messages_as_read(request: InboxReadRequest, session_data: SessionData = Depends(verifier)):
+        """Mark the given messages, or everything at or older than a cursor, as read in one transaction"""
+        if request.ids is None and not request.before:
+            raise HTTPException(status_code=400, detail="Either ids or before is required")
+        open_id = session_data.user_info["open_id"]
+        try:
+            if write_behind.pending("inbox.read", open_id):
+                # Write queued single reads first so the counter is adjusted once
+                await write_behind.flush()
+            async with get_driver().session() as session:
+                record = await session.execute_write(_mark_read, open_id, request.ids, request.before)
+        except HTTPException:
+            raise
+        except Exception as e:
+            log.error(f"Error marking messages as read: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+        if not record:
+            raise HTTPException(status_code=404, detail="User not found")
+        network_stats.unread_counted(open_id, record["unread_count"])
+        if record["ids"]:
+            inbox_hub.publish(open_id, "read", {"ids": record["ids"]})
+        return {"marked": len(record["ids"]), "unread_count": record["unread_count"]}
+
+    @router.post("/user/inbox/broadcast")
+    async def broadcast_announcement(announcement: Announcement, session_data: SessionData = Depends(verifier)):
+        """Deliver one announcement to every user, committed in batches"""
+        if session_data.user_info["open_id"] not in ADMIN_OPEN_IDS:
+            raise HTTPException(status_code=403, detail="Not allowed")
+        broadcast_id = str(uuid.uuid4())
+        try:
+            async with get_driver().session() as session:
+                # CALL ... IN TRANSACTIONS needs an auto-commit transaction; a failure
+                # leaves earlier batches delivered
+                result = await session.run(
+                    f"""
+                    MATCH (u:User) WHERE u.open_id IS NOT NULL AND coalesce(u.deleted, false) = false
+                    CALL {{
+                        WITH u
+                        CREATE (u)-[:HAS_MESSAGE]->(:InboxMessage {{
+                            date: $now,
+                            text: $text,
+                            read: false,
+                            message_type: $message_type,
+                            broadcast_id: $broadcast_id
+                        }})
+                        SET u.unread_count = coalesce(u.unread_count, 0) + 1
+                    }} IN TRANSACTIONS OF {BROADCAST_BATCH_SIZE} ROWS
+                    RETURN count(*) as delivered
                     """,
-                    open_id=session_data.user_info["open_id"]
+                    now=datetime.now(timezone.utc).isoformat(),
+                    text=announcement.text,
+                    message_type=announcement.message_type,
+                    broadcast_id=broadcast_id
                 )
-                return [dict(record) for record in result]
+                record = await result.single()
         except Exception as e:
-            log.error(f"Error getting inbox messages: {str(e)}")
+            log.error(f"Error broadcasting announcement: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
+        network_stats.announcement_delivered()
+        # Connected clients refetch rather than receiving per-user message ids
+        inbox_hub.publish_all("reset", {})
+        return {"broadcast_id": broadcast_id, "delivered": record["delivered"]}
+
+    @router.get("/user/inbox/stream")
+    async def stream_inbox(
+        last_event_id: Optional[str] = None,
+        last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+        session_data: SessionData = Depends(verifier),
+    ):
+        """Server-sent events for new messages ("message") and read-state changes ("read").
+
+        Browsers resume with the Last-Event-ID header; a "reset" event means the
+        gap could not be replayed and the client should refetch the inbox.
+        """
+        return StreamingResponse(
+            inbox_hub.stream(session_data.user_info["open_id"], last_event_id_header or last_event_id),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
     @router.post("/user/inbox/{message_id}/read")
     async def mark_message_as_read(message_id: str, session_data: SessionData = Depends(verifier)):
-        """Mark a message as read"""
+        """Mark a message as read; the flag and unread counter are written by the write-behind queue"""
+        open_id = session_data.user_info["open_id"]
+        if message_id in (write_behind.pending("inbox.read", open_id) or ()):
+            raise HTTPException(status_code=404, detail="Message not found or already read")
         try:
-            with driver.session() as session:
-                result = session.run(
-                    """
-                    MATCH (u:User {open_id: $open_id})-[:HAS_MESSAGE]->(m:InboxMessage)
-                    WHERE elementId(m) = $message_id AND m.read = false
-                    SET m.read = true
-                    RETURN elementId(m) as id, m.date as date, m.text as text, m.read as read,
-                           m.message_type as message_type
-                    """,
-                    open_id=session_data.user_info["open_id"],
+            async with get_driver().session() as session:
+                record = await fetch_one(session, "user.inbox.unread_one", UNREAD_MESSAGE_QUERY,
+                    open_id=open_id,
                     message_id=message_id
                 )
-                record = result.single()
-                if not record:
-                    raise HTTPException(status_code=404, detail="Message not found or already read")
-                return dict(record)
+            if record:
+                await write_behind.put("inbox.read", open_id, {record["id"]})
         except Exception as e:
             log.error(f"Error marking message as read: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
-
+        if not record:
+            raise HTTPException(status_code=404, detail="Message not found or already read")
+        network_stats.unread_changed(open_id, -1)
+        inbox_hub.publish(open_id, "read", {"ids": [record["id"]]})
+        return RecordResponse({**record, "read": True})
@@ -0,0 +1,200 @@
+from typing import Any, Callable, Dict, Hashable, List, Optional
+import asyncio
+import logging
+import os
+import time
+from dotenv import load_dotenv
+from .db import get_driver
+from .metrics import fetch, registry
+
+log = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+# Seconds between flushes; 0 writes every update through before put() returns
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "1"))
+# Coalesced updates held in memory before put() has to wait for a flush
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+# Rows per UNWIND write transaction; a full batch also triggers an early flush
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "1000"))
+
+BATCH_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+batch_rows = registry.histogram(
+    "write_behind_batch_rows", "Coalesced updates per write-behind transaction", BATCH_BUCKETS)
+flush_lag = registry.histogram(
+    "write_behind_lag_seconds", "Time from an update being queued until its batch committed")
+coalesced_updates = registry.counter(
+    "write_behind_coalesced_total", "Updates merged into one already waiting for the same key")
+failed_batches = registry.counter(
+    "write_behind_failed_batches_total", "Write-behind batches that failed and were requeued")
+backpressure_waits = registry.counter(
+    "write_behind_backpressure_total", "put() calls that waited for a flush because the queue was full")
+
+class WriteKind:
+    """How one kind of update is merged in memory and written in a batch"""
+
+    __slots__ = ("query", "merge", "row")
+
+    def __init__(self, query: str, merge: Callable[[Any, Any], Any], row: Callable[[Hashable, Any], dict]):
+        self.query = query
+        self.merge = merge
+        self.row = row
+
+# Every write is guarded so that replaying a batch, or applying it after a
+# newer direct write, leaves the same result.
+KINDS: Dict[str, WriteKind] = {
+    # key: open_id, value: ISO timestamp
+    "user.last_login": WriteKind(
+        """
+        UNWIND $rows AS row
+        MATCH (u:User {open_id: row.open_id})
+        WHERE u.last_login_at IS NULL OR u.last_login_at < row.at
+        SET u.last_login_at = row.at
+        """,
+        max,
+        lambda open_id, at: {"open_id": open_id, "at": at},
+    ),
+    # key: open_id, value: set of message ids; each was unread when queued
+    "inbox.read": WriteKind(
+        """
+        UNWIND $rows AS row
+        MATCH (u:User {open_id: row.open_id})
+        OPTIONAL MATCH (u)-[:HAS_MESSAGE]->(m:InboxMessage)
+        WHERE elementId(m) IN row.ids AND m.read = false
+        SET m.read = true
+        WITH u, count(m) AS n
+        SET u.unread_count = CASE WHEN coalesce(u.unread_count, 0) > n THEN u.unread_count - n ELSE 0 END
+        """,
+        lambda a, b: a | b,
+        lambda open_id, ids: {"open_id": open_id, "ids": sorted(ids)},
+    ),
+    # key: (owner open_id, person id), value: (views, last viewed ISO timestamp)
+    "person.view": WriteKind(
+        """
+        UNWIND $rows AS row
+        MATCH (p:Person) WHERE elementId(p) = row.id AND p.owner = row.open_id AND p.deleted = false
+        SET p.view_count = coalesce(p.view_count, 0) + row.views,
+            p.last_viewed_at = CASE WHEN p.last_viewed_at > row.at THEN p.last_viewed_at ELSE row.at END
+        """,
+        lambda a, b: (a[0] + b[0], max(a[1], b[1])),
+        lambda key, value: {"open_id": key[0], "id": key[1], "views": value[0], "at": value[1]},
+    ),
+}
+
+async def _write_batch(tx, kind: str, rows: List[dict]):
+    await fetch(tx, f"write_behind.{kind}", KINDS[kind].query, rows=rows)
+
+class WriteBehind:
+    """Coalesces small idempotent updates by key and writes them in periodic UNWIND batches
+
+    Updates are held per worker: pending() lets the requests of that worker
+    read their own writes, while other workers see them once the batch commits,
+    at most `interval` seconds later. Updates still queued when the process
+    is killed without a clean shutdown are lost.
+    """
+
+    def __init__(self, interval: float = WRITE_BEHIND_INTERVAL, max_pending: int = WRITE_BEHIND_MAX_PENDING,
+                 batch_size: int = WRITE_BEHIND_BATCH_SIZE):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        # kind -> key -> [value, time the oldest merged update was queued]
+        self._pending: Dict[str, Dict[Hashable, list]] = {}
+        self._flushing: Dict[str, Dict[Hashable, list]] = {}
+        self._count = 0
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+
+    def pending_count(self) -> int:
+        return self._count + sum(len(entries) for entries in self._flushing.values())
+
+    def pending(self, kind: str, key: Hashable) -> Optional[Any]:
+        """Value not yet committed for a key, merged across queued and in-flight updates"""
+        values = [entries[key][0] for entries in (self._flushing.get(kind), self._pending.get(kind))
+                  if entries and key in entries]
+        if not values:
+            return None
+        return values[0] if len(values) == 1 else KINDS[kind].merge(*values)
+
+    async def put(self, kind: str, key: Hashable, value: Any):
+        """Queue an update, merging it with one already waiting for the same key"""
+        entries = self._pending.setdefault(kind, {})
+        if key not in entries and self._count >= self.max_pending:
+            backpressure_waits.inc(kind=kind)
+            await self.flush()
+            if self._count >= self.max_pending:
+                raise RuntimeError("Write-behind queue is full and could not be flushed")
+            entries = self._pending.setdefault(kind, {})
+        entry = entries.get(key)
+        if entry is None:
+            entries[key] = [value, time.monotonic()]
+            self._count += 1
+        else:
+            entry[0] = KINDS[kind].merge(entry[0], value)
+            coalesced_updates.inc(kind=kind)
+        if self.interval <= 0:
+            await self.flush()
+        elif self._count >= self.batch_size:
+            self._wake.set()
+
+    def _requeue(self, kind: str, entries: Dict[Hashable, list]):
+        queued = self._pending.setdefault(kind, {})
+        for key, (value, queued_at) in entries.items():
+            newer = queued.get(key)
+            if newer is None:
+                queued[key] = [value, queued_at]
+                self._count += 1
+            else:
+                queued[key] = [KINDS[kind].merge(value, newer[0]), min(queued_at, newer[1])]
+
+    async def flush(self):
+        """Write everything queued so far; failed batches go back on the queue"""
+        async with self._lock:
+            self._flushing, self._pending, self._count = self._pending, {}, 0
+            try:
+                for kind, entries in self._flushing.items():
+                    while entries:
+                        keys = list(entries)[:self.batch_size]
+                        rows = [KINDS[kind].row(key, entries[key][0]) for key in keys]
+                        try:
+                            async with get_driver().session() as session:
+                                await session.execute_write(_write_batch, kind, rows)
+                        except Exception as e:
+                            log.error(f"Error writing {len(rows)} queued {kind} updates: {str(e)}")
+                            failed_batches.inc(kind=kind)
+                            break
+                        committed = time.monotonic()
+                        batch_rows.observe(len(keys), kind=kind)
+                        for key in keys:
+                            flush_lag.observe(committed - entries.pop(key)[1], kind=kind)
+            finally:
+                # Unwritten entries, after a failure or cancellation, are merged back
+                for kind, entries in self._flushing.items():
+                    self._requeue(kind, entries)
+                self._flushing = {}
+
+    async def run_periodically(self):
+        """Background task flushing every `interval` seconds, or as soon as a batch fills"""
+        if self.interval <= 0:
+            return
+        while True:
+            # asyncio.wait rather than wait_for: the latter can swallow the
+            # cancellation sent on shutdown when the wake-up lands at the same time
+            woken = asyncio.ensure_future(self._wake.wait())
+            try:
+                await asyncio.wait([woken], timeout=self.interval)
+            finally:
+                woken.cancel()
+            self._wake.clear()
+            await self.flush()
+
+    async def close(self):
+        """Flush on shutdown, before the driver is closed"""
+        await self.flush()
+        if self._count:
+            log.error(f"Dropping {self._count} queued updates that could not be written")
+
+write_behind = WriteBehind()
+
+registry.gauge("write_behind_pending", "Coalesced updates not yet committed", write_behind.pending_count)
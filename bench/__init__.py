@@ -0,0 +1,59 @@
+"""Load and benchmark harness for the backend
+
+Boots backend.main:app with uvicorn in-process, next to a stub Feishu server,
+drives a weighted mix of browser-like sessions and writes per-route
+throughput and latency percentiles to JSON.
+
+    # against a local Neo4j (NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD), seeding synthetic data
+    python -m bench run --users 50 --people 500 --messages 30 --duration 60 --out results.json
+
+    # the same mix against the production entry point with four workers
+    python -m bench run --keep --workers 4 --out results-4w.json
+    python -m bench compare results.json results-4w.json
+
+    # record the queries of a run, then replay them without a database
+    python -m bench run --record cassette.json
+    python -m bench run --replay cassette.json --out replay.json
+
+    # compare two result files, exit status 1 on a p95 or throughput regression
+    python -m bench compare base.json results.json --threshold 0.1
+
+    # response encoding microbenchmark at 10, 1k and 100k rows, no server or database
+    python -m bench serialization
+
+    # MetricsMiddleware and fetch() cost: a trivial route and an in-memory query, with and without them
+    python -m bench metrics
+
+    # session check (cookie parse + backend lookup + verify), original path against current
+    python -m bench sessions
+
+    # the same check in four processes sharing one SQLite session store, with logins written alongside
+    python -m bench sessions --workers 4
+
+    # /user/me + people page at 1, 10 and 50 concurrent coroutines, blocking sync driver against the async one
+    python -m bench driver --concurrency 1 10 50
+
+    # import 100k people as streamed NDJSON and CSV, export both formats, server peak RSS after each
+    python -m bench bulk --rows 100000
+
+    # typeahead (/people/search?prefix=true) with 1-3 character prefixes over 10 users x 100k people
+    python -m bench search --users 10 --people 100000
+
+    # one user's list, search and stat latency with 0, 10 and 100 other tenants of 10k people each
+    python -m bench tenants --tenants 0 10 100
+
+    # index build, top_k in both directions and upserts over 500k people, no server or database
+    python -m bench matching --people 500000
+
+    # /network/path and /people/{id}/neighborhood over 100k people and 1M preferential-attachment edges
+    python -m bench graph --people 100000 --degree 10
+
+    # 5000 idle inbox streams on one worker: RSS per stream, heartbeats, /health and /ready latency meanwhile
+    python -m bench sse --connections 5000
+
+    # generate_reminders over 10 users x 100k people: first run, rerun, a week's catch-up
+    python -m bench reminders --users 10 --people 100000
+
+Replayed runs return recorded rows regardless of parameters, so they measure
+the application's own overhead rather than database behaviour.
+"""
@@ -0,0 +1,190 @@
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from .runner import compare, run, serve_app
+from .serialization import SIZES, print_results, run as run_serialization
+from . import bulk, driver, graph, matching, metrics, reminders, search, sessions, sse, tenants
+
+# Subcommands that print a table and optionally save it: name -> (run from args, print)
+SCENARIOS = {
+    "serialization": (lambda args: run_serialization(args.sizes), print_results),
+    "sessions": (
+        lambda args: sessions.run_workers(args.workers, args.sessions, args.requests, args.concurrency)
+        if args.workers else sessions.run(args.sessions, args.requests),
+        sessions.print_results,
+    ),
+    "driver": (
+        lambda args: asyncio.run(driver.run(args.users, args.people, args.concurrency, args.duration, args.keep)),
+        driver.print_results,
+    ),
+    "bulk": (lambda args: asyncio.run(bulk.run(args.rows)), bulk.print_results),
+    "search": (
+        lambda args: asyncio.run(search.run(args.users, args.people, args.concurrency, args.requests, args.keep)),
+        search.print_results,
+    ),
+    "matching": (lambda args: matching.run(args.people, args.vocabulary, args.queries), matching.print_results),
+    "graph": (
+        lambda args: asyncio.run(graph.run(args.people, args.degree, args.concurrency, args.requests, args.keep)),
+        graph.print_results,
+    ),
+    "sse": (
+        lambda args: asyncio.run(sse.run(args.connections, args.users, args.hold, args.heartbeat, args.keep)),
+        sse.print_results,
+    ),
+    "metrics": (lambda args: metrics.run(args.runs, args.requests, args.rows), metrics.print_results),
+    "tenants": (
+        lambda args: asyncio.run(tenants.run(args.own, args.people, args.tenants, args.requests)),
+        tenants.print_results,
+    ),
+    "reminders": (lambda args: asyncio.run(reminders.run(args.users, args.people, args.keep)), reminders.print_results),
+}
+
+def write_json(results, path: str):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Backend load benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="boot the app, drive the request mix and save results")
+    run_parser.add_argument("--users", type=int, default=20, help="virtual users, one seeded User each")
+    run_parser.add_argument("--people", type=int, default=200, help="people seeded per user")
+    run_parser.add_argument("--messages", type=int, default=30, help="inbox messages seeded per user")
+    run_parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    run_parser.add_argument("--warmup", type=float, default=5, help="seconds driven before measuring")
+    run_parser.add_argument("--login", choices=["stub", "mock"], default="stub",
+                            help="log in through the Feishu stub as the seeded users, or as the built-in mock user")
+    run_parser.add_argument("--feishu-latency", type=float, default=0.0, help="seconds added to each stub response")
+    run_parser.add_argument("--keep", action="store_true", help="reuse data seeded by a previous run")
+    run_parser.add_argument("--url", help="drive an already running server instead of booting one")
+    run_parser.add_argument("--workers", type=int,
+                            help="run under python -m backend.serve with this many workers instead of a single process")
+    source = run_parser.add_mutually_exclusive_group()
+    source.add_argument("--record", metavar="CASSETTE", help="save the results of every query to a cassette")
+    source.add_argument("--replay", metavar="CASSETTE", help="answer queries from a cassette, without Neo4j")
+    run_parser.add_argument("--out", default="bench-results.json")
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="relative p95 increase or throughput drop counted as a regression")
+
+    serialization_parser = commands.add_parser("serialization", help="microbenchmark response encoding, no server needed")
+    serialization_parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="rows per response")
+    serialization_parser.add_argument("--out", help="also write the results as JSON")
+
+    sessions_parser = commands.add_parser("sessions", help="microbenchmark the protected-route session check, no server needed")
+    sessions_parser.add_argument("--sessions", type=int, default=sessions.SESSIONS, help="distinct sessions")
+    sessions_parser.add_argument("--requests", type=int, default=sessions.REQUESTS, help="checks timed per case and worker")
+    sessions_parser.add_argument("--workers", type=int,
+                                 help="instead, run the check in this many processes sharing one SQLite store")
+    sessions_parser.add_argument("--concurrency", type=int, default=sessions.CONCURRENCY,
+                                 help="checks in flight per worker with --workers")
+    sessions_parser.add_argument("--out", help="also write the results as JSON")
+
+    driver_parser = commands.add_parser("driver", help="concurrent-request throughput, sync driver against async, against Neo4j")
+    driver_parser.add_argument("--users", type=int, default=20, help="seeded users the requests cycle through")
+    driver_parser.add_argument("--people", type=int, default=200, help="people seeded per user")
+    driver_parser.add_argument("--concurrency", type=int, nargs="+", default=list(driver.CONCURRENCY),
+                               help="coroutines issuing requests at once")
+    driver_parser.add_argument("--duration", type=float, default=driver.DURATION, help="seconds per case")
+    driver_parser.add_argument("--keep", action="store_true", help="reuse data seeded by a previous run")
+    driver_parser.add_argument("--out", help="also write the results as JSON")
+
+    bulk_parser = commands.add_parser("bulk", help="bulk import and export through the app, against Neo4j")
+    bulk_parser.add_argument("--rows", type=int, default=bulk.ROWS, help="rows per imported file")
+    bulk_parser.add_argument("--out", help="also write the results as JSON")
+
+    search_parser = commands.add_parser("search", help="typeahead latency over a large people index, against Neo4j")
+    search_parser.add_argument("--users", type=int, default=search.USERS, help="seeded users")
+    search_parser.add_argument("--people", type=int, default=search.PEOPLE, help="people seeded per user")
+    search_parser.add_argument("--concurrency", type=int, default=search.CONCURRENCY, help="clients searching at once")
+    search_parser.add_argument("--requests", type=int, default=search.REQUESTS, help="searches in total")
+    search_parser.add_argument("--keep", action="store_true", help="reuse data seeded by a previous run")
+    search_parser.add_argument("--out", help="also write the results as JSON")
+
+    matching_parser = commands.add_parser("matching", help="microbenchmark top-k matching over one large network, no server needed")
+    matching_parser.add_argument("--people", type=int, default=matching.PEOPLE, help="people in the index")
+    matching_parser.add_argument("--vocabulary", type=int, default=matching.VOCABULARY, help="distinct synthetic terms")
+    matching_parser.add_argument("--queries", type=int, default=matching.QUERIES, help="top_k calls per direction")
+    matching_parser.add_argument("--out", help="also write the results as JSON")
+
+    graph_parser = commands.add_parser("graph", help="path and neighborhood latency over a power-law network, against Neo4j")
+    graph_parser.add_argument("--people", type=int, default=graph.PEOPLE, help="people in the seeded network")
+    graph_parser.add_argument("--degree", type=int, default=graph.DEGREE, help="KNOWS edges added per person")
+    graph_parser.add_argument("--concurrency", type=int, default=graph.CONCURRENCY, help="clients at once")
+    graph_parser.add_argument("--requests", type=int, default=graph.REQUESTS, help="requests in total, half per endpoint")
+    graph_parser.add_argument("--keep", action="store_true", help="reuse the network seeded by a previous run")
+    graph_parser.add_argument("--out", help="also write the results as JSON")
+
+    sse_parser = commands.add_parser("sse", help="hold thousands of idle inbox streams on one worker, against Neo4j")
+    sse_parser.add_argument("--connections", type=int, default=sse.CONNECTIONS, help="streams held open")
+    sse_parser.add_argument("--users", type=int, default=sse.USERS, help="seeded users the streams are spread over")
+    sse_parser.add_argument("--hold", type=float, default=sse.HOLD, help="seconds the streams stay open")
+    sse_parser.add_argument("--heartbeat", type=float, default=sse.HEARTBEAT, help="server heartbeat interval")
+    sse_parser.add_argument("--keep", action="store_true", help="reuse data seeded by a previous run")
+    sse_parser.add_argument("--out", help="also write the results as JSON")
+
+    reminders_parser = commands.add_parser("reminders", help="time daily reminder generation over seeded people, against Neo4j")
+    reminders_parser.add_argument("--users", type=int, default=reminders.USERS, help="seeded users")
+    reminders_parser.add_argument("--people", type=int, default=reminders.PEOPLE, help="people seeded per user")
+    reminders_parser.add_argument("--keep", action="store_true", help="reuse data seeded by a previous run")
+    reminders_parser.add_argument("--out", help="also write the results as JSON")
+
+    metrics_parser = commands.add_parser("metrics", help="microbenchmark the request and query instrumentation, no server needed")
+    metrics_parser.add_argument("--runs", type=int, default=metrics.RUNS, help="runs per variant; the median is reported")
+    metrics_parser.add_argument("--requests", type=int, default=metrics.REQUESTS, help="calls per run")
+    metrics_parser.add_argument("--rows", type=int, default=metrics.ROWS, help="records per query")
+    metrics_parser.add_argument("--out", help="also write the results as JSON")
+
+    tenants_parser = commands.add_parser("tenants", help="one user's latency while other tenants grow, against Neo4j")
+    tenants_parser.add_argument("--own", type=int, default=tenants.OWN, help="people of the measured user")
+    tenants_parser.add_argument("--people", type=int, default=tenants.PEOPLE, help="people per other tenant")
+    tenants_parser.add_argument("--tenants", type=int, nargs="+", default=list(tenants.TENANTS),
+                                help="other tenant counts to measure at, grown in order")
+    tenants_parser.add_argument("--requests", type=int, default=tenants.REQUESTS, help="requests per endpoint and step")
+    tenants_parser.add_argument("--out", help="also write the results as JSON")
+
+    serve_parser = commands.add_parser("serve", help=argparse.SUPPRESS)
+    serve_parser.add_argument("--port", type=int, required=True)
+    serve_parser.add_argument("--record")
+    serve_parser.add_argument("--replay")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    if args.command == "serve":
+        serve_app(args.port, replay=args.replay, record=args.record)
+        return 0
+    if args.command == "run" and args.workers and (args.replay or args.record):
+        parser.error("--workers needs a database; --record and --replay run a single process")
+    if args.command in SCENARIOS:
+        scenario, print_scenario = SCENARIOS[args.command]
+        results = scenario(args)
+        print_scenario(results)
+        if args.out:
+            write_json(results, args.out)
+        return 0
+    if args.command == "compare":
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(base, current, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+
+    results = asyncio.run(run(args))
+    write_json(results, args.out)
+    total = results["total"]
+    print(f"{total['requests']} requests, {total['errors']} errors, {total['throughput_rps']} req/s -> {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
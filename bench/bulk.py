@@ -0,0 +1,119 @@
+"""Bulk import and export of one user's network through the running app, against Neo4j
+
+Imports `rows` people from a streamed NDJSON body, then as many again from a
+CSV body. About one row in a hundred repeats an earlier phone number and one
+in a hundred has no name. The client generates each body as it uploads, so
+neither side holds a whole file. It then exports the network in both formats
+and reads the responses as streams. The server's current and peak RSS after
+each step show whether memory stays flat as the row count grows.
+"""
+from typing import AsyncIterator, Dict, Iterator
+import csv
+import io
+import itertools
+import json
+import random
+import time
+import httpx
+from .runner import login, prepare_database, process_memory, running_app
+
+ROWS = 100000
+# Rows per chunk of the uploaded body
+CHUNK_ROWS = 500
+DUPLICATE_RATE = 0.01
+INVALID_RATE = 0.01
+CSV_FIELDS = ["name", "gender", "birthday", "phone", "email", "city", "resources", "needs"]
+
+def _rows(count: int, seed: int, phone_base: int) -> Iterator[Dict]:
+    rng = random.Random(seed)
+    for i in range(count):
+        phone = phone_base + i
+        if i and rng.random() < DUPLICATE_RATE:
+            phone = phone_base + rng.randrange(i)
+        yield {
+            "name": None if rng.random() < INVALID_RATE else f"Imported {seed}-{i}",
+            "gender": rng.choice(["male", "female", None]),
+            "birthday": f"{rng.randint(1960, 2005)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "phone": f"1{phone:010d}",
+            "email": f"import-{seed}-{i}@example.com",
+            "city": rng.choice(["北京", "上海", "Singapore", None]),
+            "resources": rng.choice(["投资", "design", "hiring", None]),
+            "needs": rng.choice(["法律咨询", "mentoring", None]),
+        }
+
+async def _ndjson_body(rows: Iterator[Dict]) -> AsyncIterator[bytes]:
+    while chunk := list(itertools.islice(rows, CHUNK_ROWS)):
+        yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in chunk).encode()
+
+async def _csv_body(rows: Iterator[Dict]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    while chunk := list(itertools.islice(rows, CHUNK_ROWS)):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+async def _import(client: httpx.AsyncClient, body, content_type: str, pid: int) -> Dict:
+    started = time.perf_counter()
+    response = await client.post("/api/private/people/bulk", content=body, headers={"Content-Type": content_type})
+    elapsed = time.perf_counter() - started
+    response.raise_for_status()
+    report = response.json()
+    rows = report["created"] + report["duplicates"] + report["error_count"]
+    return {
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(rows / elapsed),
+        "created": report["created"],
+        "duplicates": report["duplicates"],
+        "error_count": report["error_count"],
+        **process_memory(pid),
+    }
+
+async def _export(client: httpx.AsyncClient, format: str, pid: int) -> Dict:
+    started = time.perf_counter()
+    first_byte = None
+    size = lines = 0
+    async with client.stream("GET", "/api/private/people/export", params={"format": format}) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            size += len(chunk)
+            lines += chunk.count(b"\n")
+    elapsed = time.perf_counter() - started
+    # The CSV header is a line too; embedded newlines in values would skew this, the generated rows have none
+    rows = lines - 1 if format == "csv" else lines
+    return {
+        "seconds": round(elapsed, 2),
+        "first_byte_ms": round((first_byte or elapsed) * 1000, 1),
+        "rows": rows,
+        "bytes": size,
+        **process_memory(pid),
+    }
+
+async def run(rows: int = ROWS) -> Dict[str, Dict]:
+    await prepare_database(1, 0, 0, False)
+    results = {}
+    async with running_app() as (base_url, process):
+        async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+            await login(client, 0)
+            results["idle"] = process_memory(process.pid)
+            results["import ndjson"] = await _import(
+                client, _ndjson_body(_rows(rows, 1, 3000000000)), "application/x-ndjson", process.pid)
+            results["import csv"] = await _import(
+                client, _csv_body(_rows(rows, 2, 5000000000)), "text/csv", process.pid)
+            results["export ndjson"] = await _export(client, "ndjson", process.pid)
+            results["export csv"] = await _export(client, "csv", process.pid)
+    return results
+
+def print_results(results: Dict[str, Dict]):
+    print(f"{'step':<15}{'seconds':>9}{'rows/s':>9}{'rows':>9}{'dupes':>7}{'errors':>8}{'MB out':>8}"
+          f"{'RSS MiB':>9}{'peak MiB':>10}")
+    for step, r in results.items():
+        rows = r.get("rows", r.get("created", ""))
+        size = round(r["bytes"] / 2**20, 1) if "bytes" in r else ""
+        print(f"{step:<15}{r.get('seconds', ''):>9}{r.get('rows_per_second', ''):>9}{rows:>9}"
+              f"{r.get('duplicates', ''):>7}{r.get('error_count', ''):>8}{size:>8}"
+              f"{round(r['rss_kib'] / 1024):>9}{round(r['peak_rss_kib'] / 1024):>10}")
@@ -0,0 +1,113 @@
+"""Concurrent-request throughput before and after the async driver, against Neo4j
+
+A request is what the network tab asks for: the /user/me query and the first
+people page. `concurrency` coroutines on one event loop issue requests back to
+back for a fixed time in two modes:
+- sync: a GraphDatabase session inside the coroutine, as the async def
+  handlers used to. Every call blocks the loop.
+- async: the shared AsyncDriver via backend.metrics.fetch, as the handlers
+  do now.
+
+A second pass of each mode keeps one slow query running in the background,
+the case where a single heavy request used to stall the whole worker.
+"""
+from neo4j import GraphDatabase
+from typing import Dict, List
+import asyncio
+import random
+import time
+from .runner import percentile, prepare_database
+from .seed import bench_open_id
+
+CONCURRENCY = (1, 10, 50)
+DURATION = 10.0
+# Rows counted by the background query; a few hundred ms to seconds of server time
+SLOW_QUERY = "UNWIND range(1, $n) AS x WITH x WHERE x % 7 = 0 RETURN count(*) AS n"
+SLOW_QUERY_ROWS = 5000000
+
+def _queries():
+    from backend.people import PERSON_FIELDS, list_query
+    from backend.user import GET_USER_QUERY
+    people = list_query(["p.created_at IS NOT NULL", "p.deleted = false"], PERSON_FIELDS)
+    return GET_USER_QUERY, people
+
+async def _drive(request, users: int, concurrency: int, duration: float, slow) -> Dict:
+    timings: List[float] = []
+    stop = time.perf_counter() + duration
+    rng = random.Random(concurrency)
+
+    async def client():
+        while time.perf_counter() < stop:
+            open_id = bench_open_id(rng.randrange(users))
+            started = time.perf_counter()
+            await request(open_id)
+            timings.append(time.perf_counter() - started)
+
+    async def background():
+        while time.perf_counter() < stop:
+            await slow()
+
+    started = time.perf_counter()
+    tasks = [client() for _ in range(concurrency)]
+    if slow is not None:
+        tasks.append(background())
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        "requests": len(timings),
+        "throughput_rps": round(len(timings) / elapsed, 1),
+        "p50_ms": round(percentile(timings, 50) * 1000, 2),
+        "p99_ms": round(percentile(timings, 99) * 1000, 2),
+    }
+
+async def _run(users: int, concurrency_levels, duration: float) -> List[Dict]:
+    from backend import db
+    from backend.metrics import fetch, fetch_one
+    user_query, people_query = _queries()
+
+    sync_driver = GraphDatabase.driver(db.NEO4J_URI, auth=(db.NEO4J_USERNAME, db.NEO4J_PASSWORD),
+                                       max_connection_pool_size=db.NEO4J_MAX_POOL_SIZE)
+
+    async def sync_request(open_id):
+        with sync_driver.session() as session:
+            session.run(user_query, open_id=open_id).data()
+            session.run(people_query, open_id=open_id, limit=11).data()
+
+    async def sync_slow():
+        with sync_driver.session() as session:
+            session.run(SLOW_QUERY, n=SLOW_QUERY_ROWS).consume()
+
+    async def async_request(open_id):
+        async with db.get_driver().session() as session:
+            await fetch_one(session, "user.get", user_query, open_id=open_id)
+            await fetch(session, "people.list", people_query, open_id=open_id, limit=11)
+
+    async def async_slow():
+        async with db.get_driver().session() as session:
+            await fetch_one(session, "bench.slow", SLOW_QUERY, n=SLOW_QUERY_ROWS)
+
+    modes = {"sync": (sync_request, sync_slow), "async": (async_request, async_slow)}
+    results = []
+    await db.init_driver()
+    try:
+        for concurrency in concurrency_levels:
+            for with_slow in (False, True):
+                for mode, (request, slow) in modes.items():
+                    result = await _drive(request, users, concurrency, duration, slow if with_slow else None)
+                    results.append({"mode": mode, "concurrency": concurrency, "slow_query": with_slow, **result})
+    finally:
+        await db.close_driver()
+        sync_driver.close()
+    return results
+
+async def run(users: int = 20, people: int = 200, concurrency=CONCURRENCY, duration: float = DURATION,
+              keep: bool = False) -> List[Dict]:
+    await prepare_database(users, people, 10, keep)
+    return await _run(users, concurrency, duration)
+
+def print_results(results: List[Dict]):
+    print(f"{'mode':<7}{'clients':>8}{'slow query':>12}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for r in results:
+        print(f"{r['mode']:<7}{r['concurrency']:>8}{'yes' if r['slow_query'] else 'no':>12}"
+              f"{r['throughput_rps']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}")
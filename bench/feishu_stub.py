@@ -0,0 +1,63 @@
+from fastapi import FastAPI, Header, Request
+from fastapi.responses import JSONResponse
+from typing import Optional
+import asyncio
+
+TOKEN_EXPIRE = 7200
+
+def create_feishu_stub(latency: float = 0.0) -> FastAPI:
+    """Feishu open API endpoints used by backend.feishu; the login code is the user's open_id
+
+    app.state.faults maps an endpoint name to failures answered before it
+    succeeds again, one per call: HTTP statuses (below 600) are returned as
+    such, anything else as a Feishu error code with status 200.
+    """
+    app = FastAPI()
+    app.state.calls = {}
+    app.state.faults = {}
+
+    async def answer(name: str, body: dict):
+        app.state.calls[name] = app.state.calls.get(name, 0) + 1
+        if latency:
+            await asyncio.sleep(latency)
+        faults = app.state.faults.get(name)
+        if faults:
+            fault = faults.pop(0)
+            if fault < 600:
+                return JSONResponse({"code": -1, "msg": "stub fault"}, status_code=fault)
+            return {"code": fault, "msg": "stub fault"}
+        return {"code": 0, "msg": "ok", **body}
+
+    def user_info(open_id: str) -> dict:
+        return {
+            "open_id": open_id,
+            "union_id": f"on_{open_id}",
+            "name": f"Bench {open_id}",
+            "en_name": f"Bench {open_id}",
+            "avatar_url": "https://example.invalid/avatar.png",
+            "tenant_key": "bench",
+        }
+
+    @app.post("/open-apis/auth/v3/app_access_token/internal")
+    async def app_access_token():
+        return await answer("app_access_token", {"app_access_token": "bench-app-token", "expire": TOKEN_EXPIRE})
+
+    @app.post("/open-apis/auth/v3/tenant_access_token/internal")
+    async def tenant_access_token():
+        return await answer("tenant_access_token", {"tenant_access_token": "bench-tenant-token", "expire": TOKEN_EXPIRE})
+
+    @app.post("/open-apis/jssdk/ticket/get")
+    async def jsapi_ticket():
+        return await answer("jsapi_ticket", {"data": {"ticket": "bench-ticket", "expire_in": TOKEN_EXPIRE}})
+
+    @app.post("/open-apis/authen/v1/access_token")
+    async def user_access_token(request: Request):
+        code = (await request.json()).get("code", "")
+        return await answer("access_token", {"data": {"access_token": f"u-{code}", **user_info(code)}})
+
+    @app.get("/open-apis/authen/v1/user_info")
+    async def get_user_info(authorization: Optional[str] = Header(None)):
+        open_id = (authorization or "").removeprefix("Bearer u-")
+        return await answer("user_info", {"data": user_info(open_id)})
+
+    return app
@@ -0,0 +1,156 @@
+"""Path and neighborhood latency over a power-law network through the running app, against Neo4j
+
+Seeds one user with `people` contacts and about `people * degree` KNOWS edges
+(1M by default) by preferential attachment. Each new person links to `degree`
+earlier people, mostly picked in proportion to the links they already have.
+At the defaults the best connected people have over a thousand edges and
+the median person about fifteen, so both endpoints cross hubs, as in a real
+network. Concurrent clients then request
+/network/path between random pairs and /people/{id}/neighborhood of random
+people. For each endpoint the bench reports p50/p99 and how many requests
+timed out.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Tuple
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+import httpx
+from .runner import login, percentile, prepare_database, running_app
+from .seed import bench_open_id
+
+log = logging.getLogger(__name__)
+
+PEOPLE = 100000
+DEGREE = 10
+CONCURRENCY = 8
+REQUESTS = 1000
+# Edges per UNWIND statement while seeding
+EDGE_BATCH_SIZE = 10000
+# Share of links that go to a uniformly random earlier person instead of by degree
+UNIFORM_LINKS = 0.1
+# Sampled people the requests pick from
+SAMPLE = 2000
+
+def _edges(people: int, degree: int, seed: int) -> Iterator[Tuple[int, int]]:
+    """(from, to) change_seq pairs; every person after the first links to min(degree, earlier people) others"""
+    rng = random.Random(seed)
+    # One entry per edge end, so a draw picks a person in proportion to their degree
+    ends: List[int] = []
+    for person in range(2, people + 1):
+        targets = set()
+        while len(targets) < min(degree, person - 1):
+            if ends and rng.random() >= UNIFORM_LINKS:
+                targets.add(rng.choice(ends))
+            else:
+                targets.add(rng.randrange(1, person))
+        for target in targets:
+            ends += (person, target)
+            yield person, target
+
+async def seed_graph(people: int, degree: int, seed: int = 0) -> int:
+    from backend.db import init_driver, close_driver
+    open_id = bench_open_id(0)
+    now = datetime.now(timezone.utc).isoformat()
+    rng = random.Random(seed)
+    edges = _edges(people, degree, seed)
+    total = 0
+    driver = await init_driver()
+    try:
+        async with driver.session() as session:
+            while True:
+                batch = [{"a": a, "b": b, "strength": rng.randint(1, 5)}
+                         for a, b in itertools.islice(edges, EDGE_BATCH_SIZE)]
+                if not batch:
+                    break
+                result = await session.run(
+                    """
+                    UNWIND $rows AS row
+                    MATCH (a:Person {owner: $open_id, change_seq: row.a})
+                    MATCH (b:Person {owner: $open_id, change_seq: row.b})
+                    CREATE (a)-[:KNOWS {owner: $open_id, strength: row.strength, created_at: $now, updated_at: $now}]->(b)
+                    """,
+                    rows=batch, open_id=open_id, now=now)
+                await result.consume()
+                total += len(batch)
+    finally:
+        await close_driver()
+    log.info(f"Seeded {total} KNOWS edges among {people} people")
+    return total
+
+async def _sample(people: int, count: int, seed: int) -> List[str]:
+    from backend.db import init_driver, close_driver
+    seqs = random.Random(seed).sample(range(1, people + 1), min(count, people))
+    driver = await init_driver()
+    try:
+        async with driver.session() as session:
+            result = await session.run(
+                "MATCH (p:Person {owner: $open_id}) WHERE p.change_seq IN $seqs RETURN elementId(p) AS id",
+                open_id=bench_open_id(0), seqs=seqs)
+            return [record["id"] async for record in result]
+    finally:
+        await close_driver()
+
+async def _client(base_url: str, ids: List[str], requests: int, timings, outcomes, seed: int):
+    rng = random.Random(seed)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        await login(client, 0)
+        for i in range(requests):
+            if i % 2:
+                a, b = rng.sample(ids, 2)
+                started = time.perf_counter()
+                response = await client.get("/api/private/network/path", params={"from": a, "to": b})
+                timings["path"].append(time.perf_counter() - started)
+                outcomes["path"][response.status_code] += 1
+                continue
+            started = time.perf_counter()
+            reached, outcome = 0, 200
+            async with client.stream("GET", f"/api/private/people/{rng.choice(ids)}/neighborhood") as response:
+                outcome = response.status_code
+                async for line in response.aiter_lines():
+                    if line:
+                        reached += 1
+                        # Failures after the headers arrive as a final error line
+                        if "error" in json.loads(line):
+                            outcome = "error"
+            timings["neighborhood"].append(time.perf_counter() - started)
+            outcomes["neighborhood"][outcome] += 1
+            outcomes["neighborhood reached"][reached] += 1
+
+async def run(people: int = PEOPLE, degree: int = DEGREE, concurrency: int = CONCURRENCY,
+              requests: int = REQUESTS, keep: bool = False) -> List[Dict]:
+    await prepare_database(1, people, 0, keep, edges=0)
+    if not keep:
+        await seed_graph(people, degree)
+    ids = await _sample(people, SAMPLE, 1)
+    timings: Dict[str, List[float]] = defaultdict(list)
+    outcomes: Dict[str, Counter] = defaultdict(Counter)
+    async with running_app() as (base_url, _):
+        await asyncio.gather(*[
+            _client(base_url, ids, requests // concurrency, timings, outcomes, i) for i in range(concurrency)
+        ])
+    reached = outcomes.pop("neighborhood reached")
+    results = []
+    for endpoint, values in sorted(timings.items()):
+        values.sort()
+        result = {
+            "endpoint": endpoint,
+            "requests": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+            "outcomes": {str(k): n for k, n in outcomes[endpoint].most_common()},
+        }
+        if endpoint == "neighborhood":
+            result["people_per_response"] = round(sum(k * n for k, n in reached.items()) / len(values), 1)
+        results.append(result)
+    return results
+
+def print_results(results: List[Dict]):
+    print(f"{'endpoint':<14}{'requests':>10}{'p50 ms':>9}{'p99 ms':>9}  outcomes")
+    for r in results:
+        outcomes = ", ".join(f"{k}: {n}" for k, n in r["outcomes"].items())
+        print(f"{r['endpoint']:<14}{r['requests']:>10}{r['p50_ms']:>9}{r['p99_ms']:>9}  {outcomes}")
@@ -0,0 +1,91 @@
+"""Top-k matching over one large network, in process, no server or database
+
+Builds a MatchIndex over `people` synthetic (id, resources, needs) rows, the
+way a full rebuild does in its worker process. It then times top_k for random
+people in both directions and single upserts, as made on every person write.
+Terms follow a Zipf distribution over a vocabulary of `vocabulary` words
+besides the seeded topics. A few terms are in most documents, so the
+document-frequency and postings bounds are exercised.
+"""
+from typing import Dict, List, Optional, Tuple
+import random
+import time
+import numpy as np
+from backend.matching import build_index
+from .runner import percentile
+from .seed import TOPICS
+
+PEOPLE = 500000
+VOCABULARY = 20000
+QUERIES = 2000
+K = 10
+# Upper bound for one top_k call at PEOPLE documents
+TARGET_MS = 50
+
+def _rows(people: int, vocabulary: int, seed: int) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    rng = np.random.default_rng(seed)
+    words = np.array(TOPICS + [f"skill{i}" for i in range(vocabulary)], dtype=object)
+    ranks = np.arange(1, len(words) + 1)
+    p = 1.0 / ranks ** 1.1
+    p /= p.sum()
+
+    def texts(count_mean: float) -> List[Optional[str]]:
+        counts = rng.poisson(count_mean, people)
+        picks = rng.choice(words, size=int(counts.sum()), p=p).tolist()
+        out, start = [], 0
+        for n in counts.tolist():
+            out.append(" ".join(picks[start:start + n]) or None)
+            start += n
+        return out
+
+    return list(zip((f"p{i}" for i in range(people)), texts(3), texts(3)))
+
+def run(people: int = PEOPLE, vocabulary: int = VOCABULARY, queries: int = QUERIES, k: int = K) -> List[Dict]:
+    rows = _rows(people, vocabulary, 0)
+    started = time.perf_counter()
+    index = build_index(rows)
+    results = [{"case": "build_index", "count": 1, "p50_ms": round((time.perf_counter() - started) * 1000, 1)}]
+
+    rng = random.Random(0)
+    ids = [row[0] for row in rows]
+    for direction in ("helpers", "helped"):
+        timings, found = [], 0
+        for _ in range(queries):
+            person_id = rng.choice(ids)
+            started = time.perf_counter()
+            matches = index.top_k(person_id, k=k, direction=direction)
+            timings.append(time.perf_counter() - started)
+            found += len(matches)
+        timings.sort()
+        results.append({
+            "case": f"top_k {direction}",
+            "count": queries,
+            "matches_per_query": round(found / queries, 1),
+            "p50_ms": round(percentile(timings, 50) * 1000, 2),
+            "p99_ms": round(percentile(timings, 99) * 1000, 2),
+            "max_ms": round(timings[-1] * 1000, 2),
+        })
+
+    timings = []
+    for i in range(queries):
+        _, resources, needs = rows[rng.randrange(len(rows))]
+        started = time.perf_counter()
+        index.upsert(ids[rng.randrange(len(ids))], resources, needs)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    results.append({
+        "case": "upsert",
+        "count": queries,
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "max_ms": round(timings[-1] * 1000, 3),
+    })
+    return results
+
+def print_results(results: List[Dict]):
+    print(f"{'case':<16}{'count':>7}{'matches':>9}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for r in results:
+        print(f"{r['case']:<16}{r['count']:>7}{r.get('matches_per_query', ''):>9}{r['p50_ms']:>10}"
+              f"{r.get('p99_ms', ''):>10}{r.get('max_ms', ''):>10}")
+    slowest = max((r["p99_ms"] for r in results if r["case"].startswith("top_k")), default=0)
+    print(f"top_k p99 {slowest} ms, target {TARGET_MS} ms: {'ok' if slowest <= TARGET_MS else 'over'}")
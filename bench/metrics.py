@@ -0,0 +1,94 @@
+"""Microbenchmark of the instrumentation cost per request and per query, no server or database
+
+- middleware: a trivial route called in process through httpx's ASGI
+  transport, on an app with and without MetricsMiddleware. Each run times
+  `requests` calls; the table shows the median of `runs` runs.
+- fetch: a query against an in-memory session returning `rows` records, read
+  directly and through backend.metrics.fetch with profiling sampling off.
+"""
+from typing import Dict, List
+import asyncio
+import statistics
+import time
+import httpx
+from fastapi import FastAPI
+from backend import metrics
+from backend.metrics import MetricsMiddleware, fetch
+from .replay import Result, _Session
+
+RUNS = 7
+REQUESTS = 5000
+ROWS = 10
+
+def _app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/public/hello")
+    async def hello():
+        return {"message": "hello"}
+
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+async def _time_requests(app: FastAPI, requests: int) -> float:
+    """Seconds per request"""
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        await client.get("/api/public/hello")
+        started = time.perf_counter()
+        for _ in range(requests):
+            await client.get("/api/public/hello")
+        return (time.perf_counter() - started) / requests
+
+async def _time_queries(instrumented: bool, rows: int, requests: int) -> float:
+    records = [{"id": f"4:bench:{i}", "name": f"Person {i}"} for i in range(rows)]
+
+    async def run(query, parameters=None, **kwargs):
+        return Result(records)
+
+    session = _Session(run)
+    started = time.perf_counter()
+    for _ in range(requests):
+        if instrumented:
+            await fetch(session, "bench.query", "RETURN 1", open_id="bench")
+        else:
+            result = await session.run("RETURN 1", None, open_id="bench")
+            [dict(record) async for record in result]
+            await result.consume()
+    return (time.perf_counter() - started) / requests
+
+async def _run(runs: int, requests: int, rows: int) -> List[Dict]:
+    cases = {
+        "middleware": lambda instrumented: _time_requests(_app(instrumented), requests),
+        "fetch": lambda instrumented: _time_queries(instrumented, rows, requests),
+    }
+    results = []
+    for case, measure in cases.items():
+        # Alternate the two variants so drift in machine load hits both alike
+        timings = {False: [], True: []}
+        for _ in range(runs):
+            for instrumented in (False, True):
+                timings[instrumented].append(await measure(instrumented))
+        plain, instrumented = statistics.median(timings[False]), statistics.median(timings[True])
+        results.append({
+            "case": case,
+            "plain_us": round(plain * 1e6, 1),
+            "instrumented_us": round(instrumented * 1e6, 1),
+            "overhead_us": round((instrumented - plain) * 1e6, 1),
+            "overhead_pct": round((instrumented / plain - 1) * 100, 1),
+        })
+    return results
+
+def run(runs: int = RUNS, requests: int = REQUESTS, rows: int = ROWS) -> List[Dict]:
+    sample_rate = metrics.QUERY_PROFILE_SAMPLE_RATE
+    # A sampled PROFILE changes the query, not what fetch itself costs
+    metrics.QUERY_PROFILE_SAMPLE_RATE = 0
+    try:
+        return asyncio.run(_run(runs, requests, rows))
+    finally:
+        metrics.QUERY_PROFILE_SAMPLE_RATE = sample_rate
+
+def print_results(results: List[Dict]):
+    print(f"{'case':<12}{'plain us':>10}{'metrics us':>12}{'overhead us':>13}{'overhead %':>12}")
+    for r in results:
+        print(f"{r['case']:<12}{r['plain_us']:>10}{r['instrumented_us']:>12}{r['overhead_us']:>13}{r['overhead_pct']:>12}")
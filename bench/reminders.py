@@ -0,0 +1,55 @@
+"""Daily reminder generation over seeded people, in process, against Neo4j
+
+Seeds `users` users with `people` contacts each (1M people by default). Each
+has a birthday, and 2% of them a follow-up date within a month of today
+(FOLLOW_UP_RATE and FOLLOW_UP_SPREAD_DAYS in bench.seed). The bench then
+times generate_reminders, bypassing the scheduler lease:
+- first run: today's and the lookahead's birthdays plus due follow-ups
+- rerun: the same day again, every reminder already delivered
+- catch-up: the days since REMINDER_CATCH_UP_DAYS ago, as after an outage
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List
+import time
+from .runner import prepare_database
+
+USERS = 10
+PEOPLE = 100000
+# generate_reminders over 1M people should finish well within this
+TARGET_SECONDS = 60
+
+async def run(users: int = USERS, people: int = PEOPLE, keep: bool = False) -> List[Dict]:
+    from backend.db import init_driver, close_driver
+    from backend.reminders import REMINDER_CATCH_UP_DAYS, REMINDER_TIMEZONE, generate_reminders
+
+    await prepare_database(users, people, 0, keep, edges=0)
+    today = datetime.now(REMINDER_TIMEZONE).date()
+    cases = [
+        ("first run", today),
+        ("rerun", today),
+        ("catch-up", today - timedelta(days=REMINDER_CATCH_UP_DAYS)),
+    ]
+    results = []
+    await init_driver()
+    try:
+        for case, first in cases:
+            started = time.perf_counter()
+            created = await generate_reminders(first, today)
+            elapsed = time.perf_counter() - started
+            results.append({
+                "case": case,
+                "people": users * people,
+                "days": (today - first).days + 1,
+                "created": created,
+                "seconds": round(elapsed, 2),
+            })
+    finally:
+        await close_driver()
+    return results
+
+def print_results(results: List[Dict]):
+    print(f"{'case':<12}{'people':>10}{'days':>6}{'created':>9}{'seconds':>9}")
+    for r in results:
+        print(f"{r['case']:<12}{r['people']:>10}{r['days']:>6}{r['created']:>9}{r['seconds']:>9}")
+    slowest = max((r["seconds"] for r in results), default=0)
+    print(f"slowest run {slowest} s, target {TARGET_SECONDS} s: {'ok' if slowest <= TARGET_SECONDS else 'over'}")
@@ -0,0 +1,147 @@
+from collections import defaultdict
+from typing import Dict, List
+import itertools
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+# Results kept per query text; replay cycles through them
+SAMPLES_PER_QUERY = 20
+
+def query_key(query) -> str:
+    text = getattr(query, "text", query)
+    text = " ".join(text.split())
+    return text[len("PROFILE "):] if text.startswith("PROFILE ") else text
+
+class Summary:
+    result_available_after = 0
+    result_consumed_after = 0
+    profile = None
+    plan = None
+
+class Result:
+    """Materialized result with the parts of AsyncResult the backend uses"""
+
+    def __init__(self, records: List[dict], summary=None):
+        self._records = records
+        self._summary = summary or Summary()
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for record in self._records:
+            yield record
+
+    async def single(self):
+        return self._records[0] if self._records else None
+
+    async def consume(self):
+        return self._summary
+
+class _Session:
+    def __init__(self, run):
+        self._run = run
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def run(self, query, parameters=None, /, **kwargs):
+        return await self._run(query, parameters, **kwargs)
+
+    async def execute_write(self, work, *args, **kwargs):
+        return await work(self, *args, **kwargs)
+
+    execute_read = execute_write
+
+class ReplayDriver:
+    """Stand-in for AsyncDriver answering every query from a cassette"""
+
+    def __init__(self, path: str):
+        with open(path) as f:
+            cassette = json.load(f)
+        self._results = {key: itertools.cycle(samples) for key, samples in cassette.items() if samples}
+        self.misses = defaultdict(int)
+
+    async def _run(self, query, parameters=None, /, **kwargs):
+        key = query_key(query)
+        samples = self._results.get(key)
+        if samples is None:
+            self.misses[key] += 1
+            return Result([])
+        return Result(next(samples))
+
+    def session(self, **config):
+        return _Session(self._run)
+
+    async def verify_connectivity(self):
+        pass
+
+    async def close(self):
+        if self.misses:
+            log.warning(f"{sum(self.misses.values())} queries had no recorded result, "
+                        f"{len(self.misses)} distinct; first: {next(iter(self.misses))[:200]}")
+
+class RecordingDriver:
+    """Wraps a real driver, created lazily inside the server's event loop, and records results"""
+
+    def __init__(self, create_driver, path: str):
+        self._create_driver = create_driver
+        self._driver = None
+        self._path = path
+        self._cassette: Dict[str, List[List[dict]]] = defaultdict(list)
+
+    def _real(self):
+        if self._driver is None:
+            self._driver = self._create_driver()
+        return self._driver
+
+    def _record(self, query, records: List[dict]):
+        samples = self._cassette[query_key(query)]
+        if len(samples) < SAMPLES_PER_QUERY:
+            samples.append(records)
+
+    def session(self, **config):
+        driver = self
+
+        class RecordingSession:
+            async def __aenter__(self):
+                self._session = driver._real().session(**config)
+                await self._session.__aenter__()
+                return self
+
+            async def __aexit__(self, *exc):
+                return await self._session.__aexit__(*exc)
+
+            async def run(self, query, parameters=None, /, **kwargs):
+                return await driver._run(self._session, query, parameters, **kwargs)
+
+            async def execute_write(self, work, *args, **kwargs):
+                async def recorded(tx):
+                    return await work(_Session(lambda q, p=None, /, **kw: driver._run(tx, q, p, **kw)), *args, **kwargs)
+                return await self._session.execute_write(recorded)
+
+            execute_read = execute_write
+
+        return RecordingSession()
+
+    async def _run(self, runner, query, parameters=None, /, **kwargs):
+        result = await runner.run(query, parameters, **kwargs)
+        records = [dict(record) async for record in result]
+        summary = await result.consume()
+        self._record(query, records)
+        return Result(records, summary)
+
+    async def verify_connectivity(self):
+        await self._real().verify_connectivity()
+
+    async def close(self):
+        with open(self._path, "w") as f:
+            json.dump(self._cassette, f, ensure_ascii=False, default=str)
+        log.info(f"Recorded {len(self._cassette)} queries to {self._path}")
+        if self._driver is not None:
+            await self._driver.close()
@@ -0,0 +1,346 @@
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import logging
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import httpx
+import uvicorn
+from .feishu_stub import create_feishu_stub
+from .seed import bench_open_id
+
+log = logging.getLogger(__name__)
+
+# Relative weight of each scenario in the mix a virtual user draws from
+SCENARIO_WEIGHTS = {
+    "network_tab": 4,
+    "profile_view": 4,
+    "inbox": 2,
+    "search": 2,
+    "login": 0.2,
+}
+SEARCH_TERMS = ["王", "李", "上海", "投资", "design", "hiring", "Chen", "AI"]
+# Mean pause between scenarios of one virtual user, in seconds
+THINK_TIME = 0.05
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_feishu_stub(port: int, latency: float = 0.0):
+    """Serve the Feishu stub from a daemon thread; returns the app to read call counts"""
+    app = create_feishu_stub(latency)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    return app
+
+def serve_app(port: int, replay: Optional[str] = None, record: Optional[str] = None):
+    """Entry point of the server process (python -m bench serve)"""
+    from backend import db
+    from .replay import RecordingDriver, ReplayDriver
+
+    if replay:
+        # Installed before startup, so init_driver() keeps it and never opens a connection
+        db.driver = ReplayDriver(replay)
+    elif record:
+        db.driver = RecordingDriver(
+            lambda: db.AsyncGraphDatabase.driver(db.NEO4J_URI, auth=(db.NEO4J_USERNAME, db.NEO4J_PASSWORD)),
+            record,
+        )
+    from backend.main import app
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+def start_app(port: int, feishu_url: str, replay: Optional[str], record: Optional[str],
+              workers: Optional[int] = None, env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    """Start the app in its own process: bench serve (single process, like dev mode) or backend.serve"""
+    env = {**os.environ, **(env or {})}
+    env.update({
+        "FEISHU_HOST": feishu_url,
+        "FEISHU_APP_ID": "bench-app",
+        "FEISHU_APP_SECRET": "bench-secret",
+        "SESSION_DB_PATH": os.path.join(tempfile.mkdtemp(prefix="bench-"), "sessions.db"),
+    })
+    if workers:
+        return subprocess.Popen([sys.executable, "-m", "backend.serve", "--host", "127.0.0.1",
+                                 "--port", str(port), "--workers", str(workers)], env=env)
+    cmd = [sys.executable, "-m", "bench", "serve", "--port", str(port)]
+    if replay:
+        cmd += ["--replay", replay]
+    if record:
+        cmd += ["--record", record]
+    return subprocess.Popen(cmd, env=env)
+
+async def wait_until_ready(base_url: str, process: Optional[subprocess.Popen] = None, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"Server exited with status {process.returncode}")
+            try:
+                if (await client.get("/api/public/ready")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} not ready after {timeout:.0f}s")
+
+def stop_app(process: subprocess.Popen):
+    # SIGINT lets uvicorn run the lifespan shutdown, which writes a recorded cassette
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+@asynccontextmanager
+async def running_app(env: Optional[Dict[str, str]] = None) -> AsyncIterator[tuple]:
+    """Boot the Feishu stub and a single app process against Neo4j; yields (base_url, process)"""
+    feishu_port = free_port()
+    start_feishu_stub(feishu_port)
+    port = free_port()
+    process = start_app(port, f"http://127.0.0.1:{feishu_port}", None, None, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        await wait_until_ready(base_url, process)
+        yield base_url, process
+    finally:
+        stop_app(process)
+
+async def login(client: httpx.AsyncClient, i: int):
+    """Log the client in as seeded user i through the Feishu stub; the session cookie stays on the client"""
+    response = await client.get("/api/public/auth/callback", params={"code": bench_open_id(i)})
+    response.raise_for_status()
+
+def process_memory(pid: int) -> Dict[str, int]:
+    """Current (VmRSS) and peak (VmHWM) resident memory of a process in KiB, from /proc"""
+    memory = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                memory[key] = int(value.split()[0])
+    return {"rss_kib": memory.get("VmRSS", 0), "peak_rss_kib": memory.get("VmHWM", 0)}
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.recording = False
+
+    def add(self, route: str, elapsed: float, ok: bool):
+        if not self.recording:
+            return
+        self.latencies[route].append(elapsed)
+        if not ok:
+            self.errors[route] += 1
+
+class VirtualUser:
+    """One browser session: logs in, then repeatedly picks a scenario from the mix"""
+
+    def __init__(self, base_url: str, code: str, stats: Stats, rng: random.Random):
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=30)
+        self.code = code
+        self.stats = stats
+        self.rng = rng
+        self.person_ids: List[str] = []
+        self.etags: Dict[str, str] = {}
+
+    async def request(self, route: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.stats.add(route, time.perf_counter() - started, False)
+            log.debug(f"{route}: {e}")
+            return None
+        self.stats.add(route, time.perf_counter() - started, response.status_code < 400)
+        return response
+
+    async def login(self):
+        await self.request("GET /api/public/auth/callback", "GET", "/api/public/auth/callback",
+                           params={"code": self.code})
+
+    async def network_tab(self):
+        response = await self.request("GET /api/private/people/", "GET", "/api/private/people/",
+                                      params={"limit": 20})
+        if response is not None and response.status_code == 200:
+            ids = [item["id"] for item in response.json().get("items", []) if item.get("id")]
+            if ids:
+                self.person_ids = ids
+        await self.request("GET /api/private/network/stat", "GET", "/api/private/network/stat")
+
+    async def profile_view(self):
+        if not self.person_ids:
+            return await self.network_tab()
+        person_id = self.rng.choice(self.person_ids)
+        headers = {}
+        # Revisits carry the ETag the way a browser cache would
+        if person_id in self.etags and self.rng.random() < 0.5:
+            headers["If-None-Match"] = self.etags[person_id]
+        response = await self.request("GET /api/private/people/{person_id}", "GET",
+                                      f"/api/private/people/{person_id}", headers=headers)
+        if response is not None and response.headers.get("etag"):
+            self.etags[person_id] = response.headers["etag"]
+        await self.request("GET /api/private/people/{person_id}/relationships", "GET",
+                           f"/api/private/people/{person_id}/relationships")
+
+    async def inbox(self):
+        response = await self.request("GET /api/private/user/inbox", "GET", "/api/private/user/inbox",
+                                      params={"limit": 20})
+        if response is None or response.status_code != 200:
+            return
+        unread = [item["id"] for item in response.json().get("items", []) if not item.get("read")]
+        if unread and self.rng.random() < 0.3:
+            await self.request("POST /api/private/user/inbox/read", "POST", "/api/private/user/inbox/read",
+                               json={"ids": unread[:5]})
+
+    async def search(self):
+        await self.request("GET /api/private/people/search", "GET", "/api/private/people/search",
+                           params={"q": self.rng.choice(SEARCH_TERMS), "prefix": "true"})
+
+    async def run(self, stop: asyncio.Event):
+        scenarios = [getattr(self, name) for name in SCENARIO_WEIGHTS]
+        weights = list(SCENARIO_WEIGHTS.values())
+        try:
+            await self.login()
+            while not stop.is_set():
+                await self.rng.choices(scenarios, weights)[0]()
+                await asyncio.sleep(self.rng.expovariate(1 / THINK_TIME))
+        finally:
+            await self.client.aclose()
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(q / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+def summarize(stats: Stats, duration: float) -> dict:
+    routes = {}
+    for route, values in sorted(stats.latencies.items()):
+        values = sorted(values)
+        routes[route] = {
+            "count": len(values),
+            "errors": stats.errors.get(route, 0),
+            "throughput_rps": round(len(values) / duration, 2),
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p95_ms": round(percentile(values, 95) * 1000, 3),
+            "p99_ms": round(percentile(values, 99) * 1000, 3),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3),
+        }
+    total = sum(r["count"] for r in routes.values())
+    return {
+        "total": {
+            "requests": total,
+            "errors": sum(r["errors"] for r in routes.values()),
+            "throughput_rps": round(total / duration, 2),
+        },
+        "routes": routes,
+    }
+
+async def drive(base_url: str, codes: List[str], duration: float, warmup: float, seed: int = 0) -> dict:
+    stats = Stats()
+    stop = asyncio.Event()
+    rng = random.Random(seed)
+    users = [VirtualUser(base_url, code, stats, random.Random(rng.random())) for code in codes]
+    tasks = [asyncio.create_task(user.run(stop)) for user in users]
+    await asyncio.sleep(warmup)
+    stats.recording = True
+    started = time.monotonic()
+    await asyncio.sleep(duration)
+    stats.recording = False
+    elapsed = time.monotonic() - started
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return summarize(stats, elapsed)
+
+def git_revision() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True).stdout.strip())
+        return {"commit": commit or None, "dirty": dirty}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+async def prepare_database(users: int, people: int, messages: int, keep: bool, edges: int = 2):
+    """Apply the schema and seed synthetic data through the same driver settings as the app"""
+    from backend.db import init_driver, close_driver
+    from backend.schema import apply_schema
+    from .seed import clear, seed
+
+    driver = await init_driver()
+    try:
+        await apply_schema(driver)
+        if not keep:
+            await clear(driver)
+            await seed(driver, users, people, messages, edges)
+    finally:
+        await close_driver()
+
+async def run(args) -> dict:
+    meta = {
+        **git_revision(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "mode": "replay" if args.replay else "neo4j",
+        "users": args.users,
+        "people": args.people,
+        "messages": args.messages,
+        "duration": args.duration,
+        "warmup": args.warmup,
+        "login": args.login,
+        "workers": args.workers,
+        "feishu_latency": args.feishu_latency,
+    }
+    if not args.replay and not args.url:
+        await prepare_database(args.users, args.people, args.messages, args.keep)
+    process = None
+    base_url = args.url
+    if base_url is None:
+        feishu_port = free_port()
+        start_feishu_stub(feishu_port, args.feishu_latency)
+        port = free_port()
+        process = start_app(port, f"http://127.0.0.1:{feishu_port}", args.replay, args.record, args.workers)
+        base_url = f"http://127.0.0.1:{port}"
+    try:
+        await wait_until_ready(base_url, process)
+        codes = ["mock" if args.login == "mock" else bench_open_id(i) for i in range(args.users)]
+        result = await drive(base_url, codes, args.duration, args.warmup)
+    finally:
+        if process is not None:
+            stop_app(process)
+    return {"meta": meta, **result}
+
+def compare(base: dict, current: dict, threshold: float) -> List[str]:
+    """Print per-route deltas and return the regressions beyond threshold"""
+    regressions = []
+    print(f"{'route':<56} {'p95 ms':>18} {'rps':>18}")
+    for route, now in sorted(current["routes"].items()):
+        before = base["routes"].get(route)
+        if before is None:
+            print(f"{route:<56} {'new':>18}")
+            continue
+        p95 = f"{before['p95_ms']:.1f} -> {now['p95_ms']:.1f}"
+        rps = f"{before['throughput_rps']:.1f} -> {now['throughput_rps']:.1f}"
+        print(f"{route:<56} {p95:>18} {rps:>18}")
+        if before["p95_ms"] and now["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(f"{route}: p95 {before['p95_ms']:.1f} ms -> {now['p95_ms']:.1f} ms")
+        if before["throughput_rps"] and now["throughput_rps"] < before["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{route}: throughput {before['throughput_rps']:.1f} -> {now['throughput_rps']:.1f} rps")
+    before, now = base["total"]["throughput_rps"], current["total"]["throughput_rps"]
+    print(f"{'total':<56} {'':>18} {f'{before:.1f} -> {now:.1f}':>18}")
+    if before and now < before * (1 - threshold):
+        regressions.append(f"total throughput {before:.1f} -> {now:.1f} rps")
+    return regressions
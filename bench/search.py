@@ -0,0 +1,69 @@
+"""Typeahead latency over a large people index through the running app, against Neo4j
+
+Seeds `users` users with `people` contacts each (1M people by default, no
+KNOWS edges) and has `concurrency` clients, each logged in as a different
+user, send /people/search?prefix=true requests. The prefixes are one to three
+characters taken from the seeded vocabulary, so each one matches a large share
+of a user's people, the worst case for a typeahead. Latency is reported per
+prefix length.
+"""
+from collections import defaultdict
+from typing import Dict, List
+import asyncio
+import random
+import time
+import httpx
+from .runner import login, percentile, prepare_database, running_app
+from .seed import CITIES, GIVEN_NAMES, SURNAMES, TOPICS
+
+USERS = 10
+PEOPLE = 100000
+CONCURRENCY = 8
+REQUESTS = 2000
+
+def typeahead_prefixes() -> List[str]:
+    words = set(SURNAMES + GIVEN_NAMES + [c for c in CITIES if c] + [w for t in TOPICS for w in t.split()])
+    return sorted({word[:length] for word in words for length in (1, 2, 3) if len(word) >= length})
+
+async def _client(base_url: str, user: int, prefixes: List[str], requests: int, timings, counts, seed: int):
+    rng = random.Random(seed)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        await login(client, user)
+        for _ in range(requests):
+            prefix = rng.choice(prefixes)
+            started = time.perf_counter()
+            response = await client.get("/api/private/people/search", params={"q": prefix, "prefix": "true"})
+            elapsed = time.perf_counter() - started
+            response.raise_for_status()
+            timings[len(prefix)].append(elapsed)
+            counts[len(prefix)] += len(response.json()["items"])
+
+async def run(users: int = USERS, people: int = PEOPLE, concurrency: int = CONCURRENCY,
+              requests: int = REQUESTS, keep: bool = False) -> List[Dict]:
+    await prepare_database(users, people, 0, keep, edges=0)
+    prefixes = typeahead_prefixes()
+    timings: Dict[int, List[float]] = defaultdict(list)
+    counts: Dict[int, int] = defaultdict(int)
+    async with running_app() as (base_url, _):
+        await asyncio.gather(*[
+            _client(base_url, i % users, prefixes, requests // concurrency, timings, counts, i)
+            for i in range(concurrency)
+        ])
+    results = []
+    for length in sorted(timings) + [None]:
+        values = sorted(timings[length] if length else [t for v in timings.values() for t in v])
+        results.append({
+            "prefix_length": length or "all",
+            "requests": len(values),
+            "items_per_response": round((counts[length] if length else sum(counts.values())) / len(values), 1),
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+        })
+    return results
+
+def print_results(results: List[Dict]):
+    print(f"{'prefix':<8}{'requests':>10}{'items':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for r in results:
+        print(f"{r['prefix_length']:<8}{r['requests']:>10}{r['items_per_response']:>8}"
+              f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}")
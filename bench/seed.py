@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta, timezone
+from typing import List
+import logging
+import random
+
+log = logging.getLogger(__name__)
+
+# Rows per UNWIND statement while seeding
+SEED_BATCH_SIZE = 1000
+BENCH_USER_PREFIX = "bench-user-"
+# Share of people with a follow-up date, spread this many days around the seeding day
+FOLLOW_UP_RATE = 0.02
+FOLLOW_UP_SPREAD_DAYS = 30
+
+SURNAMES = ["王", "李", "张", "刘", "陈", "杨", "赵", "黄", "Smith", "Chen", "Garcia", "Müller"]
+GIVEN_NAMES = ["伟", "芳", "娜", "敏", "静", "强", "磊", "洋", "Alex", "Maria", "Wei", "Anna"]
+CITIES = ["北京", "上海", "深圳", "杭州", "成都", "Singapore", "London", "San Francisco", None]
+TOPICS = ["投资", "招聘", "设计", "法律咨询", "市场推广", "供应链", "AI", "fundraising",
+          "hiring", "design", "legal advice", "marketing", "supply chain", "mentoring"]
+
+def bench_open_id(i: int) -> str:
+    return f"{BENCH_USER_PREFIX}{i}"
+
+def _person(rng: random.Random, owner: str, seq: int, now: datetime) -> dict:
+    follow_up_at = None
+    if rng.random() < FOLLOW_UP_RATE:
+        follow_up_at = (now + timedelta(days=rng.randint(-FOLLOW_UP_SPREAD_DAYS, FOLLOW_UP_SPREAD_DAYS))).date().isoformat()
+    return {
+        "owner": owner,
+        "change_seq": seq,
+        "name": rng.choice(SURNAMES) + rng.choice(GIVEN_NAMES),
+        "gender": rng.choice(["male", "female", None]),
+        "birthday": f"{rng.randint(1960, 2005)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "phone": f"1{rng.randint(3000000000, 9999999999)}",
+        "city": rng.choice(CITIES),
+        "resources": " ".join(rng.sample(TOPICS, rng.randint(0, 3))) or None,
+        "needs": " ".join(rng.sample(TOPICS, rng.randint(0, 3))) or None,
+        "follow_up_at": follow_up_at,
+        "now": now.isoformat(),
+    }
+
+async def _run(session, query: str, **params):
+    result = await session.run(query, params)
+    await result.consume()
+
+async def clear(driver):
+    """Remove everything owned by bench users from a previous run"""
+    async with driver.session() as session:
+        await _run(session,
+            """
+            MATCH (u:User) WHERE u.open_id STARTS WITH $prefix
+            CALL {
+                WITH u
+                OPTIONAL MATCH (u)-[:OWNS|HAS_MESSAGE]->(n)
+                DETACH DELETE n
+            } IN TRANSACTIONS OF 1 ROWS
+            DETACH DELETE u
+            """,
+            prefix=BENCH_USER_PREFIX)
+
+async def seed(driver, users: int, people: int, messages: int, edges: int = 2, seed: int = 0,
+               first: int = 0) -> List[str]:
+    """Create `users` bench users, numbered from `first`, with `people` contacts and `messages` inbox messages each"""
+    from backend.reminders import birthday_md
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    stamp = now.isoformat()
+    open_ids = [bench_open_id(i) for i in range(first, first + users)]
+    async with driver.session() as session:
+        for open_id in open_ids:
+            await _run(session,
+                """
+                MERGE (u:User {open_id: $open_id})
+                SET u.name = $name, u.created_at = $now, u.last_login_at = $now, u.level = 1,
+                    u.deleted = false, u.unread_count = 0, u.change_seq = $people
+                """,
+                open_id=open_id, name=f"Bench {open_id}", now=stamp, people=people)
+            rows = [_person(rng, open_id, seq, now) for seq in range(1, people + 1)]
+            for start in range(0, len(rows), SEED_BATCH_SIZE):
+                await _run(session,
+                    f"""
+                    MATCH (u:User {{open_id: $open_id}})
+                    UNWIND $rows AS row
+                    CREATE (u)-[:OWNS]->(:Person {{
+                        owner: row.owner, deleted: false, change_seq: row.change_seq,
+                        name: row.name, gender: row.gender, birthday: row.birthday, phone: row.phone,
+                        city: row.city, resources: row.resources, needs: row.needs,
+                        birthday_md: {birthday_md("row.birthday")}, follow_up_at: row.follow_up_at,
+                        created_at: row.now, updated_at: row.now
+                    }})
+                    """,
+                    open_id=open_id, rows=rows[start:start + SEED_BATCH_SIZE])
+            # A sparse random graph among each user's contacts
+            await _run(session,
+                """
+                MATCH (:User {open_id: $open_id})-[:OWNS]->(p:Person)
+                WITH collect(p) AS people
+                UNWIND range(0, size(people) * $edges - 1) AS i
+                WITH people, people[toInteger(rand() * size(people))] AS a,
+                     people[toInteger(rand() * size(people))] AS b
+                WHERE a <> b
+                MERGE (a)-[r:KNOWS {owner: $open_id}]->(b)
+                ON CREATE SET r.strength = 1 + toInteger(rand() * 5), r.created_at = $now, r.updated_at = $now
+                """,
+                open_id=open_id, edges=edges, now=stamp)
+            inbox = [
+                {"date": (now - timedelta(minutes=i)).isoformat(), "read": rng.random() < 0.7}
+                for i in range(messages)
+            ]
+            await _run(session,
+                """
+                MATCH (u:User {open_id: $open_id})
+                UNWIND $inbox AS row
+                CREATE (u)-[:HAS_MESSAGE]->(:InboxMessage {
+                    date: row.date, text: 'Benchmark message', read: row.read, message_type: 'System'
+                })
+                WITH u, sum(CASE WHEN row.read THEN 0 ELSE 1 END) AS unread
+                SET u.unread_count = unread
+                """,
+                open_id=open_id, inbox=inbox)
+    log.info(f"Seeded {users} users with {people} people and {messages} messages each")
+    return open_ids
@@ -0,0 +1,139 @@
+"""Microbenchmark of response encoding, without a server or database
+
+Compares what FastAPI does with a returned dict (jsonable_encoder, plus
+response_model validation for the inbox, then JSONResponse) against
+backend.serialization for pages of 10, 1k and 100k rows.
+"""
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+import asyncio
+import json
+import random
+import statistics
+import time
+from backend.models import InboxPage
+from backend.serialization import RecordResponse, stream_object
+
+SIZES = (10, 1000, 100000)
+# Rows encoded per size and path, spread over repeats
+ROW_BUDGET = 300000
+
+CITIES = ["北京", "上海", "深圳", "杭州", "Berlin", None]
+
+def person_rows(n: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": f"4:bench:{i}",
+            "name": f"联系人 {i}",
+            "nickname": rng.choice([None, f"nick{i}"]),
+            "gender": rng.choice(["male", "female", None]),
+            "birthday": None,
+            "phone": f"138{i:08d}",
+            "email": f"person{i}@example.com",
+            "city": rng.choice(CITIES),
+            "resources": "投资, 法律咨询",
+            "needs": "招聘",
+            "created_at": (start + timedelta(minutes=i)).isoformat(),
+            "updated_at": (start + timedelta(minutes=i)).isoformat(),
+        }
+        for i in range(n)
+    ]
+
+def inbox_rows(n: int) -> List[Dict]:
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": f"4:bench:{i}",
+            "date": (start + timedelta(minutes=i)).isoformat(),
+            "text": f"Message {i}: 欢迎加入",
+            "read": i % 3 == 0,
+            "message_type": "System",
+            "person_id": None,
+        }
+        for i in range(n)
+    ]
+
+# One loop for the async paths, so neither side pays for loop setup per call
+LOOP = asyncio.new_event_loop()
+
+INBOX_FIELD = create_model_field("Response_get_inbox_messages", InboxPage, mode="serialization")
+
+def _people_page(rows):
+    return {"items": rows, "next_cursor": "WyIyMDI0LTAxLTAxIiwgIjQ6YmVuY2g6MCJd"}
+
+def _inbox_page(rows):
+    return {"items": rows, "next_cursor": None, "read_cursor": None, "unread_count": 7}
+
+def _changes_page(rows):
+    return {"changes": rows, "since": len(rows), "has_more": False}
+
+async def _rows(rows):
+    for row in rows:
+        yield row
+
+def _current_people(rows) -> bytes:
+    return JSONResponse(jsonable_encoder(_people_page(rows))).body
+
+def _current_inbox(rows) -> bytes:
+    content = LOOP.run_until_complete(serialize_response(field=INBOX_FIELD, response_content=_inbox_page(rows)))
+    return JSONResponse(content).body
+
+def _current_changes(rows) -> bytes:
+    return JSONResponse(jsonable_encoder(_changes_page(rows))).body
+
+def _fast_people(rows) -> bytes:
+    return RecordResponse(_people_page(rows)).body
+
+def _fast_inbox(rows) -> bytes:
+    return RecordResponse(_inbox_page(rows)).body
+
+def _fast_changes(rows) -> bytes:
+    async def collect():
+        tail = lambda: {"since": len(rows), "has_more": False}
+        return b"".join([chunk async for chunk in stream_object("changes", _rows(rows), tail)])
+    return LOOP.run_until_complete(collect())
+
+CASES = {
+    "people.list": (person_rows, _current_people, _fast_people),
+    "user.inbox": (inbox_rows, _current_inbox, _fast_inbox),
+    "people.changes": (person_rows, _current_changes, _fast_changes),
+}
+
+def _time(encode: Callable, rows, repeats: int) -> float:
+    """Median seconds per call"""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        encode(rows)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+def run(sizes=SIZES, row_budget: int = ROW_BUDGET) -> List[Dict]:
+    results = []
+    for case, (make_rows, current, fast) in CASES.items():
+        for n in sizes:
+            rows = make_rows(n)
+            # Both paths must produce the same document
+            assert json.loads(current(rows)) == json.loads(fast(rows)), case
+            repeats = max(3, min(1000, row_budget // n))
+            current_s = _time(current, rows, repeats)
+            fast_s = _time(fast, rows, repeats)
+            results.append({
+                "case": case,
+                "rows": n,
+                "current_ms": round(current_s * 1000, 3),
+                "fast_ms": round(fast_s * 1000, 3),
+                "speedup": round(current_s / fast_s, 1),
+            })
+    return results
+
+def print_results(results: List[Dict]):
+    print(f"{'case':<16}{'rows':>8}{'current ms':>13}{'fast ms':>11}{'speedup':>9}")
+    for r in results:
+        print(f"{r['case']:<16}{r['rows']:>8}{r['current_ms']:>13}{r['fast_ms']:>11}{r['speedup']:>8}x")
@@ -0,0 +1,256 @@
+"""Microbenchmark of the session check in front of every protected route, without a server
+
+Times what runs before an /api/private handler (cookie parse, backend lookup
+and verify) per request. It compares the original path against the current
+one over each session backend:
+- original: sync cookie dependency on the threadpool, InMemoryBackend, the
+  whole payload logged at INFO
+- current: the async cookie and cached verification over each backend
+
+With --workers, the same check runs in that many processes sharing one SQLite
+session file. Meanwhile another process writes new logins, as uvicorn
+workers behind one port would.
+"""
+from fastapi_sessions.backends.implementations import InMemoryBackend
+from fastapi_sessions.session_verifier import SessionVerifier
+from fastapi.exceptions import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from typing import Dict, List
+from uuid import UUID, uuid4
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from backend.models import SessionData
+from .runner import percentile
+
+# Distinct sessions the requests cycle through
+SESSIONS = 1000
+REQUESTS = 20000
+# Checks in flight per worker process, as for concurrent requests
+CONCURRENCY = 16
+# New sessions per second written by a separate process during the multi-worker run
+LOGIN_RATE = 50
+
+USER_INFO = {
+    "avatar_url": "https://s3-imfile.feishucdn.com/static-resource/v1/v3_00gn_e89aea88-3b26-492b-a789-1bc9165f884g~?image_size=72x72",
+    "en_name": "Bench",
+    "name": "Bench User",
+    "tenant_key": "145c3d9f7d0fd75d",
+    "union_id": "on_86ec337b91935163274083d388e753f9",
+    "level": 1,
+    "created_at": "2024-01-01T00:00:00+00:00",
+    "last_login_at": "2024-01-01T00:00:00+00:00",
+}
+
+original_log = logging.getLogger("bench.sessions.original")
+
+class OriginalVerifier(SessionVerifier[UUID, SessionData]):
+    """BasicVerifier as it was: the stock __call__ and an INFO line with the payload per request"""
+
+    def __init__(self, backend):
+        self._backend = backend
+        self._auth_http_exception = HTTPException(status_code=403, detail="invalid session")
+
+    @property
+    def identifier(self):
+        return "session"
+
+    @property
+    def backend(self):
+        return self._backend
+
+    @property
+    def auto_error(self):
+        return False
+
+    @property
+    def auth_http_exception(self):
+        return self._auth_http_exception
+
+    def verify_session(self, model: SessionData) -> bool:
+        original_log.info(f"Verifying session: {model}")
+        if not model or not model.user_info:
+            return False
+        return all(field in model.user_info for field in ("open_id", "name"))
+
+def _request(cookie_header: bytes) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/api/private/user/me",
+                    "headers": [(b"cookie", cookie_header)]})
+
+async def _time(check, cookies: List[bytes], requests: int) -> Dict:
+    """Per-request microseconds of one path, cycling through the sessions"""
+    timings = []
+    for i in range(requests):
+        request = _request(cookies[i % len(cookies)])
+        started = time.perf_counter()
+        session_data = await check(request)
+        timings.append(time.perf_counter() - started)
+        assert session_data is not None
+    timings.sort()
+    return {
+        "p50_us": round(percentile(timings, 50) * 1e6, 1),
+        "p99_us": round(percentile(timings, 99) * 1e6, 1),
+        "per_second": round(len(timings) / sum(timings)),
+    }
+
+async def _sessions(store, sessions: int) -> List[UUID]:
+    ids = [uuid4() for _ in range(sessions)]
+    for i, session_id in enumerate(ids):
+        await store.create(session_id, SessionData(user_info={**USER_INFO, "open_id": f"ou_bench_{i}"}))
+    return ids
+
+async def _run(sessions: int, requests: int, directory: str) -> List[Dict]:
+    # Imported here: backend.session_auth opens the configured session store on import
+    from fastapi_sessions.frontends.implementations import SessionCookie
+    from backend.session_auth import AsyncSessionCookie, BasicVerifier, cookie_params
+    from backend.session_store import CachedBackend, MemoryBackend, SQLiteBackend, SESSION_CACHE_SIZE, SESSION_TTL
+
+    def signed(frontend, ids):
+        return [f"session={frontend.signer.dumps(session_id.hex)}".encode() for session_id in ids]
+
+    results = []
+
+    # The original path; the log line goes where basicConfig would send it, minus the terminal
+    handler = logging.StreamHandler(open(os.devnull, "w"))
+    original_log.addHandler(handler)
+    original_log.setLevel(logging.INFO)
+    original_log.propagate = False
+    store = InMemoryBackend[UUID, SessionData]()
+    sync_cookie = SessionCookie(cookie_name="session", identifier="session", auto_error=True,
+                                secret_key="HIKE", cookie_params=cookie_params)
+    verifier = OriginalVerifier(store)
+
+    async def original(request):
+        # FastAPI runs a sync dependency on the threadpool
+        await run_in_threadpool(sync_cookie, request)
+        return await verifier(request)
+
+    cookies = signed(sync_cookie, await _sessions(store, sessions))
+    results.append({"case": "original, memory", **await _time(original, cookies, requests)})
+    handler.stream.close()
+
+    async_cookie = AsyncSessionCookie(cookie_name="session", identifier="session", auto_error=True,
+                                      secret_key="HIKE", cookie_params=cookie_params)
+    cases = {
+        "current, memory": lambda: MemoryBackend(),
+        "current, sqlite + LRU": lambda: CachedBackend(
+            SQLiteBackend(os.path.join(directory, "lru.db"), SESSION_TTL), SESSION_CACHE_SIZE, 30),
+        # Every read goes to the file, as for a session this worker has not seen recently
+        "current, sqlite miss": lambda: CachedBackend(
+            SQLiteBackend(os.path.join(directory, "miss.db"), SESSION_TTL), SESSION_CACHE_SIZE, 0),
+    }
+    for case, make_store in cases.items():
+        store = make_store()
+        verifier = BasicVerifier(identifier="session", auto_error=False, backend=store,
+                                 auth_http_exception=HTTPException(status_code=403, detail="invalid session"))
+
+        async def current(request):
+            await async_cookie(request)
+            return await verifier(request)
+
+        cookies = signed(async_cookie, await _sessions(store, sessions))
+        results.append({"case": case, **await _time(current, cookies, requests)})
+        await store.close()
+    return results
+
+def run(sessions: int = SESSIONS, requests: int = REQUESTS) -> List[Dict]:
+    with tempfile.TemporaryDirectory() as directory:
+        return asyncio.run(_run(sessions, requests, directory))
+
+def _shared_store(path: str, cache_ttl: float):
+    from backend.session_store import CachedBackend, SQLiteBackend, SESSION_CACHE_SIZE, SESSION_TTL
+    return CachedBackend(SQLiteBackend(path, SESSION_TTL), SESSION_CACHE_SIZE, cache_ttl)
+
+async def _check_loop(path: str, cookies: List[bytes], requests: int, concurrency: int, cache_ttl: float, seed: int):
+    from backend.session_auth import AsyncSessionCookie, BasicVerifier, cookie_params
+    store = _shared_store(path, cache_ttl)
+    cookie = AsyncSessionCookie(cookie_name="session", identifier="session", auto_error=True,
+                                secret_key="HIKE", cookie_params=cookie_params)
+    verifier = BasicVerifier(identifier="session", auto_error=False, backend=store,
+                             auth_http_exception=HTTPException(status_code=403, detail="invalid session"))
+    rng = random.Random(seed)
+    timings = []
+
+    async def client(count: int):
+        for _ in range(count):
+            request = _request(rng.choice(cookies))
+            started = time.perf_counter()
+            await cookie(request)
+            session_data = await verifier(request)
+            timings.append(time.perf_counter() - started)
+            assert session_data is not None
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client(requests // concurrency) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    await store.close()
+    return timings, elapsed
+
+def _check_worker(path, cookies, requests, concurrency, cache_ttl, seed, results):
+    results.put(asyncio.run(_check_loop(path, cookies, requests, concurrency, cache_ttl, seed)))
+
+async def _write_logins(path: str, rate: float, stop):
+    store = _shared_store(path, 0)
+    i = 0
+    while not stop.is_set():
+        await store.create(uuid4(), SessionData(user_info={**USER_INFO, "open_id": f"ou_bench_login_{i}"}))
+        i += 1
+        await asyncio.sleep(1 / rate)
+    await store.close()
+
+def _login_writer(path, rate, stop):
+    asyncio.run(_write_logins(path, rate, stop))
+
+def run_workers(workers: int, sessions: int = SESSIONS, requests: int = REQUESTS,
+                concurrency: int = CONCURRENCY) -> List[Dict]:
+    """Per-request check latency with `workers` processes sharing one SQLite session store"""
+    from backend.session_auth import AsyncSessionCookie, cookie_params
+    from backend.session_store import SESSION_CACHE_TTL
+    cookie = AsyncSessionCookie(cookie_name="session", identifier="session", auto_error=True,
+                                secret_key="HIKE", cookie_params=cookie_params)
+    # Worker processes start fresh, like uvicorn's
+    context = multiprocessing.get_context("spawn")
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "shared.db")
+
+        async def create():
+            store = _shared_store(path, 0)
+            ids = await _sessions(store, sessions)
+            await store.close()
+            return ids
+
+        cookies = [f"session={cookie.signer.dumps(session_id.hex)}".encode() for session_id in asyncio.run(create())]
+        for case, cache_ttl in (("sqlite + LRU", SESSION_CACHE_TTL), ("sqlite miss", 0)):
+            queue, stop = context.Queue(), context.Event()
+            writer = context.Process(target=_login_writer, args=(path, LOGIN_RATE, stop))
+            processes = [
+                context.Process(target=_check_worker, args=(path, cookies, requests, concurrency, cache_ttl, i, queue))
+                for i in range(workers)
+            ]
+            writer.start()
+            for process in processes:
+                process.start()
+            outcomes = [queue.get() for _ in processes]
+            for process in processes:
+                process.join()
+            stop.set()
+            writer.join()
+            timings = sorted(t for worker_timings, _ in outcomes for t in worker_timings)
+            results.append({
+                "case": f"{workers} workers, {case}",
+                "p50_us": round(percentile(timings, 50) * 1e6, 1),
+                "p99_us": round(percentile(timings, 99) * 1e6, 1),
+                "per_second": round(sum(len(t) / elapsed for t, elapsed in outcomes)),
+            })
+    return results
+
+def print_results(results: List[Dict]):
+    print(f"{'case':<28}{'p50 us':>9}{'p99 us':>9}{'checks/s':>11}")
+    for r in results:
+        print(f"{r['case']:<28}{r['p50_us']:>9}{r['p99_us']:>9}{r['per_second']:>11}")
@@ -0,0 +1,138 @@
+"""Thousands of idle inbox event streams on one worker, through the running app, against Neo4j
+
+Logs in `users` seeded users, then holds `connections` idle
+/user/inbox/stream connections open across them for `hold` seconds, with the
+heartbeat shortened to `heartbeat` seconds. It reports:
+- the server's RSS before, while connected and after the streams close,
+  and the cost per connection
+- the streams the server counts (inbox_stream_connections)
+- the heartbeats each stream received and the longest gap between two
+- /health and /ready latency with no streams and while they are held,
+  i.e. whether idle streams take anything from the loop
+"""
+from typing import Dict, List
+import asyncio
+import resource
+import time
+import httpx
+from .runner import login, percentile, prepare_database, process_memory, running_app
+
+CONNECTIONS = 2000
+USERS = 20
+HOLD = 30.0
+HEARTBEAT = 2.0
+# Probe requests per endpoint and phase
+PROBES = 200
+
+class Streams:
+    def __init__(self):
+        self.opened = 0
+        self.failed = 0
+        self.heartbeats: List[int] = []
+        self.max_gap = 0.0
+
+async def _listen(client: httpx.AsyncClient, streams: Streams):
+    heartbeats, last = 0, None
+    try:
+        async with client.stream("GET", "/api/private/user/inbox/stream") as response:
+            if response.status_code != 200:
+                streams.failed += 1
+                return
+            streams.opened += 1
+            last = time.monotonic()
+            async for line in response.aiter_lines():
+                if line == ": ping":
+                    now = time.monotonic()
+                    streams.max_gap = max(streams.max_gap, now - last)
+                    heartbeats, last = heartbeats + 1, now
+    except httpx.HTTPError:
+        streams.failed += 1
+    finally:
+        if last is not None:
+            streams.heartbeats.append(heartbeats)
+
+async def _probe(base_url: str, probes: int) -> Dict:
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        for path in ("/api/public/health", "/api/public/ready"):
+            timings = []
+            for _ in range(probes):
+                started = time.perf_counter()
+                (await client.get(path)).raise_for_status()
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            name = path.rsplit("/", 1)[1]
+            results[f"{name}_p50_ms"] = round(percentile(timings, 50) * 1000, 2)
+            results[f"{name}_p99_ms"] = round(percentile(timings, 99) * 1000, 2)
+    return results
+
+async def _server_streams(base_url: str) -> int:
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        response = await client.get("/api/internal/metrics")
+    for line in response.text.splitlines():
+        if line.startswith("inbox_stream_connections "):
+            return int(float(line.split()[1]))
+    return -1
+
+async def run(connections: int = CONNECTIONS, users: int = USERS, hold: float = HOLD,
+              heartbeat: float = HEARTBEAT, keep: bool = False) -> Dict[str, Dict]:
+    # Every stream is a socket on this side too
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    await prepare_database(users, 10, 0, keep)
+    env = {"INBOX_HEARTBEAT_INTERVAL": str(heartbeat), "METRICS_TOKEN": ""}
+    results = {}
+    async with running_app(env) as (base_url, process):
+        clients = [httpx.AsyncClient(base_url=base_url, timeout=httpx.Timeout(30, read=None),
+                                     limits=httpx.Limits(max_connections=None, max_keepalive_connections=0))
+                   for _ in range(users)]
+        try:
+            for i, client in enumerate(clients):
+                await login(client, i)
+            results["idle"] = {**process_memory(process.pid), **await _probe(base_url, PROBES)}
+
+            streams = Streams()
+            started = time.perf_counter()
+            tasks = [asyncio.create_task(_listen(clients[i % users], streams)) for i in range(connections)]
+            while streams.opened + streams.failed < connections and time.perf_counter() - started < 120:
+                await asyncio.sleep(0.1)
+            opened_in = time.perf_counter() - started
+            await asyncio.sleep(hold)
+            connected = {**process_memory(process.pid), **await _probe(base_url, PROBES)}
+            server_streams = await _server_streams(base_url)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            per_connection = (connected["rss_kib"] - results["idle"]["rss_kib"]) / max(streams.opened, 1)
+            results["connected"] = {
+                **connected,
+                "opened": streams.opened,
+                "failed": streams.failed,
+                "server_streams": server_streams,
+                "open_seconds": round(opened_in, 1),
+                "kib_per_connection": round(per_connection, 1),
+                "heartbeats_min": min(streams.heartbeats, default=0),
+                "heartbeats_expected": int(hold // heartbeat),
+                "max_heartbeat_gap_s": round(streams.max_gap, 2),
+            }
+            # Give the server a moment to run the streams' cleanup
+            await asyncio.sleep(heartbeat)
+            results["closed"] = {**process_memory(process.pid), "server_streams": await _server_streams(base_url)}
+        finally:
+            for client in clients:
+                await client.aclose()
+    return results
+
+def print_results(results: Dict[str, Dict]):
+    for phase, r in results.items():
+        print(f"{phase:<10} RSS {round(r['rss_kib'] / 1024)} MiB, peak {round(r['peak_rss_kib'] / 1024)} MiB")
+        if "health_p50_ms" in r:
+            print(f"{'':<10} health p50/p99 {r['health_p50_ms']}/{r['health_p99_ms']} ms, "
+                  f"ready p50/p99 {r['ready_p50_ms']}/{r['ready_p99_ms']} ms")
+        if "opened" in r:
+            print(f"{'':<10} {r['opened']} streams open ({r['failed']} failed, server counts {r['server_streams']}) "
+                  f"in {r['open_seconds']} s, {r['kib_per_connection']} KiB each")
+            print(f"{'':<10} heartbeats per stream >= {r['heartbeats_min']} of {r['heartbeats_expected']}, "
+                  f"longest gap {r['max_heartbeat_gap_s']} s")
+        elif "server_streams" in r:
+            print(f"{'':<10} server counts {r['server_streams']} streams")
@@ -0,0 +1,84 @@
+"""Per-tenant latency while other tenants grow, through the running app, against Neo4j
+
+One measured user keeps `own` people throughout. Other tenants with `people`
+contacts each are added in steps, up to each count in `tenants`. After every
+step, `requests` requests per endpoint are sent as the measured user, and
+the bench reports p50/p99 of:
+- people.list: the first page of GET /people/
+- people.search: typeahead with a prefix from the seeded vocabulary
+- network.stat: GET /network/stat, reconciled from the database on every
+  call (STATS_MAX_STALENESS=0) so the query is timed rather than the cache
+
+With scoping done right these stay flat as the other tenants grow.
+"""
+from typing import Dict, List
+import random
+import time
+import httpx
+from .runner import login, percentile, prepare_database, running_app
+from .search import typeahead_prefixes
+from .seed import seed
+
+OWN = 2000
+PEOPLE = 10000
+TENANTS = (0, 10, 100)
+REQUESTS = 200
+
+ENDPOINTS = {
+    "people.list": lambda rng, prefixes: ("/api/private/people/", {"limit": 20}),
+    "people.search": lambda rng, prefixes: ("/api/private/people/search", {"q": rng.choice(prefixes), "prefix": "true"}),
+    "network.stat": lambda rng, prefixes: ("/api/private/network/stat", {}),
+}
+
+async def _add_tenants(existing: int, target: int, people: int):
+    """Seed tenants existing+1..target; user 0 is the measured one"""
+    from backend.db import init_driver, close_driver
+    driver = await init_driver()
+    try:
+        if target > existing:
+            await seed(driver, target - existing, people, 0, edges=0, seed=target, first=existing + 1)
+        async with driver.session() as session:
+            # The full-text index is eventually consistent; search what was just written
+            result = await session.run("CALL db.index.fulltext.awaitEventuallyConsistentIndexRefresh()")
+            await result.consume()
+    finally:
+        await close_driver()
+
+async def _measure(client: httpx.AsyncClient, requests: int, rng: random.Random, prefixes: List[str]) -> Dict:
+    results = {}
+    for endpoint, make in ENDPOINTS.items():
+        timings = []
+        for _ in range(requests):
+            path, params = make(rng, prefixes)
+            started = time.perf_counter()
+            response = await client.get(path, params=params)
+            timings.append(time.perf_counter() - started)
+            response.raise_for_status()
+        timings.sort()
+        results[endpoint] = {
+            "p50_ms": round(percentile(timings, 50) * 1000, 1),
+            "p99_ms": round(percentile(timings, 99) * 1000, 1),
+        }
+    return results
+
+async def run(own: int = OWN, people: int = PEOPLE, tenants=TENANTS, requests: int = REQUESTS) -> List[Dict]:
+    await prepare_database(1, own, 0, False, edges=0)
+    prefixes = typeahead_prefixes()
+    rng = random.Random(0)
+    results = []
+    existing = 0
+    async with running_app({"STATS_MAX_STALENESS": "0"}) as (base_url, _):
+        async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+            await login(client, 0)
+            for target in sorted(tenants):
+                await _add_tenants(existing, target, people)
+                existing = max(existing, target)
+                for endpoint, timings in (await _measure(client, requests, rng, prefixes)).items():
+                    results.append({"other_tenants": existing, "other_people": existing * people,
+                                    "endpoint": endpoint, **timings})
+    return results
+
+def print_results(results: List[Dict]):
+    print(f"{'other tenants':>14}{'other people':>14}  {'endpoint':<15}{'p50 ms':>9}{'p99 ms':>9}")
+    for r in results:
+        print(f"{r['other_tenants']:>14}{r['other_people']:>14}  {r['endpoint']:<15}{r['p50_ms']:>9}{r['p99_ms']:>9}")
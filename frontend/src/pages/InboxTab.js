@@ -35,23 +35,70 @@ const formatRelativeTime = (dateStr) => {
 
 const InboxTab = () => {
   const [inboxMessages, setInboxMessages] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [readCursor, setReadCursor] = useState(null);
+  const [unreadCount, setUnreadCount] = useState(0);
   const [selectedMessage, setSelectedMessage] = useState(null);
   const [dialogOpen, setDialogOpen] = useState(false);
 
   useEffect(() => {
     fetchInboxMessages();
+    // Live updates; the browser reconnects with Last-Event-ID on its own
+    const events = new EventSource('/api/private/user/inbox/stream');
+    events.addEventListener('message', (e) => {
+      const message = JSON.parse(e.data);
+      setInboxMessages(messages => [message, ...messages.filter(msg => msg.id !== message.id)]);
+      if (!message.read) setUnreadCount(count => count + 1);
+    });
+    events.addEventListener('read', (e) => {
+      const { ids } = JSON.parse(e.data);
+      setUnreadCount(count => Math.max(count - ids.length, 0));
+      setInboxMessages(messages =>
+        messages.map(msg => (ids.includes(msg.id) ? { ...msg, read: true } : msg))
+      );
+    });
+    events.addEventListener('reset', () => fetchInboxMessages());
+    return () => events.close();
   }, []);
 
-  const fetchInboxMessages = async () => {
+  const fetchInboxMessages = async (cursor = null) => {
     try {
-      const inboxResponse = await fetch('/api/private/user/inbox');
+      const url = cursor
+        ? `/api/private/user/inbox?cursor=${encodeURIComponent(cursor)}`
+        : '/api/private/user/inbox';
+      const inboxResponse = await fetch(url);
       const inboxData = await inboxResponse.json();
-      setInboxMessages(inboxData);
+      if (cursor) {
+        setInboxMessages(messages => [...messages, ...inboxData.items]);
+      } else {
+        setInboxMessages(inboxData.items);
+        setReadCursor(inboxData.read_cursor);
+      }
+      setNextCursor(inboxData.next_cursor);
+      setUnreadCount(inboxData.unread_count);
     } catch (err) {
       console.error('Error fetching inbox messages:', err);
     }
   };
 
+  const handleMarkAllAsRead = async () => {
+    if (!readCursor) return;
+
+    try {
+      // Everything up to the newest message shown; later arrivals stay unread
+      const response = await fetch('/api/private/user/inbox/read', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ before: readCursor }),
+      });
+      if (response.ok) {
+        fetchInboxMessages();
+      }
+    } catch (err) {
+      console.error('Error marking messages as read:', err);
+    }
+  };
+
   const handleMessageClick = (message) => {
     setSelectedMessage(message);
     setDialogOpen(true);
@@ -77,6 +124,7 @@ const InboxTab = () => {
             msg.id === selectedMessage.id ? { ...msg, read: true } : msg
           )
         );
+        setUnreadCount(count => Math.max(count - 1, 0));
         // Update the selected message
         setSelectedMessage({ ...selectedMessage, read: true });
         // Close the dialog
@@ -89,6 +137,14 @@ const InboxTab = () => {
 
   return (
     <div className="tab-content">
+      {unreadCount > 0 && (
+        <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', marginBottom: 12 }}>
+          <span>{unreadCount} unread</span>
+          <button onClick={handleMarkAllAsRead} className="btn btn-secondary">
+            Mark all as read
+          </button>
+        </div>
+      )}
       <div className="messages-list">
         {inboxMessages.map(message => (
           <div 
@@ -109,6 +165,11 @@ const InboxTab = () => {
             <div className="message-text">{message.text}</div>
           </div>
         ))}
+        {nextCursor && (
+          <button onClick={() => fetchInboxMessages(nextCursor)} className="btn btn-secondary">
+            Load more
+          </button>
+        )}
         {inboxMessages.length === 0 && (
           <div className="no-messages">
             <span className="material-icons" style={{ fontSize: 48, color: '#ccc', marginBottom: 16 }}>
@@ -7,6 +7,7 @@ const NetworkTab = () => {
   const [nickname, setNickname] = useState('');
   const [showAddPersonModal, setShowAddPersonModal] = useState(false);
   const [people, setPeople] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [isPeopleLoading, setIsPeopleLoading] = useState(false);
   const [networkStats, setNetworkStats] = useState(null);
 
@@ -20,12 +21,20 @@ const NetworkTab = () => {
     }
   };
 
-  const fetchPeople = async () => {
+  // One keyset page at a time; pass the previous page's next_cursor to append the next one
+  const fetchPeople = async (cursor = null) => {
     try {
-      setIsPeopleLoading(true);
-      const response = await fetch('/api/private/people/');
+      if (!cursor) setIsPeopleLoading(true);
+      const params = new URLSearchParams({ limit: '50', fields: 'id,name,nickname' });
+      if (cursor) params.set('cursor', cursor);
+      const response = await fetch(`/api/private/people/?${params}`);
       const data = await response.json();
-      setPeople(data);
+      if (cursor) {
+        setPeople(people => [...people, ...data.items]);
+      } else {
+        setPeople(data.items);
+      }
+      setNextCursor(data.next_cursor);
     } catch (err) {
       console.error('Error fetching people:', err);
     } finally {
@@ -99,6 +108,11 @@ const NetworkTab = () => {
                 </div>
               </div>
             ))}
+            {nextCursor && (
+              <button onClick={() => fetchPeople(nextCursor)} className="btn btn-secondary">
+                Load more
+              </button>
+            )}
           </div>
         )}
       </div>
@@ -9,6 +9,8 @@ const PersonProfile = () => {
     const [isLoading, setIsLoading] = useState(true);
     const [isEditMode, setIsEditMode] = useState(false);
     const [formData, setFormData] = useState(null);
+    const [etag, setEtag] = useState(null);
+    const [conflict, setConflict] = useState(false);
 
     // Check if we have navigation history
     const hasHistory = location.key !== 'default';
@@ -27,6 +29,7 @@ const PersonProfile = () => {
                 const response = await fetch(`/api/private/people/${personId}`);
                 if (response.ok) {
                     const data = await response.json();
+                    setEtag(response.headers.get('ETag'));
                     setPerson(data);
                     setFormData(data);
                 } else {
@@ -52,19 +55,37 @@ const PersonProfile = () => {
 
     const handleSubmit = async (e) => {
         e.preventDefault();
+        // Send only the fields that were edited
+        const changes = {};
+        Object.keys(formData).forEach(key => {
+            if (formData[key] !== person[key]) {
+                changes[key] = formData[key] === '' ? null : formData[key];
+            }
+        });
+        if (Object.keys(changes).length === 0) {
+            setIsEditMode(false);
+            return;
+        }
         try {
             const response = await fetch(`/api/private/people/${personId}`, {
-                method: 'PUT',
+                method: 'PATCH',
                 headers: {
                     'Content-Type': 'application/json',
+                    ...(etag ? { 'If-Match': etag } : {}),
                 },
-                body: JSON.stringify(formData),
+                body: JSON.stringify(changes),
             });
 
             if (response.ok) {
                 const updatedPerson = await response.json();
+                setEtag(response.headers.get('ETag'));
                 setPerson(updatedPerson);
+                setFormData(updatedPerson);
+                setConflict(false);
                 setIsEditMode(false);
+            } else if (response.status === 412) {
+                // Someone else saved this person since it was loaded
+                setConflict(true);
             } else {
                 console.error('Failed to update person');
             }
@@ -204,6 +225,11 @@ const PersonProfile = () => {
                     </div>
                 ) : (
                     <form onSubmit={handleSubmit} style={{ display: 'grid', gap: '10px', maxWidth: '500px' }}>
+                        {conflict && (
+                            <div className="error">
+                                This person was changed elsewhere. Reload the page to see the latest version.
+                            </div>
+                        )}
                         <div className="form-section">
                             <h3 className="section-title">Basic</h3>
                             <div style={{ display: 'grid', gap: '5px' }}>
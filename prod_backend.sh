@@ -0,0 +1,7 @@
+#!/bin/bash
+
+# Activate virtual environment
+source venv/bin/activate
+
+# Run the FastAPI application with one worker per core (see backend/serve.py)
+python -m backend.serve --host 0.0.0.0 --port 8000
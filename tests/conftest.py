@@ -0,0 +1,30 @@
+"""Shared fixtures; tests that need Neo4j use the NEO4J_* settings and skip when it is unreachable"""
+import asyncio
+import os
+import pytest
+
+# Sessions created by the tests stay in memory
+os.environ.setdefault("SESSION_BACKEND", "memory")
+
+from backend.db import init_driver, close_driver
+from backend.schema import apply_schema
+
+@pytest.fixture
+def with_database():
+    """Run an async test body with the shared driver initialized and the schema applied"""
+    def run(body):
+        async def main():
+            try:
+                driver = await init_driver()
+            except Exception as e:
+                await close_driver()
+                return e
+            try:
+                await apply_schema(driver)
+                await body(driver)
+            finally:
+                await close_driver()
+        error = asyncio.run(main())
+        if error is not None:
+            pytest.skip(f"Neo4j is not reachable: {error}")
+    return run
@@ -0,0 +1,20 @@
+"""Graph scoring without a database"""
+import numpy as np
+from backend.analytics import analyze_graph
+
+# Two components: a triangle 0-1-2 and an edge 3-4; 5..7 are isolated
+SRC = np.array([0, 1, 2, 3], dtype=np.int32)
+DST = np.array([1, 2, 0, 4], dtype=np.int32)
+
+def test_nothing_dirty_scores_nobody():
+    result = analyze_graph(8, SRC, DST, np.zeros(8, dtype=bool))
+    assert (result["people"], result["connections"], result["components"], result["isolated"]) == (8, 4, 5, 3)
+    assert len(result["nodes"]) == len(result["pagerank"]) == len(result["community"]) == 0
+
+def test_only_dirty_components_are_scored():
+    dirty = np.zeros(8, dtype=bool)
+    dirty[4] = True
+    result = analyze_graph(8, SRC, DST, dirty)
+    assert result["nodes"].tolist() == [3, 4]
+    assert result["degree"].tolist() == [1, 1]
+    assert set(result["community"].tolist()) <= {3, 4}
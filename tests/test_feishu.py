@@ -0,0 +1,98 @@
+"""Feishu client token caching and retries, against the bench stub"""
+import asyncio
+import httpx
+import pytest
+from backend import feishu
+from backend.feishu import Feishu, FeishuException
+from bench.feishu_stub import create_feishu_stub
+
+def _client(latency: float = 0.0, retries: int = 2):
+    stub = create_feishu_stub(latency)
+    client = Feishu("http://feishu", "app", "secret", retries=retries)
+    client._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub), base_url="http://feishu")
+    return client, stub
+
+def _run(client: Feishu, body):
+    async def main():
+        try:
+            return await body()
+        finally:
+            await client.aclose()
+    return asyncio.run(main())
+
+def test_tokens_are_cached():
+    client, stub = _client()
+
+    async def body():
+        tokens = [await client.get_tenant_access_token() for _ in range(3)]
+        await client.login("ou_1")
+        await client.login("ou_2")
+        return tokens
+
+    assert _run(client, body) == ["bench-tenant-token"] * 3
+    assert stub.state.calls == {"tenant_access_token": 1, "app_access_token": 1, "access_token": 2}
+
+def test_tokens_are_refetched_when_expired(monkeypatch):
+    # A refresh margin as long as the token lifetime expires it at once
+    monkeypatch.setattr(feishu, "FEISHU_TOKEN_REFRESH_MARGIN", 7200)
+    client, stub = _client()
+
+    async def body():
+        await client.get_tenant_access_token()
+        await client.get_tenant_access_token()
+
+    _run(client, body)
+    assert stub.state.calls["tenant_access_token"] == 2
+
+def test_concurrent_callers_share_one_refresh():
+    client, stub = _client(latency=0.05)
+
+    async def body():
+        return await asyncio.gather(*(client.get_ticket() for _ in range(20)))
+
+    assert _run(client, body) == ["bench-ticket"] * 20
+    assert stub.state.calls == {"tenant_access_token": 1, "jsapi_ticket": 1}
+
+def test_server_errors_and_rate_limits_are_retried():
+    client, stub = _client()
+    stub.state.faults["tenant_access_token"] = [503, 429]
+    assert _run(client, client.get_tenant_access_token) == "bench-tenant-token"
+    assert stub.state.calls["tenant_access_token"] == 3
+
+def test_retries_give_up():
+    client, stub = _client(retries=1)
+    stub.state.faults["tenant_access_token"] = [500, 500]
+    with pytest.raises(httpx.HTTPStatusError):
+        _run(client, client.get_tenant_access_token)
+    assert stub.state.calls["tenant_access_token"] == 2
+
+def test_client_errors_are_not_retried():
+    client, stub = _client()
+    stub.state.faults["tenant_access_token"] = [400]
+    with pytest.raises(httpx.HTTPStatusError):
+        _run(client, client.get_tenant_access_token)
+    assert stub.state.calls["tenant_access_token"] == 1
+
+def test_rejected_token_is_refetched_once():
+    client, stub = _client()
+    stub.state.faults["access_token"] = [99991663]
+
+    async def body():
+        await client.get_app_access_token()
+        return await client.login("ou_1")
+
+    assert _run(client, body)["open_id"] == "ou_1"
+    assert stub.state.calls == {"app_access_token": 2, "access_token": 2}
+
+def test_other_error_codes_keep_the_token():
+    client, stub = _client()
+    stub.state.faults["access_token"] = [20003]
+
+    async def body():
+        with pytest.raises(FeishuException) as raised:
+            await client.login("ou_1")
+        assert raised.value.code == 20003
+        return await client.login("ou_1")
+
+    assert _run(client, body)["name"] == "Bench ou_1"
+    assert stub.state.calls == {"app_access_token": 1, "access_token": 2}
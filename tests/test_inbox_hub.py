@@ -0,0 +1,93 @@
+"""Inbox event fan-out, overflow and replay, without a server"""
+import asyncio
+import json
+from backend import inbox_hub as hub_module
+from backend.inbox_hub import InboxHub
+
+def _drain(subscriber):
+    events = []
+    while not subscriber.queue.empty():
+        events.append(subscriber.queue.get_nowait())
+    return events
+
+def test_events_fan_out_to_every_stream_of_the_user():
+    hub = InboxHub()
+    first, _ = hub.subscribe("ou_a", None)
+    second, _ = hub.subscribe("ou_a", None)
+    other, _ = hub.subscribe("ou_b", None)
+    hub.publish("ou_a", "message", {"id": "m1", "text": "你好"})
+    for subscriber in (first, second):
+        [(_, name, data)] = _drain(subscriber)
+        assert name == "message"
+        assert json.loads(data) == {"id": "m1", "text": "你好"}
+    assert _drain(other) == []
+    assert hub.connections == 3
+
+def test_publish_all_reaches_connected_users_only():
+    hub = InboxHub()
+    subscriber, _ = hub.subscribe("ou_a", None)
+    hub.publish_all("reset", {})
+    assert [event[1] for event in _drain(subscriber)] == ["reset"]
+    assert hub.subscribe("ou_b", "unknown")[1] is None
+
+def test_slow_stream_overflows_without_blocking(monkeypatch):
+    monkeypatch.setattr(hub_module, "INBOX_STREAM_QUEUE_SIZE", 2)
+    hub = InboxHub()
+    slow, _ = hub.subscribe("ou_a", None)
+    for i in range(3):
+        hub.publish("ou_a", "message", {"id": f"m{i}"})
+    assert slow.overflowed
+    assert len(_drain(slow)) == 2
+
+def test_last_event_id_replays_what_followed():
+    hub = InboxHub()
+    for i in range(3):
+        hub.publish("ou_a", "message", {"id": f"m{i}"})
+    first, *rest = hub._recent["ou_a"]
+    _, replay = hub.subscribe("ou_a", first[0])
+    assert replay == rest
+    _, replay = hub.subscribe("ou_a", "elsewhere-1")
+    assert replay is None
+
+def test_stream_replays_then_ends_on_overflow_and_unsubscribes(monkeypatch):
+    monkeypatch.setattr(hub_module, "INBOX_STREAM_QUEUE_SIZE", 1)
+    hub = InboxHub()
+    hub.publish("ou_a", "message", {"id": "m0"})
+    last_event_id = hub._recent["ou_a"][0][0]
+    hub.publish("ou_a", "message", {"id": "m1"})
+
+    async def body():
+        stream = hub.stream("ou_a", last_event_id)
+        chunks = [await stream.__anext__(), await stream.__anext__()]
+        hub.publish("ou_a", "message", {"id": "m2"})
+        hub.publish("ou_a", "message", {"id": "m3"})
+        chunks += [chunk async for chunk in stream]
+        return chunks
+
+    chunks = asyncio.run(body())
+    assert chunks[0] == b"retry: 3000\n\n"
+    assert b'"m1"' in chunks[1]
+    # m3 overflowed the queue: the stream ends and the client resumes after m1
+    assert len(chunks) == 2
+    assert hub.connections == 0
+    resumed_from = chunks[1].split(b"\n")[0].removeprefix(b"id: ").decode()
+    _, replay = hub.subscribe("ou_a", resumed_from)
+    assert [json.loads(event[2])["id"] for event in replay] == ["m2", "m3"]
+
+def test_close_ends_open_streams():
+    hub = InboxHub()
+
+    async def body():
+        stream = hub.stream("ou_a", None)
+        await stream.__anext__()
+        waiting = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        hub.close()
+        try:
+            await waiting
+        except StopAsyncIteration:
+            return True
+        return False
+
+    assert asyncio.run(body())
+    assert hub.connections == 0
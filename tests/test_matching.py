@@ -0,0 +1,47 @@
+"""Match index updates shared between workers over the cache bus, without a database"""
+import asyncio
+from backend.matching import Matcher
+from backend.person_cache import LocalBus
+
+class PairedBus(LocalBus):
+    """Delivers what one worker publishes to its peers too, like the Redis channel"""
+
+    def __init__(self):
+        super().__init__()
+        self.peers = []
+
+    async def publish(self, topic, message):
+        await super().publish(topic, message)
+        for peer in self.peers:
+            await LocalBus.publish(peer, topic, message)
+
+def _workers():
+    a, b = PairedBus(), PairedBus()
+    a.peers, b.peers = [b], [a]
+    return Matcher(a), Matcher(b)
+
+PEOPLE = [
+    {"id": "p1", "resources": None, "needs": "python mentor"},
+    {"id": "p2", "resources": "python mentor", "needs": None},
+]
+
+def test_changes_reach_every_worker():
+    first, second = _workers()
+    asyncio.run(first.people_changed("ou_a", PEOPLE))
+    for matcher in (first, second):
+        assert [person for person, _ in matcher.top_k("ou_a", "p1")] == ["p2"]
+    asyncio.run(second.person_removed("ou_a", "p2"))
+    for matcher in (first, second):
+        assert matcher.top_k("ou_a", "p1") == []
+
+def test_indexes_stay_per_owner():
+    first, second = _workers()
+    asyncio.run(first.people_changed("ou_a", PEOPLE[:1]))
+    asyncio.run(first.people_changed("ou_b", PEOPLE[1:]))
+    assert second.top_k("ou_a", "p1") == []
+
+def test_changes_received_during_a_rebuild_are_replayed():
+    first, second = _workers()
+    second._pending = []
+    asyncio.run(first.people_changed("ou_a", PEOPLE))
+    assert [change[0] for change in second._pending] == ["upsert", "upsert"]
@@ -0,0 +1,56 @@
+"""Streamed CSV and NDJSON import parsing, without a database"""
+import asyncio
+import pytest
+from backend.people_io import iter_csv_rows, iter_ndjson_rows, validate_row
+
+def _parse(iterate, body: bytes, chunk_size: int = 3):
+    async def chunks():
+        for i in range(0, len(body), chunk_size):
+            yield body[i:i + chunk_size]
+
+    async def collect():
+        return [row async for row in iterate(chunks())]
+
+    return asyncio.run(collect())
+
+def _errors(rows):
+    return [(line, str(row)) for line, row in rows if isinstance(row, Exception)]
+
+def test_csv_rows_carry_their_line_numbers_and_empty_cells_are_none():
+    body = "﻿name, city ,phone\r\n王小明,北京,\r\n\r\nAlex,,123\r\n".encode()
+    # Three-byte chunks split the BOM and every CJK character
+    assert _parse(iter_csv_rows, body) == [
+        (2, {"name": "王小明", "city": "北京", "phone": None}),
+        (4, {"name": "Alex", "city": None, "phone": "123"}),
+    ]
+
+def test_quoted_csv_fields_may_span_lines():
+    body = b'name,needs\n"Lee, Ann","a mentor\nand ""funding"""\nBo,x\n'
+    assert _parse(iter_csv_rows, body, chunk_size=5) == [
+        (2, {"name": "Lee, Ann", "needs": 'a mentor\nand "funding"'}),
+        (4, {"name": "Bo", "needs": "x"}),
+    ]
+
+def test_csv_column_mismatch_and_unterminated_quote_are_row_errors():
+    body = b'name,city\nA,B,C\nD,E\n"F,G\n'
+    rows = _parse(iter_csv_rows, body)
+    assert rows[1] == (3, {"name": "D", "city": "E"})
+    assert _errors(rows) == [(2, "Expected 2 columns, got 3"), (4, "Unterminated quoted field")]
+
+def test_ndjson_skips_blank_lines_and_reports_invalid_json():
+    body = '{"name": "王"}\n\n{broken\n{"name": "B"}'.encode()
+    rows = _parse(iter_ndjson_rows, body)
+    assert [(line, row) for line, row in rows if not isinstance(row, Exception)] == [
+        (1, {"name": "王"}), (4, {"name": "B"}),
+    ]
+    assert [line for line, _ in _errors(rows)] == [3]
+
+def test_validate_row_keeps_import_fields_only():
+    props = validate_row({"name": "A", "city": "X", "id": "4:x:1", "created_at": "2020-01-01"})
+    assert props["name"] == "A" and props["city"] == "X"
+    assert "id" not in props and "created_at" not in props
+
+@pytest.mark.parametrize("row", [{"city": "no name"}, ["A"], ValueError("Expected 2 columns, got 3")])
+def test_validate_row_rejects_invalid_rows(row):
+    with pytest.raises(ValueError):
+        validate_row(row)
@@ -0,0 +1,55 @@
+"""Person cache LRU, expiry and invalidation, without a database"""
+import asyncio
+from backend.person_cache import LocalBus, PersonCache, etag_matches, parse_if_match, person_etag
+
+def _person(person_id: str, updated_at: str = "2026-01-01T00:00:00") -> dict:
+    return {"id": person_id, "name": person_id, "created_at": "2025-01-01T00:00:00", "updated_at": updated_at}
+
+def test_entries_are_cached_per_owner():
+    cache = PersonCache(size=10, ttl=60)
+    entry = cache.put("ou_a", _person("p1"), cache.generation())
+    assert cache.get("ou_a", "p1") is entry
+    assert entry.etag == '"2026-01-01T00:00:00"'
+    assert cache.get("ou_b", "p1") is None
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PersonCache(size=2, ttl=60)
+    for person_id in ("p1", "p2"):
+        cache.put("ou_a", _person(person_id), cache.generation())
+    cache.get("ou_a", "p1")
+    cache.put("ou_a", _person("p3"), cache.generation())
+    assert len(cache) == 2
+    assert cache.get("ou_a", "p2") is None
+    assert cache.get("ou_a", "p1") is not None
+
+def test_entries_expire():
+    cache = PersonCache(size=10, ttl=0)
+    cache.put("ou_a", _person("p1"), cache.generation())
+    assert cache.get("ou_a", "p1") is None
+    assert cache.get_many("ou_a", ["p1"]) == {}
+
+def test_invalidation_reaches_every_cache_on_the_bus():
+    bus = LocalBus()
+    first, second = PersonCache(bus=bus), PersonCache(bus=bus)
+    for cache in (first, second):
+        cache.put("ou_a", _person("p1"), cache.generation())
+    asyncio.run(first.invalidate("ou_a", "p1"))
+    assert first.get("ou_a", "p1") is None
+    assert second.get("ou_a", "p1") is None
+
+def test_read_that_raced_an_invalidation_is_not_cached():
+    cache = PersonCache(size=10, ttl=60)
+    generation = cache.generation()
+    asyncio.run(cache.invalidate("ou_a", "p1"))
+    entry = cache.put("ou_a", _person("p1"), generation)
+    # The stale read is still served to its own request, just not kept
+    assert entry.record["id"] == "p1"
+    assert cache.get("ou_a", "p1") is None
+
+def test_conditional_headers():
+    etag = person_etag(_person("p1"))
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert parse_if_match(etag) == "2026-01-01T00:00:00"
+    assert parse_if_match("*") is None
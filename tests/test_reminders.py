@@ -0,0 +1,39 @@
+"""Birthday date arithmetic and reminder texts, without a database"""
+from datetime import date
+import re
+from backend.reminders import ISO_DATE_PATTERN, _birthday_text, _follow_up_text, birthday_days
+
+def test_february_29_falls_on_the_28th_outside_leap_years():
+    assert birthday_days(date(2026, 2, 28), date(2026, 3, 1)) == {
+        "02-28": date(2026, 2, 28),
+        "02-29": date(2026, 2, 28),
+        "03-01": date(2026, 3, 1),
+    }
+
+def test_february_29_is_its_own_day_in_leap_years():
+    days = birthday_days(date(2028, 2, 28), date(2028, 3, 1))
+    assert days["02-28"] == date(2028, 2, 28)
+    assert days["02-29"] == date(2028, 2, 29)
+    assert len(days) == 3
+
+def test_range_spans_the_year_end():
+    assert birthday_days(date(2026, 12, 31), date(2027, 1, 1)) == {
+        "12-31": date(2026, 12, 31),
+        "01-01": date(2027, 1, 1),
+    }
+    assert birthday_days(date(2026, 5, 2), date(2026, 5, 1)) == {}
+
+def test_only_valid_iso_dates_have_a_month_day():
+    # Cypher's =~ matches the whole string, like re.fullmatch
+    for value in ("1990-02-29", "1990-12-31", "1990-01-05T00:00:00Z", "1990-01-05 08:00"):
+        assert re.fullmatch(ISO_DATE_PATTERN, value), value
+    for value in ("1990-13-01", "1990-00-10", "1990-01-32", "02-29", "1990/01/05", "1990-01-05x"):
+        assert not re.fullmatch(ISO_DATE_PATTERN, value), value
+
+def test_texts_are_relative_to_today():
+    today = date(2026, 3, 1)
+    assert _birthday_text("Ann", today, today) == "🎂 Ann's birthday is today"
+    assert _birthday_text("Ann", date(2026, 3, 2), today) == "🎂 Ann's birthday is tomorrow"
+    assert _birthday_text("Ann", date(2026, 2, 28), today) == "🎂 Ann's birthday was on 02-28"
+    assert _follow_up_text("Bo", "2026-03-01T09:00:00", today) == "⏰ Follow up with Bo today"
+    assert _follow_up_text("Bo", "2026-02-27", today) == "⏰ Follow up with Bo, due 2026-02-27"
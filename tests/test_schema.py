@@ -0,0 +1,13 @@
+"""Query plans of the shipped hot-path queries, against the configured Neo4j database"""
+from backend.schema import PLAN_CHECKS, check_query_plans
+
+def test_plan_checks_are_unique():
+    names = [name for name, _, _ in PLAN_CHECKS]
+    assert len(names) == len(set(names))
+
+def test_hot_path_queries_use_indexes(with_database):
+    async def body(driver):
+        problems = await check_query_plans(driver)
+        assert problems == [], ", ".join(f"{name}: plan uses {operator}" for name, operator in problems)
+
+    with_database(body)
@@ -0,0 +1,29 @@
+"""Lucene query building for person search, without a database"""
+from backend.search import CONTENT_FIELDS, build_search_query
+
+def _fields(clause):
+    return " OR ".join(f"{field}:({clause})" for field in CONTENT_FIELDS)
+
+def test_terms_are_required_and_only_match_content_fields():
+    assert build_search_query("Alex design") == f"({_fields('alex')}) AND ({_fields('design')})"
+
+def test_owner_clause_is_the_only_one_on_owner():
+    query = build_search_query("ou", prefix=True, owner="ou_123")
+    assert query == f'(owner:"ou_123") AND ({_fields("ou^2 OR ou*")})'
+    assert query.count("owner:") == 1
+
+def test_cjk_and_latin_runs_are_split():
+    assert build_search_query("北京java", prefix=True) == f"({_fields('北京')}) AND ({_fields('java^2 OR java*')})"
+
+def test_single_cjk_character_is_a_bigram_prefix():
+    assert build_search_query("王", prefix=True) == f"({_fields('王*')})"
+
+def test_operators_and_special_characters_are_escaped():
+    assert build_search_query("AND c++") == "({}) AND ({})".format(_fields("and"), _fields(r"c\+\+"))
+    assert build_search_query('o"wner:x') == "({})".format(_fields(r'o\"wner\:x'))
+
+def test_owner_is_quoted():
+    assert build_search_query("x", owner='a"b').startswith('(owner:"a\\"b")')
+
+def test_blank_input_builds_no_query():
+    assert build_search_query("   ") == ""
@@ -0,0 +1,73 @@
+"""Login upsert against the configured Neo4j database"""
+import asyncio
+import uuid
+import httpx
+from backend import session_auth
+from backend.main import app
+
+CONCURRENT_LOGINS = 50
+
+async def _count(driver, query, open_id):
+    async with driver.session() as session:
+        result = await session.run(query, open_id=open_id)
+        record = await result.single()
+        return record["n"]
+
+async def _delete_user(driver, open_id):
+    async with driver.session() as session:
+        result = await session.run(
+            """
+            MATCH (u:User {open_id: $open_id})
+            OPTIONAL MATCH (u)-[:HAS_MESSAGE]->(m:InboxMessage)
+            DETACH DELETE u, m
+            """,
+            open_id=open_id
+        )
+        await result.consume()
+
+def _callbacks(open_id, monkeypatch):
+    async def login(code):
+        return {"open_id": open_id, "name": "Concurrent Login"}
+    monkeypatch.setattr(session_auth.auth, "login", login)
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+def test_concurrent_first_logins_create_one_user(with_database, monkeypatch):
+    open_id = f"ou_test_{uuid.uuid4().hex}"
+
+    async def body(driver):
+        try:
+            async with _callbacks(open_id, monkeypatch) as client:
+                responses = await asyncio.gather(*[
+                    client.get("/api/public/auth/callback", params={"code": str(i)})
+                    for i in range(CONCURRENT_LOGINS)
+                ])
+            assert [r.status_code for r in responses] == [200] * CONCURRENT_LOGINS
+            assert await _count(driver, "MATCH (u:User {open_id: $open_id}) RETURN count(u) AS n", open_id) == 1
+            welcome = await _count(driver,
+                "MATCH (:User {open_id: $open_id})-[:HAS_MESSAGE]->(m:InboxMessage) RETURN count(m) AS n", open_id)
+            assert welcome == 1
+        finally:
+            await _delete_user(driver, open_id)
+
+    with_database(body)
+
+def test_deleted_user_cannot_log_in(with_database, monkeypatch):
+    open_id = f"ou_test_{uuid.uuid4().hex}"
+
+    async def body(driver):
+        try:
+            async with _callbacks(open_id, monkeypatch) as client:
+                assert (await client.get("/api/public/auth/callback", params={"code": "1"})).status_code == 200
+                async with driver.session() as session:
+                    result = await session.run("MATCH (u:User {open_id: $open_id}) SET u.deleted = true", open_id=open_id)
+                    await result.consume()
+                response = await client.get("/api/public/auth/callback", params={"code": "2"})
+            assert response.status_code == 403
+            deleted = await _count(driver,
+                "MATCH (u:User {open_id: $open_id}) WHERE u.deleted = true RETURN count(u) AS n", open_id)
+            assert deleted == 1
+        finally:
+            await _delete_user(driver, open_id)
+
+    with_database(body)
@@ -0,0 +1,104 @@
+"""Write-behind coalescing and batching against an in-memory session, without a database"""
+import asyncio
+import pytest
+from backend import db
+from backend.write_behind import WriteBehind
+from bench.replay import Result, _Session
+
+class Driver:
+    """Records the rows of every batch written; fails while `failing` is set"""
+
+    def __init__(self):
+        self.batches = []
+        self.failing = False
+
+    def session(self, **config):
+        async def run(query, parameters=None, **kwargs):
+            if self.failing:
+                raise ConnectionError("database unavailable")
+            self.batches.append(kwargs["rows"])
+            return Result([])
+        return _Session(run)
+
+@pytest.fixture
+def driver(monkeypatch):
+    fake = Driver()
+    monkeypatch.setattr(db, "driver", fake)
+    return fake
+
+def test_updates_to_one_key_are_merged(driver):
+    queue = WriteBehind(interval=60)
+
+    async def body():
+        await queue.put("user.last_login", "ou_1", "2026-01-01T00:00:00")
+        await queue.put("user.last_login", "ou_1", "2026-01-03T00:00:00")
+        await queue.put("user.last_login", "ou_1", "2026-01-02T00:00:00")
+        await queue.put("person.view", ("ou_1", "p1"), (1, "2026-01-01"))
+        await queue.put("person.view", ("ou_1", "p1"), (1, "2026-01-02"))
+        assert queue.pending_count() == 2
+        assert queue.pending("user.last_login", "ou_1") == "2026-01-03T00:00:00"
+        await queue.flush()
+
+    asyncio.run(body())
+    assert driver.batches == [
+        [{"open_id": "ou_1", "at": "2026-01-03T00:00:00"}],
+        [{"open_id": "ou_1", "id": "p1", "views": 2, "at": "2026-01-02"}],
+    ]
+    assert queue.pending_count() == 0
+
+def test_batches_are_split_at_batch_size(driver):
+    queue = WriteBehind(interval=60, batch_size=2)
+
+    async def body():
+        for i in range(5):
+            await queue.put("inbox.read", f"ou_{i}", {f"m{i}"})
+        await queue.flush()
+
+    asyncio.run(body())
+    assert [len(rows) for rows in driver.batches] == [2, 2, 1]
+
+def test_zero_interval_writes_through(driver):
+    queue = WriteBehind(interval=0)
+    asyncio.run(queue.put("inbox.read", "ou_1", {"m1"}))
+    assert driver.batches == [[{"open_id": "ou_1", "ids": ["m1"]}]]
+
+def test_failed_batches_are_requeued_and_merged(driver):
+    queue = WriteBehind(interval=60)
+
+    async def body():
+        await queue.put("inbox.read", "ou_1", {"m1"})
+        driver.failing = True
+        await queue.flush()
+        assert queue.pending("inbox.read", "ou_1") == {"m1"}
+        await queue.put("inbox.read", "ou_1", {"m2"})
+        driver.failing = False
+        await queue.flush()
+
+    asyncio.run(body())
+    assert driver.batches == [[{"open_id": "ou_1", "ids": ["m1", "m2"]}]]
+
+def test_full_queue_flushes_before_taking_a_new_key(driver):
+    queue = WriteBehind(interval=60, max_pending=2)
+
+    async def body():
+        await queue.put("inbox.read", "ou_1", {"m1"})
+        await queue.put("inbox.read", "ou_2", {"m2"})
+        # Merging into a queued key needs no room
+        await queue.put("inbox.read", "ou_2", {"m3"})
+        assert driver.batches == []
+        await queue.put("inbox.read", "ou_3", {"m4"})
+        assert len(driver.batches) == 1
+        assert queue.pending_count() == 1
+
+    asyncio.run(body())
+
+def test_full_queue_that_cannot_flush_refuses(driver):
+    queue = WriteBehind(interval=60, max_pending=1)
+    driver.failing = True
+
+    async def body():
+        await queue.put("inbox.read", "ou_1", {"m1"})
+        with pytest.raises(RuntimeError):
+            await queue.put("inbox.read", "ou_2", {"m2"})
+
+    asyncio.run(body())